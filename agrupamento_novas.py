@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Agrupamento Incremental - Clusters dos formulários sem categoria (Nova_Classe_*)
+Mini-batch sobre os embeddings: novos formulários são absorvidos sem reagrupar tudo e os ids nunca mudam
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from motor_classificacao import MODELOS_DIR
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+AGRUPAMENTO_FILE = MODELOS_DIR / "agrupamento_novas.npz"
+
+# Similaridade mínima com o centroide para entrar em um cluster existente
+LIMIAR_ATRIBUICAO = 0.55
+TAMANHO_LOTE = 256
+REPRESENTANTES = 3
+
+# ========================================
+# AGRUPADOR
+# ========================================
+
+class AgrupadorIncremental:
+    """Centroides por soma acumulada; cada formulário é atribuído uma única vez"""
+
+    def __init__(self, dimensao, limiar=LIMIAR_ATRIBUICAO, embedder_nome=None):
+        self.dimensao = dimensao
+        self.limiar = limiar
+        self.embedder_nome = embedder_nome
+        self._lock = threading.Lock()
+
+        # Um registro por cluster (índice = id estável)
+        self.somas = np.empty((0, dimensao), dtype=np.float64)
+        self.tamanhos = np.empty(0, dtype=np.int64)
+        self.nomes = {}
+
+        # Um registro por formulário absorvido
+        self.forms_number = np.empty(0, dtype=np.int64)
+        self.clusters = np.empty(0, dtype=np.int64)
+        self.similaridades = np.empty(0, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.tamanhos)
+
+    def centroides(self):
+        normas = np.linalg.norm(self.somas, axis=1, keepdims=True)
+        return (self.somas / np.maximum(normas, 1e-12)).astype(np.float32)
+
+    def pendentes(self, forms_numbers):
+        """Máscara dos formulários ainda não absorvidos"""
+        return ~np.isin(np.asarray(forms_numbers, dtype=np.int64), self.forms_number)
+
+    def _novo_cluster(self, vetor):
+        self.somas = np.vstack([self.somas, vetor[None, :].astype(np.float64)])
+        self.tamanhos = np.append(self.tamanhos, 0)
+        return len(self.tamanhos) - 1
+
+    def absorver(self, forms_numbers, embeddings, tamanho_lote=TAMANHO_LOTE):
+        """Atribui formulários novos aos clusters existentes ou cria clusters; retorna os ids atribuídos"""
+        forms_numbers = np.asarray(forms_numbers, dtype=np.int64)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            novos = self.pendentes(forms_numbers)
+            forms_numbers, embeddings = forms_numbers[novos], embeddings[novos]
+            # Duplicatas dentro da própria chamada: a primeira ocorrência vence
+            _, primeiras = np.unique(forms_numbers, return_index=True)
+            primeiras.sort()
+            forms_numbers, embeddings = forms_numbers[primeiras], embeddings[primeiras]
+
+            atribuidos = np.empty(len(forms_numbers), dtype=np.int64)
+            similaridades = np.empty(len(forms_numbers), dtype=np.float32)
+            for inicio in range(0, len(forms_numbers), tamanho_lote):
+                lote = embeddings[inicio:inicio + tamanho_lote]
+                ids, sims = self._atribuir_lote(lote)
+                atribuidos[inicio:inicio + len(lote)] = ids
+                similaridades[inicio:inicio + len(lote)] = sims
+
+            self.forms_number = np.concatenate([self.forms_number, forms_numbers])
+            self.clusters = np.concatenate([self.clusters, atribuidos])
+            self.similaridades = np.concatenate([self.similaridades, similaridades])
+            return atribuidos
+
+    def _atribuir_lote(self, lote):
+        """Lote contra os centroides atuais (uma matmul); os que sobram formam clusters novos"""
+        ids = np.full(len(lote), -1, dtype=np.int64)
+        sims = np.zeros(len(lote), dtype=np.float32)
+        if len(self.tamanhos):
+            scores = lote @ self.centroides().T
+            melhores = scores.argmax(axis=1)
+            maximos = scores[np.arange(len(lote)), melhores]
+            aceitos = maximos >= self.limiar
+            ids[aceitos], sims[aceitos] = melhores[aceitos], maximos[aceitos]
+
+        # Líder sequencial apenas entre os não atribuídos, contra os clusters criados neste lote
+        primeiro_novo = len(self.tamanhos)
+        for i in np.flatnonzero(ids < 0):
+            if len(self.tamanhos) > primeiro_novo:
+                novos = self.somas[primeiro_novo:]
+                scores = (novos / np.linalg.norm(novos, axis=1, keepdims=True)) @ lote[i]
+                melhor = int(scores.argmax())
+                if scores[melhor] >= self.limiar:
+                    ids[i], sims[i] = primeiro_novo + melhor, scores[melhor]
+                    self.somas[primeiro_novo + melhor] += lote[i]
+                    continue
+            ids[i], sims[i] = self._novo_cluster(lote[i]), 1.0
+
+        # Atualização mini-batch das somas (os líderes já somaram o próprio vetor)
+        existentes = ids < primeiro_novo
+        np.add.at(self.somas, ids[existentes], lote[existentes])
+        self.tamanhos += np.bincount(ids, minlength=len(self.tamanhos))
+        return ids, sims
+
+    def nomear(self, cluster, nome):
+        with self._lock:
+            if nome:
+                self.nomes[int(cluster)] = nome
+            else:
+                self.nomes.pop(int(cluster), None)
+
+    def membros(self, cluster):
+        """forms_number do cluster, do mais ao menos representativo"""
+        mascara = self.clusters == int(cluster)
+        ordem = np.argsort(-self.similaridades[mascara], kind='stable')
+        return self.forms_number[mascara][ordem]
+
+    def resumo(self, textos=None, tamanho_minimo=2, representantes=REPRESENTANTES):
+        """Um registro por cluster (maiores primeiro); textos: forms_number -> texto"""
+        linhas = []
+        for cluster in np.flatnonzero(self.tamanhos >= tamanho_minimo):
+            membros = self.membros(cluster)
+            linha = {
+                'cluster': int(cluster),
+                'nome': self.nomes.get(int(cluster), ""),
+                'tamanho': int(self.tamanhos[cluster]),
+                'representantes': membros[:representantes].tolist(),
+            }
+            if textos is not None:
+                linha['textos'] = [textos(int(f)) for f in membros[:representantes]]
+            linhas.append(linha)
+        colunas = ['cluster', 'nome', 'tamanho', 'representantes'] + (['textos'] if textos is not None else [])
+        df = pd.DataFrame(linhas, columns=colunas)
+        return df.sort_values(['tamanho', 'cluster'], ascending=[False, True], ignore_index=True)
+
+    # ========================================
+    # PERSISTÊNCIA
+    # ========================================
+
+    def salvar(self, caminho=AGRUPAMENTO_FILE):
+        caminho = Path(caminho)
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            temporario = caminho.with_name(f"{caminho.stem}.{os.getpid()}.tmp.npz")
+            np.savez(
+                temporario,
+                somas=self.somas, tamanhos=self.tamanhos,
+                forms_number=self.forms_number, clusters=self.clusters, similaridades=self.similaridades,
+                nomes=np.array(json.dumps({str(k): v for k, v in self.nomes.items()}, ensure_ascii=False)),
+                limiar=np.array(self.limiar), embedder_nome=np.array(self.embedder_nome or ""),
+            )
+            os.replace(temporario, caminho)
+
+    @classmethod
+    def carregar(cls, caminho=AGRUPAMENTO_FILE):
+        with np.load(caminho) as dados:
+            agrupador = cls(dados['somas'].shape[1], float(dados['limiar']), str(dados['embedder_nome']) or None)
+            agrupador.somas = dados['somas']
+            agrupador.tamanhos = dados['tamanhos']
+            agrupador.forms_number = dados['forms_number']
+            agrupador.clusters = dados['clusters']
+            agrupador.similaridades = dados['similaridades']
+            agrupador.nomes = {int(k): v for k, v in json.loads(str(dados['nomes'])).items()}
+        return agrupador
+
+def formularios_sem_categoria(df_classificacoes):
+    """forms_number classificados como new_class (Nova_Classe_*)"""
+    if df_classificacoes is None or df_classificacoes.empty:
+        return np.empty(0, dtype=np.int64)
+    if 'level1_classification_type' in df_classificacoes.columns:
+        mascara = df_classificacoes['level1_classification_type'] == 'new_class'
+    else:
+        mascara = df_classificacoes['level1_category'].astype(str).str.startswith('Nova_Classe')
+    return df_classificacoes.loc[mascara.fillna(False).astype(bool), 'forms_number'].to_numpy(dtype=np.int64)
+
+def sincronizar_agrupador(agrupador, df_formularios, df_classificacoes, embedder):
+    """Absorve os formulários sem categoria que ainda não estão no agrupamento"""
+    # Centroides de outro embedder não são comparáveis aos vetores atuais
+    if agrupador.embedder_nome and agrupador.embedder_nome != embedder.nome:
+        raise ValueError(
+            f"Agrupamento gerado com '{agrupador.embedder_nome}', mas o embedder é '{embedder.nome}'"
+        )
+    sem_categoria = formularios_sem_categoria(df_classificacoes)
+    df = df_formularios[df_formularios['forms_number'].isin(sem_categoria)]
+    df = df[agrupador.pendentes(df['forms_number'].to_numpy())]
+    if df.empty:
+        return 0
+    embeddings = embedder.embed(df['forms_text'].fillna("").tolist())
+    agrupador.absorver(df['forms_number'].to_numpy(), embeddings)
+    return len(df)
+
+# ========================================
+# LINHA DE COMANDO
+# ========================================
+
+def main():
+    from cache_embeddings import CacheEmbeddings
+    from embeddings import EmbedderHash
+
+    parser = argparse.ArgumentParser(description="Agrupa incrementalmente os formulários Nova_Classe_*")
+    parser.add_argument("--dados", default="dados_embbeding.csv")
+    parser.add_argument("--classificacoes", default="data/classified/level1_classifications.csv")
+    parser.add_argument("--estado", default=str(AGRUPAMENTO_FILE))
+    parser.add_argument("--limiar", type=float, default=LIMIAR_ATRIBUICAO)
+    args = parser.parse_args()
+
+    embedder = CacheEmbeddings(EmbedderHash())
+    if Path(args.estado).exists():
+        agrupador = AgrupadorIncremental.carregar(args.estado)
+    else:
+        agrupador = AgrupadorIncremental(embedder.dimensao, args.limiar, embedder.nome)
+
+    dados = pd.read_csv(args.dados, encoding='utf-8-sig')
+    inicio = time.perf_counter()
+    try:
+        absorvidos = sincronizar_agrupador(agrupador, dados, pd.read_csv(args.classificacoes), embedder)
+    except ValueError as e:
+        sys.exit(f"{e}: apague {args.estado} para reagrupar")
+    tempo = time.perf_counter() - inicio
+    agrupador.salvar(args.estado)
+
+    resumo = agrupador.resumo()
+    print(f"{absorvidos} formulários absorvidos em {tempo:.2f}s")
+    print(f"{len(agrupador)} clusters ({len(resumo)} com 2+ formulários, "
+          f"{int((agrupador.tamanhos == 1).sum())} isolados) sobre {len(agrupador.forms_number)} formulários")
+    textos = dados.set_index('forms_number')['forms_text']
+    for _, linha in resumo.head(10).iterrows():
+        print(f"  #{linha['cluster']:>4} ({linha['tamanho']:>3}) {str(textos.get(linha['representantes'][0], ''))[:90]}")
+
+
+if __name__ == "__main__":
+    main()
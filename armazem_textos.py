@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Armazém de Textos - Acesso aleatório aos forms_text por forms_number
+Blob UTF-8 contíguo + índice (forms_number, offset, tamanho) mapeados em memória
+"""
+
+import mmap
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from cache_colunar import CACHE_DIR, cache_valido, carregar_tabela, gravar_meta, nome_cache
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+TIPO_INDICE = np.dtype([('forms_number', '<i8'), ('offset', '<i8'), ('tamanho', '<i4')])
+
+# ========================================
+# ARMAZÉM
+# ========================================
+
+class ArmazemTextos:
+    """Textos dos formulários servidos por fatia do blob, sem parsear o CSV"""
+
+    def __init__(self, arquivo_blob, arquivo_indice):
+        self.indice = np.load(arquivo_indice, mmap_mode='r')
+        self._chaves = self.indice['forms_number']
+        self._arquivo = open(arquivo_blob, 'rb')
+        tamanho = os.fstat(self._arquivo.fileno()).st_size
+        self._blob = mmap.mmap(self._arquivo.fileno(), 0, access=mmap.ACCESS_READ) if tamanho else b""
+
+    def __len__(self):
+        return len(self.indice)
+
+    def __contains__(self, forms_number):
+        return self._posicao(forms_number) >= 0
+
+    def _posicao(self, forms_number):
+        if len(self._chaves) == 0:
+            return -1
+        posicao = int(np.searchsorted(self._chaves, int(forms_number)))
+        if posicao < len(self._chaves) and self._chaves[posicao] == int(forms_number):
+            return posicao
+        return -1
+
+    def obter(self, forms_number, padrao=None):
+        """Texto do formulário (fatia do blob) ou padrão quando ausente"""
+        posicao = self._posicao(forms_number)
+        if posicao < 0:
+            return padrao
+        registro = self.indice[posicao]
+        inicio = int(registro['offset'])
+        return self._blob[inicio:inicio + int(registro['tamanho'])].decode('utf-8')
+
+    def fechar(self):
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._arquivo.close()
+
+# ========================================
+# CONSTRUÇÃO
+# ========================================
+
+def construir_armazem(caminho_csv, prefixo):
+    """Gera blob + índice a partir do CSV (via cache colunar)"""
+    tabela = carregar_tabela(caminho_csv, Path(prefixo).parent)
+    forms_number = tabela.column('forms_number').to_numpy().astype(np.int64)
+    textos = [(texto or "").encode('utf-8') for texto in tabela.column('forms_text').to_pylist()]
+
+    # Primeira ocorrência de cada forms_number, ordenado para busca binária
+    forms_unicos, primeiras = np.unique(forms_number, return_index=True)
+    indice = np.empty(len(forms_unicos), dtype=TIPO_INDICE)
+    indice['forms_number'] = forms_unicos
+
+    ordenados = [textos[linha] for linha in primeiras]
+    indice['tamanho'] = [len(dados) for dados in ordenados]
+    indice['offset'] = np.cumsum(indice['tamanho'], dtype=np.int64) - indice['tamanho']
+
+    temporario_blob = f"{prefixo}.bin.{os.getpid()}.tmp"
+    with open(temporario_blob, 'wb') as f:
+        f.write(b"".join(ordenados))
+
+    temporario_indice = f"{prefixo}.idx.{os.getpid()}.tmp.npy"
+    np.save(temporario_indice, indice)
+    os.replace(temporario_blob, f"{prefixo}.bin")
+    os.replace(temporario_indice, f"{prefixo}.idx.npy")
+
+def carregar_armazem_textos(caminho_csv, cache_dir=CACHE_DIR):
+    """Armazém de textos, reconstruído quando o CSV de origem muda"""
+    prefixo = Path(cache_dir) / f"{nome_cache(caminho_csv)}.textos"
+    arquivo_meta = Path(f"{prefixo}.meta.json")
+
+    if not (Path(f"{prefixo}.idx.npy").exists() and cache_valido(caminho_csv, arquivo_meta)):
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        construir_armazem(caminho_csv, prefixo)
+        gravar_meta(caminho_csv, arquivo_meta)
+    return ArmazemTextos(f"{prefixo}.bin", f"{prefixo}.idx.npy")
+
+class ArmazemTextosAtualizado:
+    """Armazém que se reabre quando o CSV de origem muda, fechando o mapeamento anterior
+
+    Um único objeto por processo: trocar de armazém por chave (ex.: mtime) em um cache
+    deixaria o mmap e o arquivo do armazém descartado abertos.
+    """
+
+    def __init__(self, caminho_csv, cache_dir=CACHE_DIR):
+        self.caminho_csv = Path(caminho_csv)
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._armazem = None
+
+    def _atualizar(self):
+        mtime = self.caminho_csv.stat().st_mtime_ns
+        if mtime != self._mtime:
+            novo = carregar_armazem_textos(self.caminho_csv, self.cache_dir)
+            if self._armazem is not None:
+                self._armazem.fechar()
+            self._armazem, self._mtime = novo, mtime
+
+    def obter(self, forms_number, padrao=None):
+        # Sob o lock: nenhuma leitura usa um mapeamento sendo fechado
+        with self._lock:
+            self._atualizar()
+            return self._armazem.obter(forms_number, padrao)
+
+    def fechar(self):
+        with self._lock:
+            if self._armazem is not None:
+                self._armazem.fechar()
+            self._armazem, self._mtime = None, None
+
+
+if __name__ == "__main__":
+    import sys
+
+    caminho = sys.argv[1] if len(sys.argv) > 1 else "dados_embbeding.csv"
+    armazem = carregar_armazem_textos(caminho)
+    print(f"{len(armazem)} textos indexados a partir de {caminho}")
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Armazenamento de Rotulagem - Backends plugáveis
+Classificações, progresso e auditoria em arquivos (padrão) ou SQLite em modo WAL
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dataset_treino import ESQUEMA, DatasetTreino
+from diario_rotulos import HUMAN_LABELS_DIR, DiarioRotulos, ler_novos_registros, serializar_valor
+from log_auditoria import LogAuditoria
+from progresso import acrescentar_progresso, arquivo_progresso, carregar_progresso
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+SQLITE_FILE = HUMAN_LABELS_DIR / "rotulos.db"
+
+# Variáveis de ambiente para escolher o backend
+BACKEND_ENV = "ROTULOS_BACKEND"
+SQLITE_ENV = "ROTULOS_SQLITE"
+
+# ========================================
+# BACKEND EM ARQUIVOS
+# ========================================
+
+class ArmazenamentoArquivos:
+    """Backend padrão: diário JSONL, dataset Parquet incremental e log segmentado"""
+
+    def __init__(self, diretorio=HUMAN_LABELS_DIR):
+        diretorio = Path(diretorio)
+        self.diario = DiarioRotulos(diretorio / "human_classifications.jsonl", diretorio / "human_classifications.csv")
+        self.dataset = DatasetTreino(diretorio / "training_ready", diretorio / "training_ready.parquet")
+        self.auditoria = LogAuditoria(diretorio / "audit", log_legado=diretorio / "classification_sessions.json")
+        self.diretorio_progresso = diretorio / "progresso"
+
+    def iniciar_manutencao(self):
+        """Tarefas em background do backend"""
+        self.dataset.iniciar_compactacao()
+
+    def salvar_classificacao(self, dados_ml):
+        self.salvar_classificacoes([dados_ml])
+
+    def salvar_classificacoes(self, registros):
+        """Lote: uma escrita no diário e um único fragmento Parquet"""
+        self.diario.registrar_lote(registros)
+        self.dataset.acrescentar_lote(registros)
+
+    def registrar_auditoria(self, entrada):
+        self.registrar_auditorias([entrada])
+
+    def registrar_auditorias(self, entradas):
+        self.auditoria.registrar_lote(entradas)
+
+    def marcar_analisado(self, forms_number, usuario):
+        self.marcar_analisados([forms_number], usuario)
+
+    def marcar_analisados(self, forms_numbers, usuario):
+        acrescentar_progresso(arquivo_progresso(self.diretorio_progresso, usuario), forms_numbers)
+
+    def formularios_analisados(self, usuario):
+        """Progresso persistido, unido às classificações anteriores ao arquivo de progresso"""
+        self.diario.atualizar()
+        gravados = carregar_progresso(arquivo_progresso(self.diretorio_progresso, usuario))
+        return np.union1d(gravados, np.asarray(self.diario.formularios_do_usuario(usuario), dtype=np.int64))
+
+    def contar_classificacoes(self, usuario):
+        self.diario.atualizar()
+        return self.diario.contar(usuario)
+
+    def classificacoes(self):
+        return self.diario.para_dataframe()
+
+    def dados_treino(self, colunas=None):
+        """Última versão de cada (forms_number, classifier_name), lida só nas colunas pedidas"""
+        return self.dataset.ler(colunas)
+
+    def novas_classificacoes(self, cursor=None):
+        """Classificações gravadas (por qualquer processo) desde o cursor: (registros, novo cursor)"""
+        return ler_novos_registros(self.diario.caminho, cursor or 0)
+
+    def estatisticas_auditoria(self):
+        return self.auditoria.estatisticas()
+
+    def exportar(self, destino_csv=None, destino_parquet=None):
+        """Exporta a visão consolidada para o pipeline de retreinamento"""
+        if destino_csv:
+            self.diario.materializar_csv(destino_csv)
+        if destino_parquet:
+            self.dataset.materializar(destino_parquet)
+
+# ========================================
+# BACKEND SQLITE
+# ========================================
+
+COLUNAS = ESQUEMA.names
+
+TIPOS_SQL = {
+    'forms_number': 'INTEGER NOT NULL',
+    'classifier_name': 'TEXT NOT NULL',
+    'confidence_human': 'REAL',
+    'ai_confidence': 'REAL',
+    'ai_threshold_met': 'INTEGER',
+    'approved_ai': 'INTEGER',
+    'disagreement_flag': 'INTEGER',
+    'high_confidence': 'INTEGER',
+    'needs_review': 'INTEGER',
+}
+
+COLUNAS_BOOLEANAS = ['ai_threshold_met', 'approved_ai', 'disagreement_flag', 'high_confidence', 'needs_review']
+
+
+def _nativo(valor):
+    """Escalares numpy viram tipos Python aceitos pelo sqlite3"""
+    return valor.item() if hasattr(valor, 'item') else valor
+
+
+class ArmazenamentoSQLite:
+    """Backend SQLite (WAL): escritas concorrentes serializadas pelo banco, sem perda de linhas"""
+
+    def __init__(self, caminho=SQLITE_FILE, timeout=30.0):
+        self.caminho = Path(caminho)
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._criar_tabelas()
+
+    def _conexao(self):
+        """Uma conexão por thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+            self._local.conn = conn
+        return conn
+
+    def _criar_tabelas(self):
+        definicoes = ",\n".join(f"{coluna} {TIPOS_SQL.get(coluna, 'TEXT')}" for coluna in COLUNAS)
+        with self._conexao() as conn:
+            conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS classificacoes (
+                    {definicoes},
+                    sequencia INTEGER,
+                    PRIMARY KEY (forms_number, classifier_name)
+                );
+                CREATE INDEX IF NOT EXISTS idx_classificacoes_forms ON classificacoes (forms_number);
+                CREATE INDEX IF NOT EXISTS idx_classificacoes_classifier ON classificacoes (classifier_name);
+                CREATE INDEX IF NOT EXISTS idx_classificacoes_timestamp ON classificacoes (classification_timestamp);
+
+                CREATE TABLE IF NOT EXISTS progresso (
+                    usuario TEXT NOT NULL,
+                    forms_number INTEGER NOT NULL,
+                    PRIMARY KEY (usuario, forms_number)
+                );
+
+                CREATE TABLE IF NOT EXISTS auditoria (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT,
+                    user TEXT,
+                    forms_number INTEGER,
+                    approved_ai INTEGER,
+                    confidence REAL,
+                    entrada TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_auditoria_user ON auditoria (user);
+                CREATE INDEX IF NOT EXISTS idx_auditoria_forms ON auditoria (forms_number);
+            """)
+            # Bancos anteriores à coluna de sequência: linhas existentes numeradas pela ordem de inserção
+            colunas = {linha[1] for linha in conn.execute("PRAGMA table_info(classificacoes)")}
+            if 'sequencia' not in colunas:
+                conn.execute("ALTER TABLE classificacoes ADD COLUMN sequencia INTEGER")
+            conn.execute("UPDATE classificacoes SET sequencia = rowid WHERE sequencia IS NULL")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_classificacoes_sequencia ON classificacoes (sequencia)")
+
+    def iniciar_manutencao(self):
+        # Checkpoints do WAL são automáticos
+        pass
+
+    def salvar_classificacao(self, dados_ml):
+        """Upsert atômico por (forms_number, classifier_name)"""
+        self.salvar_classificacoes([dados_ml])
+
+    def salvar_classificacoes(self, registros):
+        """Upsert de um lote em uma única transação
+
+        Cada linha inserida ou atualizada recebe a próxima `sequencia`; como o SQLite serializa os
+        escritores, a sequência cresce na ordem de commit (base do cursor de novas_classificacoes).
+        """
+        valores = [[_nativo(dados_ml.get(c)) for c in COLUNAS] for dados_ml in registros]
+        atualizacoes = ", ".join(f"{c} = excluded.{c}" for c in COLUNAS if c not in ('forms_number', 'classifier_name'))
+        with self._conexao() as conn:
+            conn.executemany(
+                f"INSERT INTO classificacoes ({', '.join(COLUNAS)}, sequencia) "
+                f"VALUES ({', '.join('?' * len(COLUNAS))}, (SELECT COALESCE(MAX(sequencia), 0) + 1 FROM classificacoes)) "
+                f"ON CONFLICT (forms_number, classifier_name) DO UPDATE SET {atualizacoes}, sequencia = excluded.sequencia",
+                valores
+            )
+
+    def registrar_auditoria(self, entrada):
+        self.registrar_auditorias([entrada])
+
+    def registrar_auditorias(self, entradas):
+        with self._conexao() as conn:
+            conn.executemany(
+                "INSERT INTO auditoria (timestamp, user, forms_number, approved_ai, confidence, entrada) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        entrada.get("timestamp"),
+                        entrada.get("user"),
+                        _nativo(entrada.get("forms_number")),
+                        bool(entrada.get("approved_ai", False)),
+                        entrada.get("confidence"),
+                        json.dumps(entrada, ensure_ascii=False, default=serializar_valor),
+                    )
+                    for entrada in entradas
+                ]
+            )
+
+    def marcar_analisado(self, forms_number, usuario):
+        self.marcar_analisados([forms_number], usuario)
+
+    def marcar_analisados(self, forms_numbers, usuario):
+        with self._conexao() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO progresso (usuario, forms_number) VALUES (?, ?)",
+                [(usuario, int(forms_number)) for forms_number in forms_numbers]
+            )
+
+    def formularios_analisados(self, usuario):
+        cursor = self._conexao().execute(
+            "SELECT forms_number FROM progresso WHERE usuario = ? ORDER BY forms_number", (usuario,)
+        )
+        return np.fromiter((linha[0] for linha in cursor), dtype=np.int64)
+
+    def contar_classificacoes(self, usuario):
+        cursor = self._conexao().execute(
+            "SELECT COUNT(*) FROM classificacoes WHERE classifier_name = ?", (usuario,)
+        )
+        return cursor.fetchone()[0]
+
+    def classificacoes(self):
+        df = pd.read_sql_query(f"SELECT {', '.join(COLUNAS)} FROM classificacoes", self._conexao())
+        for coluna in COLUNAS_BOOLEANAS:
+            df[coluna] = df[coluna].astype('boolean')
+        return df
+
+    def dados_treino(self, colunas=None):
+        """Tabela de classificações (uma linha por forms_number e classifier_name) nas colunas pedidas"""
+        colunas = list(colunas or COLUNAS)
+        df = pd.read_sql_query(f"SELECT {', '.join(colunas)} FROM classificacoes", self._conexao())
+        for coluna in COLUNAS_BOOLEANAS:
+            if coluna in df.columns:
+                df[coluna] = df[coluna].astype('boolean')
+        return df
+
+    def novas_classificacoes(self, cursor=None):
+        """Classificações gravadas ou atualizadas desde o cursor (última `sequencia` vista)
+
+        A sequência é atribuída pelo banco na ordem de commit; o classification_timestamp vem do
+        cliente e pode chegar fora de ordem (relógios diferentes, escritores concorrentes).
+        """
+        conn = self._conexao()
+        cursor_sql = conn.execute(
+            f"SELECT {', '.join(COLUNAS)}, sequencia FROM classificacoes WHERE sequencia > ? ORDER BY sequencia",
+            (cursor or 0,)
+        )
+        registros = []
+        for linha in cursor_sql:
+            registros.append(dict(zip(COLUNAS, linha[:-1])))
+            cursor = linha[-1]
+        return registros, cursor
+
+    def estatisticas_auditoria(self):
+        """Agregado por usuário calculado pelo banco"""
+        cursor = self._conexao().execute("""
+            SELECT user, COUNT(*), SUM(approved_ai), AVG(confidence), MAX(timestamp)
+            FROM auditoria GROUP BY user
+        """)
+        return {
+            user: {
+                "total_classifications": total,
+                "ai_approvals": aprovacoes or 0,
+                "manual_classifications": total - (aprovacoes or 0),
+                "avg_confidence": media or 0.0,
+                "last_activity": ultima
+            }
+            for user, total, aprovacoes, media, ultima in cursor
+        }
+
+    def exportar(self, destino_csv=None, destino_parquet=None):
+        """Exporta a tabela de classificações para o pipeline de retreinamento"""
+        df = self.classificacoes()
+        if destino_csv:
+            df.to_csv(destino_csv, index=False, encoding='utf-8')
+        if destino_parquet:
+            df.to_parquet(destino_parquet, index=False)
+
+# ========================================
+# SELEÇÃO DO BACKEND
+# ========================================
+
+def criar_armazenamento(backend=None):
+    """Cria o backend configurado (ROTULOS_BACKEND=arquivos|sqlite)"""
+    backend = (backend or os.environ.get(BACKEND_ENV, "arquivos")).lower()
+    if backend == "sqlite":
+        return ArmazenamentoSQLite(os.environ.get(SQLITE_ENV, SQLITE_FILE))
+    if backend == "arquivos":
+        return ArmazenamentoArquivos()
+    raise ValueError(f"Backend de armazenamento desconhecido: {backend}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Exporta as classificações humanas para retreinamento")
+    parser.add_argument("--backend", default=None, help="arquivos ou sqlite (padrão: $ROTULOS_BACKEND)")
+    parser.add_argument("--csv", default=str(HUMAN_LABELS_DIR / "human_classifications.csv"))
+    parser.add_argument("--parquet", default=str(HUMAN_LABELS_DIR / "training_ready.parquet"))
+    args = parser.parse_args()
+
+    criar_armazenamento(args.backend).exportar(args.csv, args.parquet)
+    print(f"Exportado para {args.csv} e {args.parquet}")
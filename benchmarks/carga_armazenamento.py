@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Teste de Carga - Backends de armazenamento com vários anotadores simultâneos
+Verifica perda de atualizações e a evolução da latência por salvamento
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from datetime import datetime
+from multiprocessing import Pool
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from armazenamento import ArmazenamentoArquivos, ArmazenamentoSQLite  # noqa: E402
+
+
+def criar_backend(backend, diretorio):
+    if backend == "sqlite":
+        return ArmazenamentoSQLite(Path(diretorio) / "rotulos.db")
+    return ArmazenamentoArquivos(diretorio)
+
+
+def anotador(args):
+    """Simula um anotador salvando classificações em sequência"""
+    backend, diretorio, indice, salvamentos, formularios = args
+    armazenamento = criar_backend(backend, diretorio)
+    usuario = f"anotador_{indice:03d}"
+    latencias = []
+
+    for i in range(salvamentos):
+        # Metade das escritas revisita formulários já classificados (upsert)
+        forms_number = i % formularios
+        timestamp = datetime.now().isoformat()
+        dados_ml = {
+            'forms_number': forms_number,
+            'forms_text': f"texto do formulário {forms_number}",
+            'forms_title': f"formulário {forms_number}",
+            'human_category': f"categoria_{i}",
+            'human_subcategory': "Outros",
+            'confidence_human': 0.8,
+            'classifier_name': usuario,
+            'classification_timestamp': timestamp,
+            'comments': "",
+            'approved_ai': False,
+            'classification_type': 'manual',
+        }
+        entrada = {
+            "timestamp": timestamp,
+            "user": usuario,
+            "forms_number": forms_number,
+            "action": "classification",
+            "confidence": 0.8,
+            "approved_ai": False,
+        }
+
+        inicio = time.perf_counter()
+        armazenamento.salvar_classificacao(dados_ml)
+        armazenamento.registrar_auditoria(entrada)
+        armazenamento.marcar_analisado(forms_number, usuario)
+        latencias.append(time.perf_counter() - inicio)
+
+    return usuario, latencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backend", choices=["sqlite", "arquivos"], default="sqlite")
+    parser.add_argument("--anotadores", type=int, default=16)
+    parser.add_argument("--salvamentos", type=int, default=200)
+    parser.add_argument("--formularios", type=int, default=100, help="Formulários distintos por anotador")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        criar_backend(args.backend, diretorio)
+
+        tarefas = [(args.backend, diretorio, i, args.salvamentos, args.formularios) for i in range(args.anotadores)]
+        inicio = time.perf_counter()
+        with Pool(args.anotadores) as pool:
+            resultados = pool.map(anotador, tarefas)
+        duracao = time.perf_counter() - inicio
+
+        armazenamento = criar_backend(args.backend, diretorio)
+        df = armazenamento.classificacoes()
+        estatisticas = armazenamento.estatisticas_auditoria()
+
+        # Conferência de perda de atualizações
+        esperadas = args.anotadores * min(args.salvamentos, args.formularios)
+        ultima_categoria = f"categoria_{args.salvamentos - 1}"
+        perdidas_upsert = 0
+        for usuario, _ in resultados:
+            linhas = df[(df['classifier_name'] == usuario) & (df['forms_number'] == (args.salvamentos - 1) % args.formularios)]
+            if linhas.empty or linhas.iloc[0]['human_category'] != ultima_categoria:
+                perdidas_upsert += 1
+        eventos = sum(s["total_classifications"] for s in estatisticas.values())
+
+        print(f"Backend: {args.backend} | {args.anotadores} anotadores x {args.salvamentos} salvamentos")
+        print(f"Tempo total: {duracao:.2f}s ({args.anotadores * args.salvamentos / duracao:.0f} salvamentos/s)")
+        print(f"Classificações: {len(df)} de {esperadas} esperadas")
+        print(f"Upserts finais perdidos: {perdidas_upsert}")
+        print(f"Eventos de auditoria: {eventos} de {args.anotadores * args.salvamentos} esperados")
+        for usuario, latencias in resultados:
+            if len(armazenamento.formularios_analisados(usuario)) != min(args.salvamentos, args.formularios):
+                print(f"Progresso incompleto para {usuario}")
+
+        # Latência por decil de salvamentos: deve permanecer estável
+        latencias = np.array([lat for _, lat in resultados])
+        print("\nLatência por salvamento (ms) ao longo da campanha:")
+        for decil, bloco in enumerate(np.array_split(latencias, 10, axis=1)):
+            print(f"  decil {decil + 1:2d}: p50={np.percentile(bloco, 50) * 1000:7.2f}  p99={np.percentile(bloco, 99) * 1000:7.2f}")
+
+
+if __name__ == "__main__":
+    main()
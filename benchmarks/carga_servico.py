@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Teste de Carga - Serviço de classificação com e sem micro-batching
+Sobe o serviço em um subprocesso (ou usa --url), dispara requisições concorrentes e mede latência e vazão
+Os textos vêm de um conjunto de --distintos formulários reenviados com variações de caixa, acentos e espaços
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import socket
+import subprocess
+import sys
+import time
+import unicodedata
+from pathlib import Path
+
+import httpx
+import numpy as np
+import pandas as pd
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def variantes(textos, quantidade, semente=42):
+    """Reenvios do mesmo texto como os sistemas de origem fazem: caixa, acentos e espaços alterados"""
+    gerador = np.random.default_rng(semente)
+    transformacoes = [
+        lambda t: t,
+        str.upper,
+        str.lower,
+        lambda t: "".join(c for c in unicodedata.normalize('NFKD', t) if not unicodedata.combining(c)),
+        lambda t: "  " + t.replace(" ", "   ") + "\n",
+    ]
+    return [transformacoes[gerador.integers(len(transformacoes))](textos[gerador.integers(len(textos))])
+            for _ in range(quantidade)]
+
+
+def subir_servico(porta, espera_ms, tamanho_maximo, cache_itens):
+    processo = subprocess.Popen(
+        [sys.executable, str(RAIZ / "servico_classificacao.py"), "--porta", str(porta), "--sem-cache",
+         "--espera-ms", str(espera_ms), "--tamanho-maximo", str(tamanho_maximo),
+         "--cache-itens", str(cache_itens)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{porta}"
+    for _ in range(300):
+        try:
+            if httpx.get(f"{url}/saude", timeout=1).status_code == 200:
+                return processo, url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    processo.kill()
+    raise RuntimeError("Serviço não respondeu em 30s")
+
+
+async def _conexao(host, porta, rota, corpos, latencias):
+    """Cliente HTTP/1.1 keep-alive mínimo: o gerador de carga não deve disputar CPU com o serviço"""
+    leitor, escritor = await asyncio.open_connection(host, porta)
+    try:
+        for corpo in corpos:
+            inicio = time.perf_counter()
+            escritor.write(
+                b"POST " + rota + b" HTTP/1.1\r\nHost: servico\r\nContent-Type: application/json\r\n"
+                b"Content-Length: " + str(len(corpo)).encode() + b"\r\n\r\n" + corpo
+            )
+            cabecalho = await leitor.readuntil(b"\r\n\r\n")
+            if not cabecalho.startswith(b"HTTP/1.1 200"):
+                raise RuntimeError(cabecalho.split(b"\r\n", 1)[0].decode())
+            tamanho = int(re.search(rb"(?i)content-length: *(\d+)", cabecalho).group(1))
+            await leitor.readexactly(tamanho)
+            latencias.append(time.perf_counter() - inicio)
+    finally:
+        escritor.close()
+
+
+async def disparar(url, textos, requisicoes, concorrencia, tamanho_lote=1):
+    """`concorrencia` conexões em laço fechado; retorna latências (s), duração total e /saude"""
+    endereco = httpx.URL(url)
+    if tamanho_lote > 1:
+        rota = b"/classificar/lote"
+        corpos = [json.dumps({'formularios': [
+            {'forms_number': j, 'forms_text': textos[j % len(textos)]}
+            for j in range(i * tamanho_lote, (i + 1) * tamanho_lote)
+        ]}).encode() for i in range(requisicoes)]
+    else:
+        rota = b"/classificar"
+        corpos = [json.dumps({'forms_number': i, 'forms_text': textos[i % len(textos)]}).encode()
+                  for i in range(requisicoes)]
+    latencias = []
+    inicio = time.perf_counter()
+    await asyncio.gather(*(_conexao(endereco.host, endereco.port, rota, corpos[c::concorrencia], latencias)
+                           for c in range(concorrencia)))
+    duracao = time.perf_counter() - inicio
+    estatisticas = httpx.get(f"{url}/saude").json()
+    return np.array(latencias), duracao, estatisticas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="p50/p99 e requisições/s do serviço de classificação")
+    parser.add_argument("--dados", default="dados_embbeding.csv")
+    parser.add_argument("--url", default=None, help="Serviço já em execução (senão sobe um por configuração)")
+    parser.add_argument("--requisicoes", type=int, default=3000)
+    parser.add_argument("--concorrencia", type=int, default=64)
+    parser.add_argument("--distintos", type=int, default=1000, help="Formulários distintos reenviados")
+    parser.add_argument("--tamanho-lote", type=int, default=1, help="Textos por requisição (> 1 usa /classificar/lote)")
+    args = parser.parse_args()
+
+    corpus = pd.read_csv(args.dados, encoding='utf-8-sig')['forms_text'].fillna("").tolist()
+    textos = variantes(corpus[:args.distintos], args.requisicoes * args.tamanho_lote)
+    aquecimento = corpus[args.distintos:args.distintos + 200] or corpus[:200]
+    configuracoes = [("sem micro-batching", 0.0, 1, 0), ("micro-batching 2 ms", 2.0, 256, 0),
+                     ("micro-batching 5 ms", 5.0, 256, 0), ("micro-batching 2 ms + cache", 2.0, 256, 100_000)]
+    if args.url:
+        configuracoes = [("serviço externo", None, None, None)]
+
+    print(f"{args.requisicoes} requisições de {args.tamanho_lote} texto(s) sobre {min(args.distintos, len(corpus))} textos distintos, "
+          f"{args.concorrencia} clientes concorrentes")
+    for nome, espera_ms, tamanho_maximo, cache_itens in configuracoes:
+        processo, url = (None, args.url) if args.url else \
+            subir_servico(porta_livre(), espera_ms, tamanho_maximo, cache_itens)
+        try:
+            asyncio.run(disparar(url, aquecimento, len(aquecimento), args.concorrencia))
+            latencias, duracao, estatisticas = asyncio.run(
+                disparar(url, textos, args.requisicoes, args.concorrencia, args.tamanho_lote)
+            )
+        finally:
+            if processo is not None:
+                processo.terminate()
+                processo.wait()
+        p50, p99 = np.percentile(latencias, [50, 99]) * 1000
+        cache = estatisticas.get('cache')
+        detalhe = (f" | cache {cache['taxa_acerto']:.0%} acertos, {cache['itens']} itens, {cache['bytes'] / 1024:.0f} KiB"
+                   if cache else "")
+        print(f"{nome:>28}: p50 {p50:6.1f} ms | p99 {p99:6.1f} ms | {len(latencias) / duracao:7.0f} req/s | "
+              f"{len(latencias) * args.tamanho_lote / duracao:7.0f} textos/s | "
+              f"{estatisticas['pedidos_por_lote']:.1f} pedidos por lote{detalhe}")
+
+
+if __name__ == "__main__":
+    main()
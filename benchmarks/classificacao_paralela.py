@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark - Aceleração da classificação em lote com o número de processos
+Corpus replicado (sem cache de embeddings, para medir a embedding de fato); cada configuração
+é comparada com a classificação em um único processo, linha a linha.
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from classificacao_paralela import classificar_paralelo  # noqa: E402
+from embeddings import EmbedderHash  # noqa: E402
+from motor_classificacao import LIMIAR_PADRAO, MotorClassificacao, Prototipos  # noqa: E402
+
+
+def main():
+    nucleos = os.cpu_count() or 1
+    padrao = sorted({2 ** i for i in range(nucleos.bit_length()) if 2 ** i <= nucleos} | {nucleos})
+    parser = argparse.ArgumentParser(description="Mede a aceleração do pool de processos")
+    parser.add_argument("--dados", default="dados_embbeding.csv")
+    parser.add_argument("--linhas", type=int, default=60_000)
+    parser.add_argument("--processos", default=",".join(map(str, padrao)))
+    parser.add_argument("--repeticoes", type=int, default=2)
+    args = parser.parse_args()
+
+    dados = pd.read_csv(args.dados, encoding='utf-8-sig', usecols=['forms_number', 'forms_text'])
+    copias = -(-args.linhas // len(dados))
+    textos = (dados['forms_text'].fillna("").tolist() * copias)[:args.linhas]
+    # forms_number embaralhados: a fragmentação precisa reordenar e devolver na ordem de entrada
+    forms = np.random.default_rng(42).permutation(args.linhas).astype(np.int64)
+
+    embedder = EmbedderHash()
+    # Só a vazão e a igualdade com o motor são medidas: qualquer limiar serve
+    motor = MotorClassificacao(embedder, Prototipos.de_descricoes(embedder), LIMIAR_PADRAO)
+    print(f"{args.linhas} formulários, {nucleos} núcleo(s) disponível(is)")
+
+    inicio = time.perf_counter()
+    referencia = motor.classificar_lote(forms, textos)
+    base = time.perf_counter() - inicio
+    print(f"{'motor.classificar_lote':>24}: {base:6.2f}s ({args.linhas / base:>8,.0f}/s)")
+
+    for processos in [int(p) for p in args.processos.split(",")]:
+        tempos = []
+        for _ in range(args.repeticoes):
+            inicio = time.perf_counter()
+            resultado = classificar_paralelo(forms, textos, motor, processos)
+            tempos.append(time.perf_counter() - inicio)
+        tempo = min(tempos)
+        iguais = (resultado['level1_category'].equals(referencia['level1_category'])
+                  and resultado['forms_number'].equals(referencia['forms_number']))
+        diferenca = np.abs(resultado['level1_confidence'].to_numpy() - referencia['level1_confidence'].to_numpy()).max()
+        print(f"{processos:>14} processo(s): {tempo:6.2f}s ({args.linhas / tempo:>8,.0f}/s) "
+              f"aceleração {base / tempo:4.2f}x | eficiência {base / tempo / min(processos, nucleos):4.0%} | "
+              f"idêntico: {iguais} (dif. máx. confiança {diferenca:.1e})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark - Vazão de embeddings contra o servidor Ollama falso (latência simulada, sem GPU)
+Compara uma requisição por texto (como um laço com ollama.embeddings) com o ClienteOllama em
+lotes e com requisições simultâneas; depois repete com falhas 503 e através do CacheEmbeddings.
+"""
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cache_embeddings import CacheEmbeddings  # noqa: E402
+from embeddings_ollama import ClienteOllama, EmbedderOllama  # noqa: E402
+from servidor_ollama_falso import ServidorOllamaFalso, vetor_falso  # noqa: E402
+
+
+def sequencial(url, textos):
+    """Uma requisição por texto, uma conexão nova por requisição"""
+    for texto in textos:
+        httpx.post(f"{url}/api/embeddings", json={'model': "nomic-embed-text", 'prompt': texto}).raise_for_status()
+
+
+async def com_cliente(url, textos, tamanho_lote, simultaneas):
+    async with ClienteOllama(url, tamanho_lote=tamanho_lote, simultaneas=simultaneas, espera_inicial=0.01) as cliente:
+        vetores = await cliente.embed(textos)
+    return vetores, cliente.estatisticas()
+
+
+def medir(servidor, nome, funcao, textos):
+    antes = dict(servidor.contagens)
+    inicio = time.perf_counter()
+    resultado = funcao()
+    tempo = time.perf_counter() - inicio
+    conexoes = servidor.contagens['conexoes'] - antes['conexoes']
+    requisicoes = servidor.contagens['requisicoes'] - antes['requisicoes']
+    falhas = servidor.contagens['falhas'] - antes['falhas']
+    print(f"{nome:>34}: {tempo:6.2f}s ({len(textos) / tempo:>7,.0f} textos/s) | "
+          f"{requisicoes:5d} requisições, {conexoes:4d} conexões, {falhas:3d} falhas 503")
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vazão do cliente de embeddings Ollama")
+    parser.add_argument("--dados", default="dados_embbeding.csv")
+    parser.add_argument("--textos", type=int, default=2000)
+    parser.add_argument("--latencia-ms", type=float, default=5.0)
+    parser.add_argument("--latencia-texto-ms", type=float, default=0.5)
+    parser.add_argument("--paralelo", type=int, default=4, help="Requisições atendidas ao mesmo tempo pelo servidor")
+    parser.add_argument("--taxa-falhas", type=float, default=0.1)
+    args = parser.parse_args()
+
+    textos = pd.read_csv(args.dados, encoding='utf-8-sig', usecols=['forms_text'])['forms_text'].fillna("")
+    textos = textos.drop_duplicates().tolist()
+    textos = (textos * -(-args.textos // len(textos)))[:args.textos]
+    vetores_brutos = {texto: vetor_falso(texto) for texto in textos}
+    esperado = np.vstack([vetores_brutos[texto] for texto in textos])
+
+    with ServidorOllamaFalso(latencia_ms=args.latencia_ms, latencia_texto_ms=args.latencia_texto_ms,
+                             paralelo=args.paralelo) as servidor:
+        url = servidor.url
+        print(f"{len(textos)} textos ({len(vetores_brutos)} distintos); servidor falso: {args.latencia_ms}ms + "
+              f"{args.latencia_texto_ms}ms/texto, {args.paralelo} em paralelo")
+
+        amostra = textos[:max(len(textos) // 10, 1)]
+        inicio = time.perf_counter()
+        medir(servidor, f"sequencial ({len(amostra)} textos)", lambda: sequencial(url, amostra), amostra)
+        estimado = (time.perf_counter() - inicio) * len(textos) / len(amostra)
+        print(f"{'':>34}  estimativa para {len(textos)} textos: {estimado:.1f}s")
+
+        for tamanho_lote, simultaneas in [(1, 8), (64, 1), (64, args.paralelo), (64, 2 * args.paralelo)]:
+            vetores, _ = medir(servidor, f"lote {tamanho_lote}, {simultaneas} simultânea(s)",
+                               lambda: asyncio.run(com_cliente(url, textos, tamanho_lote, simultaneas)), textos)
+            assert np.allclose(vetores, esperado, atol=1e-6)
+
+        servidor.taxa_falhas = args.taxa_falhas
+        vetores, estatisticas = medir(servidor, f"lote 64, {args.paralelo} simult., {args.taxa_falhas:.0%} de 503",
+                                      lambda: asyncio.run(com_cliente(url, textos, 64, args.paralelo)), textos)
+        assert np.allclose(vetores, esperado, atol=1e-6)
+        print(f"{'':>34}  {estatisticas['repeticoes']} novas tentativas, todos os vetores corretos")
+        servidor.taxa_falhas = 0.0
+
+        with tempfile.TemporaryDirectory() as diretorio, EmbedderOllama(url=url, simultaneas=args.paralelo) as ollama:
+            cache = CacheEmbeddings(ollama, diretorio)
+            vetores = medir(servidor, "CacheEmbeddings (frio)", lambda: cache.embed(textos), textos)
+            assert np.allclose(vetores, esperado, atol=1e-6)
+            # Chave pelo texto exato: variantes de caixa/acento guardam cada uma o seu vetor
+            vetores = medir(servidor, "CacheEmbeddings (quente)", lambda: cache.embed(textos[::-1]), textos)
+            assert np.allclose(vetores, esperado[::-1], atol=1e-6)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Simulação - Eficiência de rotulagem da fila de aprendizado ativo vs ordem do CSV
+Um oráculo rotula em lotes; os protótipos são recalculados a cada lote e a acurácia medida no corpus
+
+"fila_ativa" é a ordem da interface: incerteza dos protótipos atuais (reavaliada após cada
+salvamento no app, após cada lote aqui) e redundância com os já rotulados.
+"fila_estatica" é a ordem anterior da interface (incerteza fixa de level1_all_scores); como o
+oráculo é o argmax desses mesmos scores, os formulários de menor margem são justamente os de
+rótulo mais ambíguo e ela fica abaixo até da ordem do CSV.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cache_embeddings import CacheEmbeddings  # noqa: E402
+from embeddings import EmbedderHash  # noqa: E402
+from fila_aprendizado import FilaAprendizado, construir_fila  # noqa: E402
+from matriz_scores import MatrizScores  # noqa: E402
+from motor_classificacao import Prototipos  # noqa: E402
+
+
+def acuracia(embeddings, verdade, prototipos):
+    previstos = np.array(prototipos.categorias, dtype=object)[(embeddings @ prototipos.matriz.T).argmax(axis=1)]
+    return float((previstos == verdade).mean())
+
+
+def simular(estrategia, embeddings, verdade, base, fila_estatica, lote, orcamento, semente):
+    """Curva (rótulos, acurácia) para uma estratégia de ordenação"""
+    n = len(verdade)
+    rotulados = np.zeros(n, dtype=bool)
+    prototipos = base
+    curva = [(0, acuracia(embeddings, verdade, prototipos))]
+    aleatoria = np.random.default_rng(semente).permutation(n)
+
+    while rotulados.sum() < min(orcamento, n):
+        pendentes = np.flatnonzero(~rotulados)
+        if estrategia == "csv":
+            escolhidos = pendentes[:lote]
+        elif estrategia == "aleatoria":
+            escolhidos = aleatoria[~rotulados[aleatoria]][:lote]
+        elif estrategia == "fila_estatica":
+            prioridades = fila_estatica.prioridades()[pendentes]
+            escolhidos = pendentes[np.argsort(-prioridades, kind='stable')[:lote]]
+        else:
+            # Como na interface: incerteza dos protótipos atuais + redundância com os já rotulados
+            fila = FilaAprendizado(np.arange(n), np.zeros(n), embeddings)
+            fila.reavaliar(prototipos)
+            fila.registrar_rotulos(np.flatnonzero(rotulados))
+            prioridades = fila.prioridades()[pendentes]
+            escolhidos = pendentes[np.argsort(-prioridades, kind='stable')[:lote]]
+
+        rotulados[escolhidos] = True
+        if estrategia == "fila_estatica":
+            fila_estatica.registrar_rotulos(fila_estatica.forms_number[escolhidos])
+        prototipos = Prototipos.de_rotulos(embeddings[rotulados], verdade[rotulados], base)
+        curva.append((int(rotulados.sum()), acuracia(embeddings, verdade, prototipos)))
+    return curva
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara ordens de rotulagem por acurácia vs número de rótulos")
+    parser.add_argument("--dados", default="dados_embbeding.csv")
+    parser.add_argument("--classificacoes", default="level1_classifications.csv")
+    parser.add_argument("--lote", type=int, default=25)
+    parser.add_argument("--orcamento", type=int, default=500)
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    dados = pd.read_csv(args.dados, encoding='utf-8-sig')
+    classificacoes = pd.read_csv(args.classificacoes)
+
+    # Oráculo: categoria de maior score no arquivo de classificações (proxy do rótulo humano)
+    matriz = MatrizScores.decodificar(classificacoes['forms_number'].to_numpy(),
+                                      classificacoes['level1_all_scores'].tolist())
+    linhas = matriz.posicoes(dados['forms_number'].to_numpy())
+    dados = dados[linhas >= 0].reset_index(drop=True)
+    linhas = linhas[linhas >= 0]
+    verdade = np.array(matriz.categorias, dtype=object)[np.nanargmax(np.asarray(matriz.scores)[linhas], axis=1)]
+
+    embedder = CacheEmbeddings(EmbedderHash())
+    inicio = time.perf_counter()
+    embeddings = embedder.embed(dados['forms_text'].tolist())
+    print(f"{len(dados)} formulários, embeddings em {time.perf_counter() - inicio:.2f}s")
+
+    base = Prototipos.de_descricoes(embedder)
+    estrategias = ["csv", "aleatoria", "fila_estatica", "fila_ativa"]
+    curvas = {}
+    for estrategia in estrategias:
+        # Ordem anterior da interface: incerteza dos scores do arquivo, linhas alinhadas com `dados`
+        fila_estatica = None
+        if estrategia == "fila_estatica":
+            fila_estatica = construir_fila(dados['forms_number'].to_numpy(), classificacoes, embeddings)
+        inicio = time.perf_counter()
+        curvas[estrategia] = simular(estrategia, embeddings, verdade, base, fila_estatica,
+                                     args.lote, args.orcamento, args.semente)
+        print(f"{estrategia:>14}: {time.perf_counter() - inicio:.2f}s")
+
+    marcos = sorted({r for r, _ in curvas["csv"]} & {r for r in range(0, args.orcamento + 1, 100)})
+    tabela = pd.DataFrame({e: dict(c) for e, c in curvas.items()}).loc[marcos]
+    tabela.index.name = "rótulos"
+    print("\nAcurácia contra o oráculo:")
+    print((tabela * 100).round(1).to_string())
+
+    print("\nÁrea sob a curva (média da acurácia ao longo do orçamento):")
+    for estrategia, curva in curvas.items():
+        interface = "  <- ordem da interface" if estrategia == "fila_ativa" else ""
+        print(f"{estrategia:>14}: {np.mean([a for _, a in curva]) * 100:.1f}%{interface}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark - Tempo do retreino linear em dezenas de milhares de rótulos
+Dataset sintético: cada formulário rotulado por vários anotadores com a categoria de maior score (proxy)
+Os textos se repetem entre anotadores, como no uso real; a acurácia do holdout é otimista por isso
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dataset_treino import DatasetTreino  # noqa: E402
+from matriz_scores import MatrizScores  # noqa: E402
+from retreino import carregar_rotulos, retreinar  # noqa: E402
+
+
+def gerar_dataset(diretorio, dados, classificacoes, rotulos, semente):
+    """Grava `rotulos` classificações em fragmentos, como sessões de rotulagem sucessivas"""
+    matriz = MatrizScores.decodificar(classificacoes['forms_number'].to_numpy(),
+                                      classificacoes['level1_all_scores'].tolist())
+    linhas = matriz.posicoes(dados['forms_number'].to_numpy())
+    dados = dados[linhas >= 0].reset_index(drop=True)
+    categorias = np.array(matriz.categorias, dtype=object)[np.nanargmax(np.asarray(matriz.scores)[linhas[linhas >= 0]], axis=1)]
+
+    gerador = np.random.default_rng(semente)
+    escolhidos = gerador.integers(0, len(dados), rotulos)
+    registros = [{
+        'forms_number': int(dados['forms_number'].iloc[i]),
+        'forms_text': dados['forms_text'].iloc[i],
+        'human_category': categorias[i],
+        'confidence_human': float(gerador.choice([0.6, 0.8, 1.0])),
+        'classifier_name': f"anotador_{j}",
+        'classification_timestamp': f"{j:08d}",
+        'ai_category': categorias[i] if gerador.random() < 0.7 else "",
+    } for j, i in enumerate(escolhidos)]
+
+    dataset = DatasetTreino(diretorio, parquet_legado=None)
+    for inicio in range(0, len(registros), 2000):
+        dataset.acrescentar_lote(registros[inicio:inicio + 2000])
+    return dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede leitura, features e treino do retreino linear")
+    parser.add_argument("--dados", default="dados_embbeding.csv")
+    parser.add_argument("--classificacoes", default="level1_classifications.csv")
+    parser.add_argument("--rotulos", type=int, default=30000)
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    dados = pd.read_csv(args.dados, encoding='utf-8-sig')
+    classificacoes = pd.read_csv(args.classificacoes)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        dataset = gerar_dataset(diretorio, dados, classificacoes, args.rotulos, args.semente)
+
+        # Primeira sessão: 2/3 dos rótulos do zero; segunda: tudo com warm-start
+        inicio = time.perf_counter()
+        df = carregar_rotulos(dataset)
+        leitura = time.perf_counter() - inicio
+        parcial = df.iloc[:len(df) * 2 // 3]
+
+        for nome, rotulos, anterior in [("do zero", parcial, None), ("warm-start", df, "anterior")]:
+            inicio = time.perf_counter()
+            modelo, relatorio = retreinar(rotulos, modelo if anterior else None)
+            total = time.perf_counter() - inicio
+            etapas = ", ".join(f"{k} {v:.2f}s" for k, v in relatorio['tempos_segundos'].items())
+            print(f"{nome:>10}: {len(rotulos)} rótulos em {total:.2f}s ({etapas}) | "
+                  f"acurácia holdout {relatorio['modelo']['acuracia']:.1%}")
+        print(f"Leitura do dataset ({len(df)} rótulos, {len(dataset.arquivos())} arquivos): {leitura:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark - Acurácia de protótipos, kNN e combinação em função do número de rótulos humanos
+Oráculo = categoria de maior score em level1_classifications (proxy do rótulo humano); os protótipos
+são os do motor local (EmbedderHash), então discordam do oráculo como um modelo real discordaria.
+A "cauda" são os formulários que o motor manda para Nova_Classe (score abaixo do limiar).
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cache_embeddings import CacheEmbeddings  # noqa: E402
+from embeddings import EmbedderHash  # noqa: E402
+from indice_vizinhos import IndiceVizinhos  # noqa: E402
+from matriz_scores import MatrizScores  # noqa: E402
+from motor_classificacao import Prototipos, calibrar_limiar  # noqa: E402
+from votacao_knn import VotadorKNN  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara protótipos, kNN e a combinação")
+    parser.add_argument("--dados", default="dados_embbeding.csv")
+    parser.add_argument("--classificacoes", default="level1_classifications.csv")
+    parser.add_argument("--rotulos", default="250,500,1000,2000")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    dados = pd.read_csv(args.dados, encoding='utf-8-sig')
+    classificacoes = pd.read_csv(args.classificacoes)
+    matriz = MatrizScores.decodificar(classificacoes['forms_number'].to_numpy(),
+                                      classificacoes['level1_all_scores'].tolist())
+    linhas = matriz.posicoes(dados['forms_number'].to_numpy())
+    dados = dados[linhas >= 0].reset_index(drop=True)
+    verdade = np.array(matriz.categorias, dtype=object)[np.nanargmax(np.asarray(matriz.scores)[linhas[linhas >= 0]], axis=1)]
+
+    embedder = CacheEmbeddings(EmbedderHash())
+    embeddings = embedder.embed(dados['forms_text'].fillna("").tolist())
+    prototipos = Prototipos.de_descricoes(embedder)
+    scores_prototipos = embeddings @ prototipos.matriz.T
+    # Limiar do EmbedderHash calibrado para a taxa de automáticas do pipeline original
+    taxa_automatica = (classificacoes['level1_classification_type'] == 'automatic').mean()
+    limiar = calibrar_limiar(scores_prototipos, taxa_automatica)
+    cauda = scores_prototipos.max(axis=1) < limiar
+    forms = dados['forms_number'].to_numpy()
+    print(f"{len(dados)} formulários, {int(cauda.sum())} na cauda Nova_Classe do motor local (limiar {limiar:.3f})")
+
+    linhas_tabela = []
+    ordem = np.random.default_rng(args.semente).permutation(len(dados))
+    for quantidade in [int(q) for q in args.rotulos.split(",")]:
+        rotulados = ordem[:quantidade]
+        teste = np.setdiff1d(np.arange(len(dados)), rotulados)
+        indice = IndiceVizinhos(embedder)
+        indice.adicionar_lote(forms[rotulados], dados['forms_text'].iloc[rotulados].fillna("").tolist(),
+                              verdade[rotulados])
+        votador = VotadorKNN(indice)
+
+        inicio = time.perf_counter()
+        scores, categorias, com_votos = votador.combinar(embeddings, scores_prototipos, prototipos.categorias)
+        tempo = time.perf_counter() - inicio
+        _, fatias, categorias_knn = votador.scores_knn(embeddings)
+
+        previsoes = {
+            "protótipos": np.array(prototipos.categorias, dtype=object)[scores_prototipos.argmax(axis=1)],
+            "kNN": np.where(com_votos, np.array(categorias_knn, dtype=object)[fatias.argmax(axis=1)], None),
+            "combinado": np.array(categorias, dtype=object)[scores.argmax(axis=1)],
+        }
+        confianca = scores.max(axis=1)
+        for nome, previsto in previsoes.items():
+            acertos = previsto == verdade
+            linhas_tabela.append({
+                'rótulos': quantidade, 'método': nome,
+                'acurácia': acertos[teste].mean(),
+                'acurácia cauda': acertos[teste][cauda[teste]].mean(),
+            })
+        linhas_tabela[-1]['cauda com sugestão'] = (confianca[teste][cauda[teste]] >= limiar).mean()
+        linhas_tabela[-1]['tempo lote (s)'] = tempo
+
+    tabela = pd.DataFrame(linhas_tabela).set_index(['rótulos', 'método'])
+    for coluna in ['acurácia', 'acurácia cauda', 'cauda com sugestão']:
+        tabela[coluna] = (tabela[coluna] * 100).round(1)
+    print(tabela.round(3).fillna("").to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Cache Colunar - Conversão única de CSV para Arrow (Feather v2) mapeado em memória
+O cache é invalidado automaticamente quando mtime/tamanho e hash do CSV mudam
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+CACHE_DIR = Path("data/cache")
+
+# Strings ficam em buffers Arrow (sem objetos Python por linha)
+TIPOS_PANDAS = {
+    pa.string(): pd.StringDtype("pyarrow"),
+    pa.large_string(): pd.StringDtype("pyarrow"),
+}
+
+# ========================================
+# INVALIDAÇÃO
+# ========================================
+
+def hash_arquivo(caminho, bloco=1024 * 1024):
+    """SHA-256 do conteúdo do arquivo"""
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for parte in iter(lambda: f.read(bloco), b""):
+            sha.update(parte)
+    return sha.hexdigest()
+
+def assinatura_arquivo(caminho):
+    """Assinatura barata: tamanho e mtime em nanossegundos"""
+    stat = Path(caminho).stat()
+    return {"tamanho": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def cache_valido(origem, arquivo_meta):
+    """Verifica se o cache corresponde à origem; o hash só é calculado quando o mtime muda"""
+    arquivo_meta = Path(arquivo_meta)
+    if not arquivo_meta.exists():
+        return False
+    with open(arquivo_meta, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+
+    assinatura = assinatura_arquivo(origem)
+    if assinatura["tamanho"] == meta.get("tamanho") and assinatura["mtime_ns"] == meta.get("mtime_ns"):
+        return True
+    if assinatura["tamanho"] != meta.get("tamanho"):
+        return False
+
+    # Arquivo tocado mas com mesmo tamanho: conferir conteúdo
+    if hash_arquivo(origem) != meta.get("sha256"):
+        return False
+    gravar_meta(origem, arquivo_meta, meta["sha256"])
+    return True
+
+def gravar_meta(origem, arquivo_meta, sha256=None):
+    """Registra a assinatura da origem usada para gerar o cache"""
+    meta = assinatura_arquivo(origem)
+    meta["sha256"] = sha256 or hash_arquivo(origem)
+    meta["origem"] = str(origem)
+    temporario = Path(arquivo_meta).with_name(f".{Path(arquivo_meta).name}.{os.getpid()}.tmp")
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(temporario, arquivo_meta)
+
+# ========================================
+# CACHE
+# ========================================
+
+def nome_cache(origem):
+    """Nome base do cache: stem + hash do caminho absoluto (origens homônimas não colidem)"""
+    origem = Path(origem)
+    sufixo = hashlib.sha1(str(origem.resolve()).encode('utf-8')).hexdigest()[:8]
+    return f"{origem.stem}-{sufixo}"
+
+def caminhos_cache(origem, cache_dir=CACHE_DIR):
+    nome = nome_cache(origem)
+    return Path(cache_dir) / f"{nome}.arrow", Path(cache_dir) / f"{nome}.meta.json"
+
+def construir_cache(origem, cache_dir=CACHE_DIR, **read_csv_kwargs):
+    """Converte o CSV para Arrow sem compressão (requisito para mapeamento em memória)"""
+    destino, arquivo_meta = caminhos_cache(origem, cache_dir)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+
+    df = pd.read_csv(origem, encoding='utf-8-sig', **read_csv_kwargs)
+    temporario = destino.with_name(f".{destino.name}.{os.getpid()}.tmp")
+    feather.write_feather(df, temporario, compression='uncompressed')
+    os.replace(temporario, destino)
+    gravar_meta(origem, arquivo_meta)
+    return destino
+
+def carregar_tabela(origem, cache_dir=CACHE_DIR, **read_csv_kwargs):
+    """Tabela Arrow mapeada em memória, reconstruindo o cache se a origem mudou"""
+    destino, arquivo_meta = caminhos_cache(origem, cache_dir)
+    if not destino.exists() or not cache_valido(origem, arquivo_meta):
+        construir_cache(origem, cache_dir, **read_csv_kwargs)
+    return feather.read_table(destino, memory_map=True)
+
+def carregar_csv_colunar(origem, cache_dir=CACHE_DIR, **read_csv_kwargs):
+    """DataFrame a partir do cache colunar (substitui pd.read_csv)"""
+    tabela = carregar_tabela(origem, cache_dir, **read_csv_kwargs)
+    return tabela.to_pandas(types_mapper=TIPOS_PANDAS.get, split_blocks=True)
+
+
+if __name__ == "__main__":
+    import sys
+
+    for origem in sys.argv[1:] or ["dados_embbeding.csv"]:
+        print(f"Cache gerado: {construir_cache(origem)}")
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Cache de Embeddings - Vetores endereçados pelo hash do texto (normalizado, se o embedder normaliza)
+Matriz float32 append-only mapeada em memória + índice de chaves; só textos novos são embedados
+"""
+
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from cache_colunar import CACHE_DIR
+from embeddings import normalizar_texto
+from trava_arquivo import travar
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+EMBEDDINGS_DIR = CACHE_DIR / "embeddings"
+TAMANHO_CHAVE = 16
+
+
+def chave_texto(texto, normalizar=True):
+    """Hash (16 bytes) do texto normalizado - textos equivalentes compartilham a chave
+
+    Com normalizar=False, o hash é do texto exato (embedders que veem caixa e acentos).
+    """
+    texto = normalizar_texto(texto) if normalizar else (texto if isinstance(texto, str) else "")
+    return hashlib.blake2b(texto.encode('utf-8'), digest_size=TAMANHO_CHAVE).digest()
+
+# ========================================
+# CACHE
+# ========================================
+
+class CacheEmbeddings:
+    """Embedder com cache em disco; mesma interface (nome, dimensao, embed) do embedder envolvido"""
+
+    def __init__(self, embedder, diretorio=EMBEDDINGS_DIR):
+        self.embedder = embedder
+        self.nome = embedder.nome
+        self.dimensao = embedder.dimensao
+        # Chave pelo texto normalizado só quando o embedder dá o mesmo vetor às variantes
+        self.normaliza_texto = getattr(embedder, 'normaliza_texto', False)
+        # Um diretório por embedder: trocar o modelo nunca reaproveita vetores incompatíveis
+        self.diretorio = Path(diretorio) / self.nome
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self.arquivo_vetores = self.diretorio / "vetores.f32"
+        self.arquivo_chaves = self.diretorio / "chaves.bin"
+        # Serializa os acréscimos de todos os processos que usam o mesmo diretório
+        self.arquivo_trava = self.diretorio / ".trava"
+
+        self._lock = threading.Lock()
+        self._indice = {}
+        self._linhas = 0
+        self._vetores = np.empty((0, self.dimensao), dtype=np.float32)
+        self.acertos = 0
+        self.faltas = 0
+
+        self.atualizar()
+
+    def __len__(self):
+        return self._linhas
+
+    def __contains__(self, texto):
+        return self.chave(texto) in self._indice
+
+    def chave(self, texto):
+        return chave_texto(texto, self.normaliza_texto)
+
+    def atualizar(self):
+        """Indexa as chaves acrescentadas desde a última leitura e remapeia a matriz"""
+        with self._lock:
+            self._atualizar()
+
+    def _atualizar(self):
+        if not self.arquivo_chaves.exists() or not self.arquivo_vetores.exists():
+            return
+        tamanho_linha = self.dimensao * 4
+        # Vetores são gravados antes das chaves: linhas válidas = menor das duas contagens
+        linhas = min(
+            self.arquivo_chaves.stat().st_size // TAMANHO_CHAVE,
+            self.arquivo_vetores.stat().st_size // tamanho_linha,
+        )
+        if linhas <= self._linhas:
+            return
+
+        with open(self.arquivo_chaves, 'rb') as f:
+            f.seek(self._linhas * TAMANHO_CHAVE)
+            dados = f.read((linhas - self._linhas) * TAMANHO_CHAVE)
+        for i in range(linhas - self._linhas):
+            # A primeira ocorrência vence (duplicatas só existem em caches gravados sem a trava)
+            self._indice.setdefault(dados[i * TAMANHO_CHAVE:(i + 1) * TAMANHO_CHAVE], self._linhas + i)
+
+        self._vetores = np.memmap(self.arquivo_vetores, dtype=np.float32, mode='r',
+                                  shape=(linhas, self.dimensao))
+        self._linhas = linhas
+
+    def embed(self, textos):
+        """Matriz float32 (n_textos x dimensao); embeda apenas as chaves ausentes, uma vez cada"""
+        textos = list(textos)
+        if not textos:
+            return np.empty((0, self.dimensao), dtype=np.float32)
+        chaves = [self.chave(texto) for texto in textos]
+
+        with self._lock:
+            self._atualizar()
+            novas = {}
+            for chave, texto in zip(chaves, textos):
+                if chave not in self._indice and chave not in novas:
+                    novas[chave] = texto
+
+            acertos = sum(1 for chave in chaves if chave in self._indice)
+            self.acertos += acertos
+            self.faltas += len(chaves) - acertos
+
+            if novas:
+                self._acrescentar(list(novas), self.embedder.embed(list(novas.values())))
+
+            linhas = np.fromiter((self._indice[chave] for chave in chaves), dtype=np.int64, count=len(chaves))
+            return np.asarray(self._vetores[linhas], dtype=np.float32)
+
+    def acrescentar(self, textos, vetores):
+        """Grava vetores calculados fora do cache (ex.: em outros processos); chaves já presentes são ignoradas"""
+        with self._lock:
+            self._atualizar()
+            novas = {}
+            for i, texto in enumerate(textos):
+                chave = self.chave(texto)
+                if chave not in self._indice and chave not in novas:
+                    novas[chave] = i
+            if novas:
+                self._acrescentar(list(novas), np.asarray(vetores)[list(novas.values())])
+
+    def _acrescentar(self, chaves, vetores):
+        """Sob a trava do diretório: relê o índice, descarta linhas órfãs e grava só as chaves ainda ausentes
+
+        Uma interrupção entre as duas escritas deixa vetores sem chave (ou uma chave parcial);
+        ambos os arquivos são truncados às linhas válidas antes do acréscimo seguinte, então
+        chaves e vetores nunca se desalinham.
+        """
+        vetores = np.ascontiguousarray(vetores, dtype=np.float32)
+        with travar(self.arquivo_trava):
+            self._atualizar()
+            novas = [i for i, chave in enumerate(chaves) if chave not in self._indice]
+            if not novas:
+                return
+            with open(self.arquivo_vetores, 'ab') as f:
+                f.truncate(self._linhas * self.dimensao * 4)
+                f.write(vetores[novas].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.arquivo_chaves, 'ab') as f:
+                f.truncate(self._linhas * TAMANHO_CHAVE)
+                f.write(b"".join(chaves[i] for i in novas))
+            self._atualizar()
+
+    def estatisticas(self):
+        consultas = self.acertos + self.faltas
+        return {
+            'embedder': self.nome,
+            'vetores': self._linhas,
+            'acertos': self.acertos,
+            'faltas': self.faltas,
+            'taxa_acerto': self.acertos / consultas if consultas else 0.0,
+        }
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    import pandas as pd
+
+    from embeddings import EmbedderHash
+
+    caminho = sys.argv[1] if len(sys.argv) > 1 else "dados_embbeding.csv"
+    textos = pd.read_csv(caminho, encoding='utf-8-sig')['forms_text'].tolist()
+    cache = CacheEmbeddings(EmbedderHash())
+
+    for rodada in (1, 2):
+        inicio = time.perf_counter()
+        cache.embed(textos)
+        print(f"Rodada {rodada}: {time.perf_counter() - inicio:.2f}s  {cache.estatisticas()}")
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Cache de Resultados - Scores de classificação por texto normalizado, LRU com expiração
+A chave inclui a versão dos protótipos: após um retreino as entradas antigas deixam de ser servidas
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from cache_embeddings import chave_texto
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+CAPACIDADE_PADRAO = 100_000
+TTL_PADRAO_SEGUNDOS = 6 * 3600
+
+# ========================================
+# CACHE
+# ========================================
+
+class CacheResultados:
+    """Linha de scores (float32 por categoria) por (versão dos protótipos, hash do texto normalizado)
+
+    Maiúsculas, acentos e espaços não mudam a chave. Quando chega uma versão nova dos
+    protótipos, tudo o que pertence às versões anteriores é descartado de uma vez.
+    """
+
+    def __init__(self, capacidade=CAPACIDADE_PADRAO, ttl_segundos=TTL_PADRAO_SEGUNDOS, relogio=time.monotonic):
+        self.capacidade = capacidade
+        self.ttl = ttl_segundos
+        self._relogio = relogio
+        self._lock = threading.Lock()
+        self._itens = OrderedDict()
+        self._versao = None
+        self.bytes = 0
+        self.acertos = 0
+        self.faltas = 0
+        self.despejos = 0
+        self.expirados = 0
+        self.invalidacoes = 0
+
+    def __len__(self):
+        return len(self._itens)
+
+    @staticmethod
+    def _tamanho(chave, scores):
+        return sys.getsizeof(chave) + scores.nbytes + 200  # nó do OrderedDict, tupla e objeto ndarray
+
+    def _trocar_versao(self, versao):
+        if versao != self._versao:
+            if self._itens:
+                self.invalidacoes += len(self._itens)
+            self._itens.clear()
+            self.bytes = 0
+            self._versao = versao
+
+    def _remover(self, chave):
+        _, scores = self._itens.pop(chave)
+        self.bytes -= self._tamanho(chave, scores)
+
+    def obter_lote(self, textos, versao):
+        """(chaves, resultados): resultado None para as faltas; as chaves servem para gravar depois"""
+        chaves = [chave_texto(texto) for texto in textos]
+        agora = self._relogio()
+        resultados = []
+        with self._lock:
+            self._trocar_versao(versao)
+            for chave in chaves:
+                item = self._itens.get(chave)
+                if item is not None and item[0] <= agora:
+                    self._remover(chave)
+                    self.expirados += 1
+                    item = None
+                if item is None:
+                    self.faltas += 1
+                    resultados.append(None)
+                    continue
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                resultados.append(item[1])
+        return chaves, resultados
+
+    def gravar_lote(self, chaves, linhas_scores, versao):
+        expira_em = self._relogio() + self.ttl
+        with self._lock:
+            if versao != self._versao:
+                # Resultado de uma versão que já foi substituída
+                return
+            for chave, scores in zip(chaves, linhas_scores):
+                scores = np.array(scores, dtype=np.float32)  # cópia: não prende o lote inteiro na memória
+                if chave in self._itens:
+                    self._remover(chave)
+                self._itens[chave] = (expira_em, scores)
+                self.bytes += self._tamanho(chave, scores)
+            while len(self._itens) > self.capacidade:
+                self._remover(next(iter(self._itens)))
+                self.despejos += 1
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self.bytes = 0
+
+    def estatisticas(self):
+        consultas = self.acertos + self.faltas
+        return {
+            'versao': self._versao,
+            'itens': len(self._itens),
+            'capacidade': self.capacidade,
+            'ttl_segundos': self.ttl,
+            'bytes': self.bytes,
+            'acertos': self.acertos,
+            'faltas': self.faltas,
+            'taxa_acerto': self.acertos / consultas if consultas else 0.0,
+            'despejos': self.despejos,
+            'expirados': self.expirados,
+            'invalidacoes': self.invalidacoes,
+        }
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Classificação Paralela - Lote fragmentado por forms_number em um pool de processos
+Textos, protótipos, embeddings e scores ficam em arquivos mapeados em memória compartilhados (nada é serializado por linha)
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cache_embeddings import CacheEmbeddings
+from motor_classificacao import PROTOTIPOS_FILE, carregar_motor, gravar_classificacoes, montar_resultado
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+# Fragmentos por processo: fragmentos menores equilibram a carga quando os textos variam de tamanho
+FRAGMENTOS_POR_PROCESSO = 4
+TAMANHO_MINIMO_FRAGMENTO = 500
+
+# Em memória (tmpfs) quando disponível e com espaço livre (no Docker, /dev/shm tem 64 MB por padrão)
+MEMORIA_COMPARTILHADA_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+# Folga sobre o tamanho estimado da área antes de escolher a memória compartilhada
+MARGEM_MEMORIA_COMPARTILHADA = 1.5
+
+# ========================================
+# ÁREA COMPARTILHADA
+# ========================================
+
+def gravar_textos(diretorio, codificados):
+    """Blob UTF-8 contíguo + offsets (n + 1), como no armazém de textos"""
+    offsets = np.zeros(len(codificados) + 1, dtype=np.int64)
+    np.cumsum([len(c) for c in codificados], out=offsets[1:])
+    with open(Path(diretorio) / "textos.bin", 'wb') as f:
+        f.write(b"".join(codificados))
+    np.save(Path(diretorio) / "offsets.npy", offsets)
+
+def tamanho_area(codificados, matriz_prototipos, dimensao, com_vetores=True):
+    """Bytes ocupados pelos arquivos da área (textos, offsets, protótipos, scores e vetores)"""
+    n = len(codificados)
+    tamanho = sum(len(c) for c in codificados) + 8 * (n + 1) + matriz_prototipos.nbytes + 4 * n * len(matriz_prototipos)
+    return tamanho + (4 * n * dimensao if com_vetores else 0)
+
+def diretorio_area(tamanho):
+    """/dev/shm se couber com folga; senão o diretório temporário padrão (disco)"""
+    if MEMORIA_COMPARTILHADA_DIR is None:
+        return None
+    try:
+        livre = shutil.disk_usage(MEMORIA_COMPARTILHADA_DIR).free
+    except OSError:
+        return None
+    return MEMORIA_COMPARTILHADA_DIR if livre >= tamanho * MARGEM_MEMORIA_COMPARTILHADA else None
+
+def criar_area(diretorio, codificados, matriz_prototipos, dimensao, com_vetores=True):
+    """Arquivos lidos/escritos pelos processos: cada processo só toca as linhas do seu fragmento"""
+    diretorio = Path(diretorio)
+    gravar_textos(diretorio, codificados)
+    np.save(diretorio / "prototipos.npy", np.ascontiguousarray(matriz_prototipos, dtype=np.float32))
+    n = len(codificados)
+    vetores = None
+    if com_vetores:
+        vetores = np.lib.format.open_memmap(diretorio / "vetores.npy", mode='w+', dtype=np.float32,
+                                            shape=(n, dimensao))
+    scores = np.lib.format.open_memmap(diretorio / "scores.npy", mode='w+', dtype=np.float32,
+                                       shape=(n, len(matriz_prototipos)))
+    return vetores, scores
+
+# ========================================
+# PROCESSOS
+# ========================================
+
+# Estado de cada processo do pool (preenchido uma vez, no início do processo)
+_area = {}
+
+def _iniciar_processo(diretorio, embedder):
+    diretorio = Path(diretorio)
+    tamanho = (diretorio / "textos.bin").stat().st_size
+    _area['embedder'] = embedder
+    _area['blob'] = np.memmap(diretorio / "textos.bin", dtype=np.uint8, mode='r') if tamanho else np.empty(0, np.uint8)
+    _area['offsets'] = np.load(diretorio / "offsets.npy", mmap_mode='r')
+    _area['prototipos'] = np.load(diretorio / "prototipos.npy", mmap_mode='r')
+    vetores = diretorio / "vetores.npy"
+    _area['vetores'] = np.load(vetores, mmap_mode='r+') if vetores.exists() else None
+    _area['scores'] = np.load(diretorio / "scores.npy", mmap_mode='r+')
+
+def _classificar_fragmento(inicio, fim):
+    """Embeda e pontua as linhas [inicio, fim) direto nas matrizes compartilhadas"""
+    offsets, blob = _area['offsets'], _area['blob']
+    base = int(offsets[inicio])
+    dados = blob[base:int(offsets[fim])].tobytes()
+    textos = [dados[int(offsets[i]) - base:int(offsets[i + 1]) - base].decode('utf-8') for i in range(inicio, fim)]
+    vetores = _area['embedder'].embed(textos)
+    if _area['vetores'] is not None:
+        _area['vetores'][inicio:fim] = vetores
+    _area['scores'][inicio:fim] = vetores @ np.asarray(_area['prototipos']).T
+    return fim - inicio
+
+def fragmentos(n, processos, por_processo=FRAGMENTOS_POR_PROCESSO, minimo=TAMANHO_MINIMO_FRAGMENTO):
+    """Intervalos contíguos [inicio, fim) cobrindo n linhas"""
+    quantidade = max(1, min(processos * por_processo, -(-n // minimo)))
+    limites = np.linspace(0, n, quantidade + 1).round().astype(int)
+    return [(int(a), int(b)) for a, b in zip(limites[:-1], limites[1:]) if b > a]
+
+def pontuar_paralelo(textos, matriz_prototipos, embedder, processos=None, com_vetores=True):
+    """(vetores, scores) de todos os textos, na ordem recebida; processos=1 roda no próprio processo
+
+    com_vetores=False não grava nem devolve os vetores (None): só os scores voltam dos processos.
+    """
+    processos = processos or os.cpu_count() or 1
+    matriz_prototipos = np.asarray(matriz_prototipos, dtype=np.float32)
+    codificados = [str(texto).encode('utf-8') for texto in textos]
+    if not codificados:
+        vetores = np.empty((0, embedder.dimensao), np.float32) if com_vetores else None
+        return vetores, np.empty((0, len(matriz_prototipos)), np.float32)
+
+    tamanho = tamanho_area(codificados, matriz_prototipos, embedder.dimensao, com_vetores)
+    diretorio = tempfile.mkdtemp(prefix="classificacao-", dir=diretorio_area(tamanho))
+    try:
+        vetores, scores = criar_area(diretorio, codificados, matriz_prototipos, embedder.dimensao, com_vetores)
+        del codificados
+        intervalos = fragmentos(len(textos), processos)
+        if processos == 1:
+            _iniciar_processo(diretorio, embedder)
+            for inicio, fim in intervalos:
+                _classificar_fragmento(inicio, fim)
+            _area.clear()
+        else:
+            with ProcessPoolExecutor(max_workers=min(processos, len(intervalos)), initializer=_iniciar_processo,
+                                     initargs=(diretorio, embedder)) as pool:
+                list(pool.map(_classificar_fragmento, *zip(*intervalos)))
+        # Cópias em memória: o diretório é removido em seguida
+        return (np.array(vetores) if vetores is not None else None), np.array(scores)
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+# ========================================
+# CLASSIFICAÇÃO
+# ========================================
+
+def classificar_paralelo(forms_number, textos, motor, processos=None):
+    """Mesmo resultado de motor.classificar_lote, com a embedding distribuída entre processos
+
+    As linhas são ordenadas por forms_number e fatiadas em intervalos contíguos; cada processo
+    escreve nas posições do seu fragmento, e o resultado volta na ordem de entrada, qualquer que
+    seja a ordem de término dos processos. Com CacheEmbeddings, só os textos ausentes do cache
+    vão para o pool e os vetores calculados são gravados no cache ao final.
+    """
+    forms_number = np.asarray(forms_number, dtype=np.int64)
+    textos = np.array([texto if isinstance(texto, str) else "" for texto in textos], dtype=object)
+    ordem = np.argsort(forms_number, kind='stable')
+    matriz = motor.prototipos.matriz
+    scores = np.empty((len(textos), len(matriz)), dtype=np.float32)
+
+    cache = motor.embedder if isinstance(motor.embedder, CacheEmbeddings) else None
+    embedder = cache.embedder if cache is not None else motor.embedder
+    if cache is not None:
+        no_cache = np.fromiter((texto in cache for texto in textos[ordem]), dtype=bool, count=len(ordem))
+        acertos, faltas = ordem[no_cache], ordem[~no_cache]
+        if len(acertos):
+            scores[acertos] = motor.pontuar(cache.embed(textos[acertos].tolist()))
+    else:
+        faltas = ordem
+
+    if len(faltas):
+        # Os vetores só voltam dos processos quando vão para o cache
+        vetores, scores_faltas = pontuar_paralelo(textos[faltas].tolist(), matriz, embedder, processos,
+                                                  com_vetores=cache is not None)
+        scores[faltas] = scores_faltas
+        if cache is not None:
+            cache.acrescentar(textos[faltas].tolist(), vetores)
+    return montar_resultado(forms_number, scores, motor.prototipos.categorias, motor.limiar)
+
+# ========================================
+# LINHA DE COMANDO
+# ========================================
+
+def main():
+    from embeddings import EmbedderHash
+
+    parser = argparse.ArgumentParser(description="Gera level1_classifications usando todos os núcleos")
+    parser.add_argument("--entrada", default="dados_embbeding.csv")
+    parser.add_argument("--saida", default="data/classified/level1_classifications.csv")
+    parser.add_argument("--prototipos", default=str(PROTOTIPOS_FILE))
+    parser.add_argument("--limiar", type=float, default=None,
+                        help="Padrão: limiar calibrado gravado com os protótipos")
+    parser.add_argument("--processos", type=int, default=None, help="Padrão: número de núcleos")
+    parser.add_argument("--sem-cache", action="store_true", help="Não usar o cache de embeddings em disco")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.entrada, encoding='utf-8-sig', usecols=['forms_number', 'forms_text'])
+    embedder = EmbedderHash() if args.sem_cache else CacheEmbeddings(EmbedderHash())
+    try:
+        motor = carregar_motor(args.prototipos, args.limiar, embedder)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    processos = args.processos or os.cpu_count() or 1
+    inicio = time.perf_counter()
+    resultado = classificar_paralelo(df['forms_number'].to_numpy(), df['forms_text'].tolist(), motor, processos)
+    tempo = time.perf_counter() - inicio
+    gravar_classificacoes(resultado, args.saida)
+
+    print(f"{len(df)} formulários classificados em {tempo:.2f}s com {processos} processo(s) "
+          f"({len(df) / max(tempo, 1e-9):,.0f} formulários/s) -> {args.saida}")
+    print(resultado['level1_classification_type'].value_counts().to_string())
+
+
+if __name__ == "__main__":
+    main()
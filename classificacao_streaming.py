@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Classificação em Streaming - CSVs maiores que a memória, bloco a bloco
+Saída no esquema de level1_classifications (CSV ou Parquet particionado) com checkpoint por forms_number
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from tqdm import tqdm
+
+from motor_classificacao import COLUNAS_SAIDA, PROTOTIPOS_FILE, carregar_motor
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+TAMANHO_BLOCO = 5000
+
+# ========================================
+# CHECKPOINT
+# ========================================
+
+class CheckpointDivergente(ValueError):
+    """Checkpoint gravado por uma execução com outra entrada, protótipos ou limiar"""
+
+class Checkpoint:
+    """forms_number já gravados (int64 append-only) + metadados do último bloco confirmado
+
+    Ordem por bloco: saída gravada e sincronizada -> ids acrescentados -> metadados trocados
+    atomicamente. Na retomada, a saída e os ids são truncados ao último bloco confirmado,
+    então uma interrupção no meio de um bloco não duplica nem perde linhas.
+    Memória: 8 bytes por formulário já processado (os textos nunca ficam retidos).
+    """
+
+    def __init__(self, saida):
+        saida = Path(saida)
+        self.arquivo_ids = saida.with_name(saida.name + ".checkpoint.ids")
+        self.arquivo_meta = saida.with_name(saida.name + ".checkpoint.json")
+        self.meta = {}
+        # Array ordenado + blocos recentes, fundidos quando crescem (evita reordenar tudo a cada bloco)
+        self.processados = np.empty(0, dtype=np.int64)
+        self._recentes = []
+
+    def __len__(self):
+        return len(self.processados) + sum(len(bloco) for bloco in self._recentes)
+
+    def existe(self):
+        return self.arquivo_meta.exists()
+
+    def carregar(self):
+        with open(self.arquivo_meta, encoding='utf-8') as f:
+            self.meta = json.load(f)
+        # Ids gravados após o último bloco confirmado são descartados
+        with open(self.arquivo_ids, 'r+b') as f:
+            f.truncate(self.meta['ids'] * 8)
+        self.processados = np.unique(np.fromfile(self.arquivo_ids, dtype=np.int64))
+        self._recentes = []
+        return self.meta
+
+    def iniciar(self, meta):
+        self.meta = {**meta, 'ids': 0, 'bytes_saida': 0, 'partes': 0, 'linhas_lidas': 0}
+        self.processados = np.empty(0, dtype=np.int64)
+        self._recentes = []
+        open(self.arquivo_ids, 'wb').close()
+        self._gravar_meta()
+
+    def pendentes(self, forms_numbers):
+        """Máscara das linhas ainda não classificadas"""
+        forms_numbers = np.asarray(forms_numbers, dtype=np.int64)
+        feitos = np.zeros(len(forms_numbers), dtype=bool)
+        if len(self.processados):
+            posicoes = np.minimum(np.searchsorted(self.processados, forms_numbers), len(self.processados) - 1)
+            feitos = self.processados[posicoes] == forms_numbers
+        if self._recentes:
+            feitos |= np.isin(forms_numbers, np.concatenate(self._recentes))
+        return ~feitos
+
+    def confirmar(self, forms_numbers, **progresso):
+        forms_numbers = np.asarray(forms_numbers, dtype=np.int64)
+        with open(self.arquivo_ids, 'ab') as f:
+            forms_numbers.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        self._recentes.append(forms_numbers)
+        if sum(len(bloco) for bloco in self._recentes) > max(len(self.processados) // 8, 50_000):
+            self.processados = np.unique(np.concatenate([self.processados, *self._recentes]))
+            self._recentes = []
+        self.meta['ids'] += len(forms_numbers)
+        self.meta.update(progresso)
+        self._gravar_meta()
+
+    def _gravar_meta(self):
+        temporario = self.arquivo_meta.with_name(self.arquivo_meta.name + ".tmp")
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, ensure_ascii=False, indent=2)
+        os.replace(temporario, self.arquivo_meta)
+
+# ========================================
+# SAÍDAS
+# ========================================
+
+class SaidaCSV:
+    """CSV único com cabeçalho; booleanos em minúsculas como o level1_classifications original"""
+
+    def __init__(self, caminho):
+        self.caminho = Path(caminho)
+
+    def preparar(self, meta):
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        if meta.get('bytes_saida', 0) == 0:
+            with open(self.caminho, 'w', encoding='utf-8', newline='') as f:
+                f.write(",".join(COLUNAS_SAIDA) + "\n")
+        else:
+            with open(self.caminho, 'r+b') as f:
+                f.truncate(meta['bytes_saida'])
+
+    def gravar(self, resultado):
+        resultado = resultado.copy()
+        resultado['level1_threshold_met'] = np.where(resultado['level1_threshold_met'], 'true', 'false')
+        with open(self.caminho, 'a', encoding='utf-8', newline='') as f:
+            resultado.to_csv(f, header=False, index=False)
+            f.flush()
+            os.fsync(f.fileno())
+        return {'bytes_saida': self.caminho.stat().st_size}
+
+class SaidaParquet:
+    """Diretório de partes Parquet (uma por bloco), lido como um único dataset por pandas/pyarrow"""
+
+    def __init__(self, caminho):
+        self.caminho = Path(caminho)
+        self.partes = 0
+
+    def preparar(self, meta):
+        self.caminho.mkdir(parents=True, exist_ok=True)
+        self.partes = meta.get('partes', 0)
+        # Partes gravadas depois do último bloco confirmado
+        for parte in self.caminho.glob("parte-*.parquet"):
+            if int(parte.stem.split("-")[1]) >= self.partes:
+                parte.unlink()
+
+    def gravar(self, resultado):
+        destino = self.caminho / f"parte-{self.partes:06d}.parquet"
+        temporario = destino.with_name(f".{destino.name}.tmp")
+        pq.write_table(pa.Table.from_pandas(resultado, preserve_index=False), temporario)
+        os.replace(temporario, destino)
+        self.partes += 1
+        return {'partes': self.partes}
+
+def criar_saida(caminho):
+    return SaidaParquet(caminho) if Path(caminho).suffix == ".parquet" else SaidaCSV(caminho)
+
+# ========================================
+# CLASSIFICAÇÃO
+# ========================================
+
+def assinatura_entrada(caminho):
+    estado = Path(caminho).stat()
+    return {'entrada': str(Path(caminho).resolve()), 'tamanho_entrada': estado.st_size,
+            'modificacao_entrada': estado.st_mtime_ns}
+
+def classificar_arquivo(entrada, saida, motor, tamanho_bloco=TAMANHO_BLOCO, reiniciar=False, progresso=True):
+    """Classifica `entrada` bloco a bloco, retomando do checkpoint quando existir; retorna contagens"""
+    checkpoint = Checkpoint(saida)
+    meta = {**assinatura_entrada(entrada), 'prototipos': motor.prototipos.versao, 'limiar': motor.limiar}
+    if checkpoint.existe() and not reiniciar:
+        anterior = checkpoint.carregar()
+        divergentes = [chave for chave, valor in meta.items() if anterior.get(chave) != valor]
+        if divergentes:
+            raise CheckpointDivergente(
+                f"Checkpoint de outra execução ({', '.join(divergentes)} diferente); use --reiniciar"
+            )
+    else:
+        checkpoint.iniciar(meta)
+
+    destino = criar_saida(saida)
+    destino.preparar(checkpoint.meta)
+
+    contagens = {'lidas': 0, 'classificadas': 0, 'puladas': 0, 'retomadas': len(checkpoint)}
+    with open(entrada, 'rb') as arquivo, tqdm(total=Path(entrada).stat().st_size, unit='B', unit_scale=True,
+                                              desc="Classificando", disable=not progresso) as barra:
+        leitor = pd.read_csv(arquivo, encoding='utf-8-sig', usecols=['forms_number', 'forms_text'],
+                             dtype={'forms_text': str}, chunksize=tamanho_bloco)
+        posicao = 0
+        for bloco in leitor:
+            contagens['lidas'] += len(bloco)
+            bloco = bloco.dropna(subset=['forms_number'])
+            forms_numbers = bloco['forms_number'].to_numpy(dtype=np.int64)
+            pendentes = checkpoint.pendentes(forms_numbers)
+            # forms_number repetido dentro do bloco: vale a primeira ocorrência
+            _, primeiras = np.unique(forms_numbers, return_index=True)
+            unicos = np.zeros(len(bloco), dtype=bool)
+            unicos[primeiras] = True
+            selecionados = pendentes & unicos
+            contagens['puladas'] += int((~selecionados).sum())
+
+            if selecionados.any():
+                textos = bloco['forms_text'].fillna("").to_numpy()[selecionados].tolist()
+                resultado = motor.classificar_lote(forms_numbers[selecionados], textos)
+                progresso_saida = destino.gravar(resultado)
+                checkpoint.confirmar(forms_numbers[selecionados],
+                                     linhas_lidas=checkpoint.meta['linhas_lidas'] + len(bloco), **progresso_saida)
+                contagens['classificadas'] += int(selecionados.sum())
+
+            barra.update(arquivo.tell() - posicao)
+            posicao = arquivo.tell()
+            barra.set_postfix(classificadas=contagens['classificadas'], puladas=contagens['puladas'])
+    return contagens
+
+# ========================================
+# LINHA DE COMANDO
+# ========================================
+
+def main():
+    from cache_embeddings import CacheEmbeddings
+    from embeddings import EmbedderHash
+
+    parser = argparse.ArgumentParser(description="Classifica um CSV grande em blocos, com memória constante")
+    parser.add_argument("entrada", help="CSV com forms_number e forms_text")
+    parser.add_argument("saida", help="CSV ou .parquet (diretório de partes)")
+    parser.add_argument("--prototipos", default=str(PROTOTIPOS_FILE))
+    parser.add_argument("--limiar", type=float, default=None,
+                        help="Padrão: limiar calibrado gravado com os protótipos")
+    parser.add_argument("--tamanho-bloco", type=int, default=TAMANHO_BLOCO)
+    parser.add_argument("--reiniciar", action="store_true", help="Ignora o checkpoint e recomeça do zero")
+    parser.add_argument("--cache", action="store_true",
+                        help="Usa o cache de embeddings em disco (o índice do cache cresce com o arquivo)")
+    args = parser.parse_args()
+
+    embedder = CacheEmbeddings(EmbedderHash()) if args.cache else EmbedderHash()
+    try:
+        motor = carregar_motor(args.prototipos, args.limiar, embedder)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    inicio = time.perf_counter()
+    try:
+        contagens = classificar_arquivo(args.entrada, args.saida, motor, args.tamanho_bloco, args.reiniciar)
+    except CheckpointDivergente as e:
+        sys.exit(str(e))
+    tempo = time.perf_counter() - inicio
+    print(f"{contagens['classificadas']:,} formulários classificados em {tempo:.1f}s "
+          f"({contagens['classificadas'] / max(tempo, 1e-9):,.0f}/s) -> {args.saida}")
+    if contagens['retomadas']:
+        print(f"Retomado do checkpoint: {contagens['retomadas']:,} já classificados antes")
+    if contagens['puladas']:
+        print(f"{contagens['puladas']:,} linhas puladas (já classificadas ou forms_number repetido)")
+
+
+if __name__ == "__main__":
+    main()
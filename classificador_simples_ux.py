@@ -11,6 +11,8 @@ from datetime import datetime
 from pathlib import Path
 import json
 
+from armazem_textos import ArmazemTextosAtualizado
+
 # ========================================
 # CONFIGURAÇÃO E ESTILO
 # ========================================
@@ -130,6 +132,7 @@ DATA_DIR = Path("data")
 ASSIGNMENTS_FILE = DATA_DIR / "assigned" / "final_assignments.csv"
 CONTRIBUTIONS_FILE = DATA_DIR / "human_labels" / "contribuicoes_usuarios.csv"
 ANALYZED_FILE = DATA_DIR / "human_labels" / "formularios_analisados.json"
+RAW_FILE = DATA_DIR / "raw" / "dados_embbeding.csv"
 
 # Criar diretórios se não existirem
 (DATA_DIR / "human_labels").mkdir(exist_ok=True)
@@ -220,6 +223,11 @@ def salvar_formulario_analisado(forms_number, usuario):
     with open(ANALYZED_FILE, 'w', encoding='utf-8') as f:
         json.dump(analisados, f, ensure_ascii=False, indent=2)
 
+@st.cache_resource
+def obter_armazem_textos():
+    """Armazém de textos mapeado em memória (reaberto por ele mesmo quando o CSV bruto muda)"""
+    return ArmazemTextosAtualizado(RAW_FILE)
+
 @st.cache_data
 def carregar_dados():
     """Carrega dados dos formulários"""
@@ -641,10 +649,7 @@ def main():
         # Obter texto completo
         forms_text = ""
         try:
-            dados_raw = pd.read_csv(DATA_DIR / "raw" / "dados_embbeding.csv")
-            match = dados_raw[dados_raw['forms_number'] == row['forms_number']]
-            if not match.empty:
-                forms_text = match.iloc[0]['forms_text']
+            forms_text = obter_armazem_textos().obter(row['forms_number'], "")
         except Exception as e:
             st.warning(f"⚠️ Erro ao carregar texto do formulário: {e}")
         
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Conjunto de Dados Compartilhado - Handle imutável por processo
+Formulários e classificações da IA carregados uma vez e lidos por todas as sessões
+"""
+
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+from cache_colunar import carregar_csv_colunar
+from indice_classificacoes import IndiceClassificacoes
+
+# ========================================
+# HANDLE IMUTÁVEL
+# ========================================
+
+class ConjuntoDados:
+    """Snapshot somente leitura dos dados; uma nova versão substitui a anterior por inteiro
+
+    As colunas vêm do cache Arrow mapeado em memória: arrays numéricos são somente
+    leitura e strings permanecem nos buffers Arrow, sem cópia por sessão.
+    """
+
+    def __init__(self, formularios, classificacoes, versao, erro_classificacoes=None):
+        self.formularios = formularios
+        self.classificacoes = classificacoes
+        self.indice_classificacoes = IndiceClassificacoes(classificacoes)
+        self.versao = versao
+        self.erro_classificacoes = erro_classificacoes
+
+def _carregar(dados_file, classificacoes_file, versao):
+    formularios = carregar_csv_colunar(dados_file)
+
+    erro = None
+    try:
+        classificacoes = carregar_csv_colunar(classificacoes_file)
+    except FileNotFoundError as e:
+        classificacoes = pd.DataFrame()
+        erro = e
+    return ConjuntoDados(formularios, classificacoes, versao, erro)
+
+# ========================================
+# REGISTRO POR PROCESSO
+# ========================================
+
+_lock = threading.Lock()
+_conjuntos = {}
+
+def obter_conjunto(dados_file, classificacoes_file):
+    """Handle compartilhado do processo (carregado na primeira chamada)"""
+    chave = (str(Path(dados_file)), str(Path(classificacoes_file)))
+    conjunto = _conjuntos.get(chave)
+    if conjunto is None:
+        with _lock:
+            conjunto = _conjuntos.get(chave)
+            if conjunto is None:
+                conjunto = _carregar(dados_file, classificacoes_file, versao=1)
+                _conjuntos[chave] = conjunto
+    return conjunto
+
+def recarregar_conjunto(dados_file, classificacoes_file):
+    """Recarrega os arquivos e publica uma nova versão; sessões em andamento mantêm a anterior"""
+    chave = (str(Path(dados_file)), str(Path(classificacoes_file)))
+    with _lock:
+        anterior = _conjuntos.get(chave)
+        versao = anterior.versao + 1 if anterior else 1
+        _conjuntos[chave] = _carregar(dados_file, classificacoes_file, versao)
+    return _conjuntos[chave]
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Dataset de Treino Incremental - Parquet particionado em fragmentos
+Cada classificação gera um fragmento pequeno; a compactação em background os consolida
+"""
+
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from diario_rotulos import HUMAN_LABELS_DIR
+from trava_arquivo import travar
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+DATASET_DIR = HUMAN_LABELS_DIR / "training_ready"
+PARQUET_LEGADO = HUMAN_LABELS_DIR / "training_ready.parquet"
+
+CHAVES = ['forms_number', 'classifier_name']
+
+# Esquema fixo para que fragmentos com valores nulos continuem compatíveis
+ESQUEMA = pa.schema([
+    ('forms_number', pa.int64()),
+    ('forms_text', pa.string()),
+    ('forms_title', pa.string()),
+    ('human_category', pa.string()),
+    ('human_subcategory', pa.string()),
+    ('confidence_human', pa.float64()),
+    ('classifier_name', pa.string()),
+    ('classification_timestamp', pa.string()),
+    ('comments', pa.string()),
+    ('ai_category', pa.string()),
+    ('ai_confidence', pa.float64()),
+    ('ai_threshold_met', pa.bool_()),
+    ('approved_ai', pa.bool_()),
+    ('classification_type', pa.string()),
+    ('disagreement_flag', pa.bool_()),
+    ('high_confidence', pa.bool_()),
+    ('needs_review', pa.bool_()),
+    ('data_quality', pa.string()),
+])
+
+MIN_FRAGMENTOS_COMPACTACAO = 32
+LOCK_EXPIRACAO_SEGUNDOS = 600
+
+# ========================================
+# DATASET
+# ========================================
+
+class DatasetTreino:
+    """Dataset Parquet append-only com visão deduplicada por (forms_number, classifier_name)"""
+
+    def __init__(self, diretorio=DATASET_DIR, parquet_legado=PARQUET_LEGADO):
+        self.diretorio = Path(diretorio)
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        # Serializa a numeração dos arquivos entre processos (nomear + publicar; listar para compactar)
+        self.arquivo_trava = self.diretorio / ".sequencia.trava"
+        self._lock = threading.Lock()
+        self._thread = None
+
+        # Incorporar o arquivo único antigo como primeiro fragmento
+        parquet_legado = Path(parquet_legado) if parquet_legado else None
+        if parquet_legado and parquet_legado.is_file() and not self.arquivos():
+            tabela = pq.read_table(parquet_legado).to_pandas().reindex(columns=ESQUEMA.names)
+            # Colunas só com NaN vêm como float; None é aceito por qualquer tipo do esquema
+            tabela = tabela.astype(object).where(tabela.notna(), None)
+            self._escrever(pa.Table.from_pandas(tabela, schema=ESQUEMA, preserve_index=False), "legado")
+
+    def _escrever(self, tabela, tipo, sequencia=None):
+        """Grava um arquivo de forma atômica; o nome ordena os arquivos na ordem em que ficaram visíveis
+
+        Sem `sequencia`, o número é atribuído sob a trava, no momento da publicação, e é sempre
+        maior que o de qualquer arquivo já visível: um fragmento publicado depois da listagem de
+        uma compactação fica depois do arquivo consolidado, mesmo que tenha começado antes.
+        """
+        sufixo = f"-{tipo}-{uuid.uuid4().hex[:8]}.parquet"
+        temporario = self.diretorio / f".{uuid.uuid4().hex}{sufixo}.tmp"
+        pq.write_table(tabela, temporario)
+        if sequencia is not None:
+            destino = self.diretorio / f"{sequencia:020d}{sufixo}"
+            os.replace(temporario, destino)
+            return destino
+        with travar(self.arquivo_trava):
+            arquivos = self.arquivos()
+            ultima = self._sequencia(arquivos[-1]) if arquivos else 0
+            destino = self.diretorio / f"{max(time.time_ns(), ultima + 1):020d}{sufixo}"
+            os.replace(temporario, destino)
+        return destino
+
+    @staticmethod
+    def _sequencia(arquivo):
+        return int(arquivo.name.split("-", 1)[0])
+
+    def arquivos(self):
+        """Arquivos do dataset em ordem de escrita"""
+        return sorted(self.diretorio.glob("*.parquet"))
+
+    def acrescentar(self, dados_ml):
+        """Grava uma classificação como novo fragmento - custo constante"""
+        return self.acrescentar_lote([dados_ml])
+
+    def acrescentar_lote(self, registros):
+        """Grava várias classificações em um único fragmento"""
+        registros = [{campo: dados_ml.get(campo) for campo in ESQUEMA.names} for dados_ml in registros]
+        tabela = pa.Table.from_pylist(registros, schema=ESQUEMA)
+        return self._escrever(tabela, "frag")
+
+    def ler(self, colunas=None):
+        """Visão lógica única: lê todos os arquivos e mantém a última versão de cada chave"""
+        leitura = None if colunas is None else list(dict.fromkeys(CHAVES + list(colunas)))
+        for tentativa in range(3):
+            arquivos = self.arquivos()
+            if not arquivos:
+                return pd.DataFrame(columns=colunas or ESQUEMA.names)
+            try:
+                tabelas = [pq.read_table(arquivo, columns=leitura, schema=ESQUEMA) for arquivo in arquivos]
+                break
+            except FileNotFoundError:
+                # Compactação concluída durante a leitura - listar novamente
+                if tentativa == 2:
+                    raise
+        df = pa.concat_tables(tabelas).to_pandas()
+        df = df.drop_duplicates(subset=CHAVES, keep='last').reset_index(drop=True)
+        return df if colunas is None else df[list(colunas)]
+
+    # ========================================
+    # COMPACTAÇÃO
+    # ========================================
+
+    def _adquirir_lock(self):
+        """Lock entre processos via arquivo exclusivo"""
+        lock_file = self.diretorio / ".compactando.lock"
+        try:
+            if lock_file.exists() and time.time() - lock_file.stat().st_mtime > LOCK_EXPIRACAO_SEGUNDOS:
+                lock_file.unlink()
+            fd = os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.close(fd)
+            return lock_file
+        except FileExistsError:
+            return None
+
+    def compactar(self, min_fragmentos=MIN_FRAGMENTOS_COMPACTACAO):
+        """Consolida os arquivos existentes em um único arquivo deduplicado"""
+        with self._lock:
+            lock_file = self._adquirir_lock()
+            if lock_file is None:
+                return False
+            try:
+                # Listagem sob a trava: todo arquivo publicado depois recebe sequência maior
+                with travar(self.arquivo_trava):
+                    arquivos = self.arquivos()
+                fragmentos = [a for a in arquivos if "-frag-" in a.name]
+                if len(fragmentos) < min_fragmentos:
+                    return False
+
+                tabelas = [pq.read_table(arquivo, schema=ESQUEMA) for arquivo in arquivos]
+                df = pa.concat_tables(tabelas).to_pandas()
+                df = df.drop_duplicates(subset=CHAVES, keep='last')
+                tabela = pa.Table.from_pandas(df, schema=ESQUEMA, preserve_index=False)
+
+                # Mesma sequência do arquivo mais novo consolidado: vence os consolidados enquanto
+                # não são apagados e perde para todo fragmento publicado depois da listagem
+                self._escrever(tabela, "part", self._sequencia(arquivos[-1]))
+
+                # Duplicatas momentâneas são resolvidas pela deduplicação na leitura
+                for arquivo in arquivos:
+                    arquivo.unlink(missing_ok=True)
+                return True
+            finally:
+                lock_file.unlink(missing_ok=True)
+
+    def iniciar_compactacao(self, intervalo=30):
+        """Inicia thread de compactação periódica (uma por processo)"""
+        if self._thread is not None and self._thread.is_alive():
+            return self._thread
+
+        def _loop():
+            while True:
+                time.sleep(intervalo)
+                try:
+                    self.compactar()
+                except Exception:
+                    # Compactação é otimização; a próxima rodada tenta novamente
+                    pass
+
+        self._thread = threading.Thread(target=_loop, name="compactacao-parquet", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def materializar(self, destino=PARQUET_LEGADO):
+        """Exporta a visão deduplicada como um único arquivo Parquet"""
+        self.ler().to_parquet(destino, index=False)
+        return destino
+
+
+if __name__ == "__main__":
+    dataset = DatasetTreino()
+    dataset.compactar(min_fragmentos=1)
+    destino = dataset.materializar()
+    print(f"Dataset compactado e exportado para {destino}")
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Diário de Rotulagem - Classificações humanas em formato append-only
+Cada salvamento acrescenta uma linha JSON; na leitura a classificação mais recente vence
+"""
+
+import json
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+HUMAN_LABELS_DIR = Path("data/human_labels")
+DIARIO_FILE = HUMAN_LABELS_DIR / "human_classifications.jsonl"
+CSV_FILE = HUMAN_LABELS_DIR / "human_classifications.csv"
+
+
+def serializar_valor(valor):
+    """Converte escalares numpy/pandas para tipos JSON nativos"""
+    if hasattr(valor, 'item'):
+        return valor.item()
+    return str(valor)
+
+def ler_novos_registros(caminho, offset=0):
+    """Registros acrescentados ao diário a partir do offset e o novo offset (ignora linha parcial)"""
+    caminho = Path(caminho)
+    if not caminho.exists():
+        return [], offset
+    with open(caminho, 'rb') as f:
+        f.seek(offset)
+        dados = f.read()
+    # Ignorar linha parcial no final (escrita em andamento)
+    fim = dados.rfind(b"\n") + 1
+    registros = [json.loads(linha) for linha in dados[:fim].splitlines() if linha.strip()]
+    return registros, offset + fim
+
+# ========================================
+# DIÁRIO
+# ========================================
+
+class DiarioRotulos:
+    """Diário append-only com índice em memória por (forms_number, classifier_name)"""
+
+    def __init__(self, caminho=DIARIO_FILE, csv_legado=CSV_FILE):
+        self.caminho = Path(caminho)
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._registros = {}
+        self._por_usuario = {}
+        self._offset = 0
+
+        # Migrar CSV antigo apenas na primeira execução
+        csv_legado = Path(csv_legado) if csv_legado else None
+        if not self.caminho.exists() and csv_legado and csv_legado.exists():
+            self._importar_csv(csv_legado)
+
+        self.atualizar()
+
+    def _importar_csv(self, csv_file):
+        """Converte o CSV legado em diário (uma única vez)"""
+        df = pd.read_csv(csv_file)
+        with open(self.caminho, 'a', encoding='utf-8') as f:
+            for registro in df.to_dict(orient='records'):
+                registro = {k: (None if pd.isna(v) else v) for k, v in registro.items()}
+                f.write(json.dumps(registro, ensure_ascii=False, default=serializar_valor) + "\n")
+
+    def _indexar(self, registro):
+        """Atualiza o índice em memória - a última linha vence"""
+        chave = (int(registro['forms_number']), str(registro['classifier_name']))
+        if chave not in self._registros:
+            self._por_usuario[chave[1]] = self._por_usuario.get(chave[1], 0) + 1
+        self._registros[chave] = registro
+
+    def atualizar(self):
+        """Lê apenas as linhas acrescentadas desde a última leitura (inclusive por outros processos)"""
+        if not self.caminho.exists():
+            return
+        with self._lock:
+            registros, self._offset = ler_novos_registros(self.caminho, self._offset)
+            for registro in registros:
+                self._indexar(registro)
+
+    def registrar(self, dados_ml):
+        """Acrescenta uma classificação ao diário - custo O(1)"""
+        self.registrar_lote([dados_ml])
+
+    def registrar_lote(self, registros):
+        """Acrescenta várias classificações com uma única escrita"""
+        linhas = "".join(json.dumps(r, ensure_ascii=False, default=serializar_valor) + "\n" for r in registros)
+        # Escrita única em modo append: linhas de processos concorrentes não se misturam
+        with open(self.caminho, 'ab') as f:
+            f.write(linhas.encode('utf-8'))
+        self.atualizar()
+
+    def obter(self, forms_number, classifier_name):
+        """Retorna a classificação vigente de um usuário para um formulário"""
+        return self._registros.get((int(forms_number), str(classifier_name)))
+
+    def contar(self, classifier_name):
+        """Número de formulários classificados pelo usuário"""
+        return self._por_usuario.get(str(classifier_name), 0)
+
+    def formularios_do_usuario(self, classifier_name):
+        """forms_number já classificados pelo usuário"""
+        return [forms_number for forms_number, nome in self._registros if nome == str(classifier_name)]
+
+    def __len__(self):
+        return len(self._registros)
+
+    def para_dataframe(self):
+        """Visão consolidada (última classificação vence)"""
+        self.atualizar()
+        with self._lock:
+            registros = list(self._registros.values())
+        return pd.DataFrame(registros)
+
+    def materializar_csv(self, destino=CSV_FILE):
+        """Gera o CSV consolidado sob demanda"""
+        df = self.para_dataframe()
+        df.to_csv(destino, index=False, encoding='utf-8')
+        return destino
+
+
+if __name__ == "__main__":
+    destino = DiarioRotulos().materializar_csv()
+    print(f"CSV materializado em {destino}")
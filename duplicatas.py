@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Detecção de Quase-Duplicatas - MinHash + LSH sobre o texto normalizado
+Grupos de formulários quase idênticos (ex.: o mesmo evento por UF) em tempo subquadrático
+"""
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from embeddings import normalizar_texto
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+TAMANHO_SHINGLE = 5          # n-gramas de caracteres (uma UF diferente altera poucos shingles)
+PERMUTACOES = 128
+BANDAS = 16                  # 16 bandas x 8 linhas: pares com Jaccard >= ~0.7 viram candidatos
+LIMIAR_JACCARD = 0.8
+TAMANHO_MAX_BALDE = 200      # baldes maiores são verificados em estrela (evita custo quadrático)
+
+# ========================================
+# MINHASH
+# ========================================
+
+def _shingles(textos, k=TAMANHO_SHINGLE):
+    """Shingles de k bytes codificados como inteiros (vetorizado) e o início de cada documento"""
+    blobs = [normalizar_texto(texto).encode('utf-8') for texto in textos]
+    # Textos curtos ganham espaços para terem ao menos um shingle
+    blobs = [blob if len(blob) >= k else blob.ljust(k) for blob in blobs]
+    tamanhos = np.array([len(blob) for blob in blobs], dtype=np.int64)
+    quantidades = tamanhos - k + 1
+
+    dados = np.frombuffer(b"".join(blobs), dtype=np.uint8).astype(np.uint64)
+    valores = np.zeros(len(dados) - k + 1, dtype=np.uint64)
+    for j in range(k):
+        valores |= dados[j:len(dados) - k + 1 + j] << np.uint64(8 * j)
+
+    # Descarta os shingles que atravessam a fronteira entre documentos
+    inicios_texto = np.cumsum(tamanhos) - tamanhos
+    inicios_shingle = np.cumsum(quantidades) - quantidades
+    posicoes = np.repeat(inicios_texto - inicios_shingle, quantidades) + np.arange(quantidades.sum())
+    return valores[posicoes], inicios_shingle
+
+def assinaturas_minhash(textos, permutacoes=PERMUTACOES, semente=42):
+    """Matriz uint32 (n_textos x permutacoes) por hashing multiply-shift"""
+    textos = list(textos)
+    if not textos:
+        return np.empty((0, permutacoes), dtype=np.uint32)
+    shingles, inicios = _shingles(textos)
+
+    gerador = np.random.default_rng(semente)
+    a = gerador.integers(1, 2 ** 63, size=permutacoes, dtype=np.uint64) | np.uint64(1)
+    b = gerador.integers(0, 2 ** 63, size=permutacoes, dtype=np.uint64)
+
+    assinaturas = np.empty((len(textos), permutacoes), dtype=np.uint32)
+    with np.errstate(over='ignore'):
+        # Uma permutação por vez: reduceat em 1D é mais rápido que em blocos 2D
+        for i in range(permutacoes):
+            valores = (a[i] * shingles + b[i]) >> np.uint64(32)
+            assinaturas[:, i] = np.minimum.reduceat(valores, inicios)
+    return assinaturas
+
+# ========================================
+# LSH
+# ========================================
+
+def pares_candidatos(assinaturas, bandas=BANDAS, tamanho_max_balde=TAMANHO_MAX_BALDE):
+    """Pares (i, j) que colidem em pelo menos uma banda"""
+    n, permutacoes = assinaturas.shape
+    linhas = permutacoes // bandas
+    pares = set()
+    for banda in range(bandas):
+        trecho = np.ascontiguousarray(assinaturas[:, banda * linhas:(banda + 1) * linhas])
+        chaves = trecho.view(np.dtype((np.void, trecho.dtype.itemsize * linhas))).ravel()
+        _, baldes, contagens = np.unique(chaves, return_inverse=True, return_counts=True)
+        ordem = np.argsort(baldes, kind='stable')
+        limites = np.cumsum(contagens)
+        for balde in np.flatnonzero(contagens > 1):
+            membros = ordem[limites[balde] - contagens[balde]:limites[balde]]
+            if len(membros) > tamanho_max_balde:
+                pares.update((int(membros[0]), int(m)) for m in membros[1:])
+                continue
+            for i, primeiro in enumerate(membros[:-1]):
+                pares.update((int(primeiro), int(outro)) for outro in membros[i + 1:])
+    if not pares:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.array(sorted(pares), dtype=np.int64)
+
+# ========================================
+# GRUPOS
+# ========================================
+
+class GruposDuplicatas:
+    """Componentes conexos dos pares verificados; grupo -1 = formulário sem duplicatas"""
+
+    def __init__(self, forms_number, grupos):
+        self.forms_number = np.asarray(forms_number, dtype=np.int64)
+        self.grupos = np.asarray(grupos, dtype=np.int64)
+        self._ordem = np.argsort(self.forms_number, kind='stable')
+        self._chaves = self.forms_number[self._ordem]
+
+    def __len__(self):
+        """Número de grupos com mais de um formulário"""
+        return int(self.grupos.max()) + 1 if len(self.grupos) and self.grupos.max() >= 0 else 0
+
+    def formularios_agrupados(self):
+        return int((self.grupos >= 0).sum())
+
+    def membros(self, forms_number):
+        """forms_number do grupo do formulário (inclui o próprio); vazio quando não há duplicatas"""
+        posicao = int(np.searchsorted(self._chaves, int(forms_number)))
+        if posicao >= len(self._chaves) or self._chaves[posicao] != int(forms_number):
+            return np.empty(0, dtype=np.int64)
+        grupo = self.grupos[self._ordem[posicao]]
+        if grupo < 0:
+            return np.empty(0, dtype=np.int64)
+        return self.forms_number[self.grupos == grupo]
+
+def agrupar_duplicatas(forms_number, textos, limiar=LIMIAR_JACCARD, permutacoes=PERMUTACOES, bandas=BANDAS):
+    """Agrupa quase-duplicatas: candidatos via LSH, confirmados pela similaridade estimada das assinaturas"""
+    forms_number = np.asarray(forms_number, dtype=np.int64)
+    assinaturas = assinaturas_minhash(textos, permutacoes)
+    pares = pares_candidatos(assinaturas, bandas)
+
+    n = len(forms_number)
+    grupos = np.full(n, -1, dtype=np.int64)
+    if len(pares):
+        similaridade = (assinaturas[pares[:, 0]] == assinaturas[pares[:, 1]]).mean(axis=1)
+        pares = pares[similaridade >= limiar]
+    if len(pares):
+        grafo = coo_matrix((np.ones(len(pares)), (pares[:, 0], pares[:, 1])), shape=(n, n))
+        _, componentes = connected_components(grafo, directed=False)
+        # Renumera só os componentes com mais de um formulário
+        tamanhos = np.bincount(componentes)
+        agrupados = tamanhos[componentes] > 1
+        _, grupos[agrupados] = np.unique(componentes[agrupados], return_inverse=True)
+    return GruposDuplicatas(forms_number, grupos)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    import pandas as pd
+
+    caminho = sys.argv[1] if len(sys.argv) > 1 else "dados_embbeding.csv"
+    df = pd.read_csv(caminho, encoding='utf-8-sig')
+
+    inicio = time.perf_counter()
+    grupos = agrupar_duplicatas(df['forms_number'].to_numpy(), df['forms_text'].tolist())
+    tempo = time.perf_counter() - inicio
+    print(f"{len(df)} formulários -> {len(grupos)} grupos de quase-duplicatas "
+          f"({grupos.formularios_agrupados()} formulários) em {tempo:.2f}s")
+    rotulos_economizados = grupos.formularios_agrupados() - len(grupos)
+    print(f"Rótulos economizados se cada grupo receber uma única decisão: {rotulos_economizados}")
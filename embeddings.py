@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Embeddings de Texto - Normalização e vetorização densa dos forms_text
+Hashing de n-gramas de caracteres + projeção aleatória esparsa (determinístico, sem ajuste)
+"""
+
+import re
+import unicodedata
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+from sklearn.random_projection import SparseRandomProjection
+
+# ========================================
+# NORMALIZAÇÃO
+# ========================================
+
+def normalizar_texto(texto):
+    """Minúsculas, sem acentos e com espaços colapsados"""
+    if texto is None or (isinstance(texto, float) and np.isnan(texto)):
+        return ""
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = "".join(ch for ch in texto if not unicodedata.combining(ch))
+    return re.sub(r'\s+', ' ', texto.lower()).strip()
+
+# ========================================
+# EMBEDDER
+# ========================================
+
+class EmbedderHash:
+    """Vetores densos L2-normalizados a partir de n-gramas de caracteres"""
+
+    # O vetorizador já normaliza: o CacheEmbeddings pode usar o texto normalizado como chave
+    normaliza_texto = True
+
+    def __init__(self, dimensao=384, n_features=2 ** 18, ngramas=(3, 5), semente=42):
+        self.dimensao = dimensao
+        self.nome = f"hash-char{ngramas[0]}{ngramas[1]}-{n_features}-{dimensao}-{semente}"
+        self._vetorizador = HashingVectorizer(
+            analyzer='char_wb',
+            ngram_range=ngramas,
+            n_features=n_features,
+            preprocessor=normalizar_texto,
+            alternate_sign=False,
+            norm=None,
+        )
+        # A projeção depende apenas do formato da entrada e da semente
+        self._projecao = SparseRandomProjection(
+            n_components=dimensao, random_state=semente, dense_output=True
+        ).fit(sp.csr_matrix((1, n_features)))
+
+    def embed(self, textos):
+        """Matriz float32 (n_textos x dimensao)"""
+        textos = list(textos)
+        if not textos:
+            return np.empty((0, self.dimensao), dtype=np.float32)
+        contagens = self._vetorizador.transform(textos)
+        contagens.data = np.log1p(contagens.data)
+        vetores = self._projecao.transform(normalize(contagens))
+        return normalize(vetores).astype(np.float32)
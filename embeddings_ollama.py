@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Embeddings via Ollama - Cliente assíncrono com conexões reaproveitadas, lotes e novas tentativas
+EmbedderOllama tem a interface do EmbedderHash (nome, dimensao, embed) e pode ser envolvido pelo CacheEmbeddings
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+
+import httpx
+import numpy as np
+from sklearn.preprocessing import normalize
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+OLLAMA_URL = os.environ.get("OLLAMA_HOST", "http://127.0.0.1:11434")
+MODELO_PADRAO = "nomic-embed-text"
+
+# Textos por chamada a /api/embed
+TAMANHO_LOTE = 64
+# Requisições em voo (também o tamanho do pool de conexões)
+SIMULTANEAS = 8
+TENTATIVAS = 5
+ESPERA_INICIAL = 0.25
+ESPERA_MAXIMA = 8.0
+TIMEOUT = 120.0
+
+# Respostas que valem nova tentativa (modelo carregando, fila cheia, reinício do servidor)
+STATUS_REPETIR = {408, 429, 500, 502, 503, 504}
+
+def normalizar_url(url):
+    """OLLAMA_HOST aceita 'host:porta' sem esquema"""
+    url = url.rstrip("/")
+    return url if "://" in url else f"http://{url}"
+
+# ========================================
+# CLIENTE ASSÍNCRONO
+# ========================================
+
+class ClienteOllama:
+    """Embeddings em lotes por uma única sessão HTTP, com no máximo `simultaneas` requisições em voo
+
+    Uso: `async with ClienteOllama(...) as cliente: vetores = await cliente.embed(textos)`.
+    Falhas transitórias são repetidas com espera exponencial (com jitter, respeitando Retry-After);
+    a vaga do semáforo fica ocupada durante a espera, o que também alivia um servidor sobrecarregado.
+    Servidores sem /api/embed (Ollama < 0.3) são atendidos por /api/embeddings, um texto por vez.
+    """
+
+    def __init__(self, url=OLLAMA_URL, modelo=MODELO_PADRAO, tamanho_lote=TAMANHO_LOTE, simultaneas=SIMULTANEAS,
+                 tentativas=TENTATIVAS, espera_inicial=ESPERA_INICIAL, timeout=TIMEOUT):
+        self.url = normalizar_url(url)
+        self.modelo = modelo
+        self.tamanho_lote = tamanho_lote
+        self.simultaneas = simultaneas
+        self.tentativas = tentativas
+        self.espera_inicial = espera_inicial
+        self.timeout = timeout
+        self.dimensao = None
+        self._cliente = None
+        self._semaforo = None
+        self._legado = False
+        self.requisicoes = 0
+        self.repeticoes = 0
+        self.textos = 0
+
+    async def __aenter__(self):
+        await self.abrir()
+        return self
+
+    async def __aexit__(self, *excecao):
+        await self.fechar()
+
+    async def abrir(self):
+        limites = httpx.Limits(max_connections=self.simultaneas, max_keepalive_connections=self.simultaneas)
+        self._cliente = httpx.AsyncClient(base_url=self.url, limits=limites, timeout=self.timeout)
+        self._semaforo = asyncio.Semaphore(self.simultaneas)
+
+    async def fechar(self):
+        if self._cliente is not None:
+            await self._cliente.aclose()
+            self._cliente = None
+
+    async def embed(self, textos):
+        """Matriz float32 L2-normalizada (n x dimensão); textos repetidos são enviados uma vez"""
+        textos = [texto if isinstance(texto, str) else "" for texto in textos]
+        unicos = list(dict.fromkeys(textos))
+        if not unicos:
+            return np.empty((0, self.dimensao or 0), dtype=np.float32)
+        lotes = [unicos[i:i + self.tamanho_lote] for i in range(0, len(unicos), self.tamanho_lote)]
+        vetores = normalize(np.vstack(await asyncio.gather(*(self._embed_lote(lote) for lote in lotes))))
+        self.dimensao = vetores.shape[1]
+        self.textos += len(unicos)
+        posicao = {texto: i for i, texto in enumerate(unicos)}
+        return vetores[[posicao[texto] for texto in textos]].astype(np.float32)
+
+    async def _embed_lote(self, textos):
+        async with self._semaforo:
+            if not self._legado:
+                resposta = await self._enviar("/api/embed", {'model': self.modelo, 'input': textos})
+                if resposta is not None:
+                    return np.asarray(resposta['embeddings'], dtype=np.float32)
+                self._legado = True
+            vetores = []
+            for texto in textos:
+                resposta = await self._enviar("/api/embeddings", {'model': self.modelo, 'prompt': texto})
+                vetores.append(resposta['embedding'])
+            return np.asarray(vetores, dtype=np.float32)
+
+    async def _enviar(self, rota, corpo):
+        """JSON da resposta; None quando a rota não existe (404) em /api/embed"""
+        for tentativa in range(self.tentativas):
+            ultima = tentativa == self.tentativas - 1
+            try:
+                resposta = await self._cliente.post(rota, json=corpo)
+            except httpx.TransportError:
+                if ultima:
+                    raise
+                espera = None
+            else:
+                self.requisicoes += 1
+                if resposta.status_code == 404 and rota == "/api/embed" and "model" not in resposta.text:
+                    return None
+                if resposta.status_code not in STATUS_REPETIR or ultima:
+                    resposta.raise_for_status()
+                    return resposta.json()
+                espera = resposta.headers.get("Retry-After")
+            self.repeticoes += 1
+            await asyncio.sleep(self._espera(tentativa, espera))
+
+    def _espera(self, tentativa, retry_after=None):
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), ESPERA_MAXIMA)
+            except ValueError:
+                pass
+        return min(self.espera_inicial * 2 ** tentativa, ESPERA_MAXIMA) * random.uniform(0.5, 1.5)
+
+    def estatisticas(self):
+        return {
+            'modelo': self.modelo,
+            'url': self.url,
+            'requisicoes': self.requisicoes,
+            'repeticoes': self.repeticoes,
+            'textos': self.textos,
+            'legado': self._legado,
+        }
+
+# ========================================
+# EMBEDDER SÍNCRONO
+# ========================================
+
+class EmbedderOllama:
+    """Fachada síncrona: um event loop próprio (thread de fundo) mantém a sessão aberta entre chamadas
+
+    Pode ser chamado de qualquer thread, inclusive de dentro de outro event loop (ex.: executor do serviço).
+    Sem `dimensao`, faz uma chamada de teste para descobri-la (o CacheEmbeddings precisa dela ao abrir).
+    Os textos são enviados como estão (o modelo distingue caixa e acentos); por isso o CacheEmbeddings
+    usa o texto exato como chave (normaliza_texto = False).
+    """
+
+    normaliza_texto = False
+
+    def __init__(self, modelo=MODELO_PADRAO, url=OLLAMA_URL, dimensao=None, **opcoes):
+        self.modelo = modelo
+        # Usado como nome de diretório pelo CacheEmbeddings ("modelo:tag" -> "modelo-tag")
+        self.nome = "ollama-" + modelo.replace(":", "-").replace("/", "-")
+        self.cliente = ClienteOllama(url, modelo, **opcoes)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True, name="embeddings-ollama")
+        self._thread.start()
+        self._executar(self.cliente.abrir())
+        try:
+            self.dimensao = dimensao or self.embed(["dimensão"]).shape[1]
+        except Exception:
+            self.fechar()
+            raise
+        self.cliente.dimensao = self.dimensao
+
+    def _executar(self, corotina):
+        return asyncio.run_coroutine_threadsafe(corotina, self._loop).result()
+
+    def embed(self, textos):
+        """Matriz float32 (n_textos x dimensao)"""
+        return self._executar(self.cliente.embed(list(textos)))
+
+    def estatisticas(self):
+        return self.cliente.estatisticas()
+
+    def fechar(self):
+        if self._loop.is_running():
+            self._executar(self.cliente.fechar())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.fechar()
+
+# ========================================
+# LINHA DE COMANDO
+# ========================================
+
+def main():
+    import pandas as pd
+
+    from cache_embeddings import CacheEmbeddings
+
+    parser = argparse.ArgumentParser(description="Pré-calcula no cache os embeddings Ollama dos forms_text")
+    parser.add_argument("--entrada", default="dados_embbeding.csv")
+    parser.add_argument("--url", default=OLLAMA_URL)
+    parser.add_argument("--modelo", default=MODELO_PADRAO)
+    parser.add_argument("--tamanho-lote", type=int, default=TAMANHO_LOTE)
+    parser.add_argument("--simultaneas", type=int, default=SIMULTANEAS)
+    parser.add_argument("--sem-cache", action="store_true", help="Só mede a vazão, sem gravar no cache")
+    args = parser.parse_args()
+
+    textos = pd.read_csv(args.entrada, encoding='utf-8-sig', usecols=['forms_text'])['forms_text'].fillna("").tolist()
+    try:
+        ollama = EmbedderOllama(args.modelo, args.url, tamanho_lote=args.tamanho_lote, simultaneas=args.simultaneas)
+    except httpx.HTTPError as e:
+        sys.exit(f"Ollama indisponível em {normalizar_url(args.url)}: {e}")
+
+    with ollama:
+        embedder = ollama if args.sem_cache else CacheEmbeddings(ollama)
+        inicio = time.perf_counter()
+        vetores = embedder.embed(textos)
+        tempo = time.perf_counter() - inicio
+
+        estatisticas = ollama.estatisticas()
+        print(f"{len(textos)} textos ({vetores.shape[1]} dimensões) em {tempo:.2f}s "
+              f"({len(textos) / max(tempo, 1e-9):,.0f} textos/s)")
+        print(f"Requisições: {estatisticas['requisicoes']} ({estatisticas['textos']} textos enviados, "
+              f"{estatisticas['repeticoes']} novas tentativas)")
+        if isinstance(embedder, CacheEmbeddings):
+            print(f"Cache: {embedder.estatisticas()['vetores']} vetores em {embedder.diretorio}")
+
+
+if __name__ == "__main__":
+    main()
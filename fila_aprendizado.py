@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Fila de Aprendizado Ativo - Ordena os formulários pendentes por incerteza do modelo
+Margem top1-top2, entropia e distância ao protótipo; formulários parecidos com os já rotulados perdem prioridade
+"""
+
+import threading
+
+import numpy as np
+
+from matriz_scores import MatrizScores
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+# Temperatura do softmax sobre os scores de cosseno (diferenças típicas de centésimos)
+TEMPERATURA = 0.05
+
+# Similaridade a partir da qual um formulário rotulado "cobre" um pendente
+RAIO_REDUNDANCIA = 0.80
+
+# ========================================
+# INCERTEZA
+# ========================================
+
+def _postos(valores):
+    """Posto normalizado em [0, 1] (robusto a escalas diferentes entre os critérios)"""
+    if len(valores) < 2:
+        return np.zeros(len(valores))
+    postos = np.empty(len(valores))
+    postos[np.argsort(valores, kind='stable')] = np.arange(len(valores))
+    return postos / (len(valores) - 1)
+
+def componentes_incerteza(scores, temperatura=TEMPERATURA):
+    """Margem top1-top2, entropia normalizada e distância (1 - top1) por linha"""
+    scores = np.nan_to_num(np.asarray(scores, dtype=np.float64), nan=-1.0)
+    n, k = scores.shape
+    ordenados = -np.sort(-scores, axis=1)
+    top1 = ordenados[:, 0]
+    margem = top1 - ordenados[:, 1] if k > 1 else np.ones(n)
+
+    probabilidades = np.exp((scores - top1[:, None]) / temperatura)
+    probabilidades /= probabilidades.sum(axis=1, keepdims=True)
+    entropia = -(probabilidades * np.log(probabilidades + 1e-12)).sum(axis=1) / np.log(max(k, 2))
+    return margem, entropia, 1.0 - top1
+
+def incerteza(scores, temperatura=TEMPERATURA):
+    """0 = modelo seguro, 1 = mais informativo para rotular (média dos postos dos três critérios)"""
+    scores = np.asarray(scores)
+    if len(scores) == 0:
+        return np.empty(0)
+    margem, entropia, distancia = componentes_incerteza(scores, temperatura)
+    return (_postos(-margem) + _postos(entropia) + _postos(distancia)) / 3
+
+# ========================================
+# FILA
+# ========================================
+
+class FilaAprendizado:
+    """Prioridade = incerteza x (1 - redundância com os formulários já rotulados)
+
+    Cada rótulo novo atualiza a cobertura (similaridade máxima com um formulário rotulado)
+    em O(n x dim); reavaliar() recalcula a incerteza com os protótipos atuais do modelo.
+    """
+
+    def __init__(self, forms_number, incertezas, vetores=None, raio=RAIO_REDUNDANCIA):
+        self.forms_number = np.asarray(forms_number, dtype=np.int64)
+        self.incertezas = np.asarray(incertezas, dtype=np.float64)
+        self.raio = raio
+        self._vetores = vetores
+        self._ordem = np.argsort(self.forms_number, kind='stable')
+        self._chaves = self.forms_number[self._ordem]
+        self._lock = threading.Lock()
+        self.cobertura = np.zeros(len(self.forms_number), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.forms_number)
+
+    def posicoes(self, forms_numbers):
+        """Linha de cada forms_number na fila (-1 quando ausente)"""
+        forms_numbers = np.asarray(forms_numbers, dtype=np.int64)
+        if len(self._chaves) == 0:
+            return np.full(len(forms_numbers), -1, dtype=np.int64)
+        posicoes = np.minimum(np.searchsorted(self._chaves, forms_numbers), len(self._chaves) - 1)
+        return np.where(self._chaves[posicoes] == forms_numbers, self._ordem[posicoes], -1)
+
+    def registrar_rotulos(self, forms_numbers):
+        """Reduz a prioridade dos pendentes semelhantes aos formulários recém-rotulados"""
+        if self._vetores is None:
+            return
+        posicoes = self.posicoes(forms_numbers)
+        posicoes = posicoes[posicoes >= 0]
+        if len(posicoes) == 0:
+            return
+        similaridades = (self._vetores @ self._vetores[posicoes].T).max(axis=1)
+        with self._lock:
+            self.cobertura = np.maximum(self.cobertura, similaridades)
+
+    def reavaliar(self, prototipos):
+        """Incerteza recalculada com os scores dos protótipos atuais (mesmo embedder dos vetores)"""
+        if self._vetores is None:
+            return
+        incertezas = incerteza(np.asarray(self._vetores) @ prototipos.matriz.T)
+        with self._lock:
+            self.incertezas = incertezas
+
+    def prioridades(self):
+        redundancia = np.clip((self.cobertura - self.raio) / (1.0 - self.raio), 0.0, 1.0)
+        return self.incertezas * (1.0 - redundancia)
+
+    def ordenar(self, df):
+        """Formulários do DataFrame em ordem decrescente de prioridade (ausentes da fila ao final)"""
+        posicoes = self.posicoes(df['forms_number'].to_numpy())
+        prioridades = np.where(posicoes >= 0, self.prioridades()[np.maximum(posicoes, 0)], -1.0)
+        return df.iloc[np.argsort(-prioridades, kind='stable')]
+
+def construir_fila(forms_number, df_classificacoes, vetores=None, raio=RAIO_REDUNDANCIA):
+    """Fila a partir de level1_all_scores; formulários sem scores recebem incerteza máxima"""
+    forms_number = np.asarray(forms_number, dtype=np.int64)
+    incertezas = np.ones(len(forms_number))
+    if df_classificacoes is not None and 'level1_all_scores' in getattr(df_classificacoes, 'columns', []):
+        matriz = MatrizScores.decodificar(
+            df_classificacoes['forms_number'].to_numpy(dtype=np.int64),
+            df_classificacoes['level1_all_scores'].tolist()
+        )
+        linhas = matriz.posicoes(forms_number)
+        encontrados = linhas >= 0
+        if encontrados.any():
+            incertezas[encontrados] = incerteza(np.asarray(matriz.scores)[linhas[encontrados]])
+    return FilaAprendizado(forms_number, incertezas, vetores, raio)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Índice de Classificações da IA - Busca por forms_number sem varredura
+Array ordenado de forms_number + searchsorted para consultas individuais e em lote
+"""
+
+import numpy as np
+import pandas as pd
+
+# ========================================
+# ÍNDICE
+# ========================================
+
+class IndiceClassificacoes:
+    """Índice construído uma vez sobre level1_classifications"""
+
+    def __init__(self, df_classificacoes):
+        if df_classificacoes.empty:
+            df_classificacoes = pd.DataFrame(columns=[
+                'forms_number', 'level1_category', 'level1_confidence',
+                'level1_threshold_met', 'level1_best_match'
+            ])
+
+        forms = df_classificacoes['forms_number'].to_numpy(dtype=np.int64)
+        # Primeira ocorrência de cada forms_number (mesmo critério do iloc[0] anterior)
+        self._forms, primeiras = np.unique(forms, return_index=True)
+
+        def coluna(nome, dtype, padrao):
+            if nome not in df_classificacoes.columns:
+                return np.full(len(primeiras), padrao, dtype=dtype)
+            valores = df_classificacoes[nome].to_numpy(dtype=dtype, na_value=padrao)
+            return valores[primeiras]
+
+        self.categorias = coluna('level1_category', object, None)
+        self.confiancas = coluna('level1_confidence', np.float64, 0.0)
+        self.thresholds = coluna('level1_threshold_met', bool, False)
+        self.melhores = coluna('level1_best_match', object, None)
+
+        # Nova_Classe_* indica que a IA não atingiu o limiar para nenhuma categoria
+        self.com_sugestao = np.array(
+            [bool(c) and not str(c).startswith('Nova_Classe') for c in self.categorias], dtype=bool
+        )
+
+    def __len__(self):
+        return len(self._forms)
+
+    def posicoes(self, forms_numbers):
+        """Posição de cada forms_number no índice (-1 quando ausente) - vetorizado"""
+        forms_numbers = np.asarray(forms_numbers, dtype=np.int64)
+        if len(self._forms) == 0:
+            return np.full(len(forms_numbers), -1, dtype=np.int64)
+        posicoes = np.searchsorted(self._forms, forms_numbers)
+        posicoes = np.minimum(posicoes, len(self._forms) - 1)
+        return np.where(self._forms[posicoes] == forms_numbers, posicoes, -1)
+
+    def obter(self, forms_number):
+        """(categoria, confiança, threshold_met, best_match) ou None"""
+        posicao = self.posicoes([forms_number])[0]
+        if posicao < 0:
+            return None
+        return (
+            self.categorias[posicao],
+            float(self.confiancas[posicao]),
+            bool(self.thresholds[posicao]),
+            self.melhores[posicao] or None,
+        )
+
+    def obter_lote(self, forms_numbers):
+        """Consulta vetorizada para uma fila inteira de formulários"""
+        forms_numbers = np.asarray(forms_numbers, dtype=np.int64)
+        posicoes = self.posicoes(forms_numbers)
+        encontrados = posicoes >= 0
+        seguras = np.where(encontrados, posicoes, 0)
+
+        def selecionar(valores, padrao):
+            if len(valores) == 0:
+                return np.full(len(forms_numbers), padrao, dtype=valores.dtype)
+            return np.where(encontrados, valores[seguras], padrao)
+
+        return pd.DataFrame({
+            'forms_number': forms_numbers,
+            'level1_category': selecionar(self.categorias, None),
+            'level1_confidence': selecionar(self.confiancas, 0.0),
+            'level1_threshold_met': selecionar(self.thresholds, False),
+            'level1_best_match': selecionar(self.melhores, None),
+            'tem_sugestao': selecionar(self.com_sugestao, False),
+            'encontrado': encontrados,
+        })
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Índice de Vizinhos - Formulários já rotulados mais semelhantes ao formulário atual
+Busca por produto interno (cosseno) no FAISS, com fallback em numpy quando faiss não está instalado
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+try:
+    import faiss
+except ImportError:  # pragma: no cover - depende do ambiente
+    faiss = None
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+# A partir deste número de rótulos o índice exato dá lugar ao HNSW (aproximado)
+LIMITE_APROXIMADO = 20000
+HNSW_M = 32
+HNSW_EF_BUSCA = 64
+
+# ========================================
+# ÍNDICE
+# ========================================
+
+class IndiceVizinhos:
+    """Um vetor por formulário rotulado; a categoria exibida é a do rótulo humano mais recente"""
+
+    def __init__(self, embedder, aproximado=False):
+        self.embedder = embedder
+        self.dimensao = embedder.dimensao
+        self._lock = threading.Lock()
+        self._posicao = {}
+        self._forms = []
+        self._categorias = []
+        self._textos = []
+        self._rotuladores = []
+
+        if faiss is not None and aproximado:
+            self._faiss = faiss.IndexHNSWFlat(self.dimensao, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            self._faiss.hnsw.efSearch = HNSW_EF_BUSCA
+        elif faiss is not None:
+            self._faiss = faiss.IndexFlatIP(self.dimensao)
+        else:
+            self._faiss = None
+            self._matriz = np.empty((0, self.dimensao), dtype=np.float32)
+
+    @property
+    def motor(self):
+        if self._faiss is None:
+            return "numpy"
+        return "faiss-hnsw" if isinstance(self._faiss, faiss.IndexHNSWFlat) else "faiss"
+
+    def __len__(self):
+        return len(self._forms)
+
+    def __contains__(self, forms_number):
+        return int(forms_number) in self._posicao
+
+    def _acrescentar_vetores(self, vetores):
+        if self._faiss is not None:
+            self._faiss.add(vetores)
+            return
+        # Capacidade dobrada: acréscimos amortizados O(1) por vetor
+        necessario = len(self._forms) + len(vetores)
+        if necessario > len(self._matriz):
+            nova = np.empty((max(necessario, 2 * len(self._matriz), 64), self.dimensao), dtype=np.float32)
+            nova[:len(self._forms)] = self._matriz[:len(self._forms)]
+            self._matriz = nova
+        self._matriz[len(self._forms):necessario] = vetores
+
+    def adicionar_lote(self, forms_numbers, textos, categorias, rotuladores=None):
+        """Indexa formulários novos e atualiza o rótulo dos já indexados (em ordem cronológica)"""
+        rotuladores = rotuladores if rotuladores is not None else [None] * len(forms_numbers)
+        with self._lock:
+            novos = {}
+            for forms_number, texto, categoria, rotulador in zip(forms_numbers, textos, categorias, rotuladores):
+                forms_number = int(forms_number)
+                posicao = self._posicao.get(forms_number)
+                if posicao is not None:
+                    self._categorias[posicao] = categoria
+                    self._rotuladores[posicao] = rotulador
+                else:
+                    novos[forms_number] = (texto, categoria, rotulador)
+
+            if not novos:
+                return 0
+            vetores = np.ascontiguousarray(self.embedder.embed([texto for texto, _, _ in novos.values()]))
+            self._acrescentar_vetores(vetores)
+            for forms_number, (texto, categoria, rotulador) in novos.items():
+                self._posicao[forms_number] = len(self._forms)
+                self._forms.append(forms_number)
+                self._categorias.append(categoria)
+                self._textos.append(texto)
+                self._rotuladores.append(rotulador)
+            return len(novos)
+
+    def adicionar(self, forms_number, texto, categoria, rotulador=None):
+        return self.adicionar_lote([forms_number], [texto], [categoria], [rotulador])
+
+    def buscar(self, texto, k=5, excluir=None):
+        """Top-k formulários rotulados mais semelhantes (exclui o próprio formulário)"""
+        vetor = np.ascontiguousarray(self.embedder.embed([texto]), dtype=np.float32)
+        with self._lock:
+            total = len(self._forms)
+            if total == 0:
+                return pd.DataFrame(columns=['forms_number', 'categoria', 'similaridade', 'texto', 'rotulador'])
+            n = min(k + (1 if excluir is not None else 0), total)
+            if self._faiss is not None:
+                similaridades, posicoes = self._faiss.search(vetor, n)
+                similaridades, posicoes = similaridades[0], posicoes[0]
+            else:
+                scores = self._matriz[:total] @ vetor[0]
+                posicoes = np.argpartition(-scores, n - 1)[:n]
+                posicoes = posicoes[np.argsort(-scores[posicoes])]
+                similaridades = scores[posicoes]
+
+            linhas = [
+                (self._forms[p], self._categorias[p], float(s), self._textos[p], self._rotuladores[p])
+                for p, s in zip(posicoes.tolist(), similaridades.tolist())
+                if p >= 0 and (excluir is None or self._forms[p] != int(excluir))
+            ][:k]
+        return pd.DataFrame(linhas, columns=['forms_number', 'categoria', 'similaridade', 'texto', 'rotulador'])
+
+    def buscar_lote(self, vetores, k=5):
+        """Top-k de vários vetores em uma única busca: (similaridades, forms_number, categorias), cada um n x k
+
+        Posições sem vizinho (índice com menos de k formulários) ficam com similaridade -inf,
+        forms_number -1 e categoria None.
+        """
+        vetores = np.ascontiguousarray(vetores, dtype=np.float32)
+        n = len(vetores)
+        with self._lock:
+            total = len(self._forms)
+            similaridades = np.full((n, k), -np.inf, dtype=np.float32)
+            posicoes = np.full((n, k), -1, dtype=np.int64)
+            m = min(k, total)
+            if m and n:
+                if self._faiss is not None:
+                    encontradas, indices = self._faiss.search(vetores, m)
+                else:
+                    scores = vetores @ self._matriz[:total].T
+                    indices = np.argpartition(-scores, m - 1, axis=1)[:, :m]
+                    encontradas = np.take_along_axis(scores, indices, axis=1)
+                    ordem = np.argsort(-encontradas, axis=1)
+                    indices = np.take_along_axis(indices, ordem, axis=1)
+                    encontradas = np.take_along_axis(encontradas, ordem, axis=1)
+                validos = indices >= 0
+                similaridades[:, :m] = np.where(validos, encontradas, -np.inf)
+                posicoes[:, :m] = indices
+            forms = np.append(np.asarray(self._forms, dtype=np.int64), -1)
+            categorias = np.append(np.array(self._categorias, dtype=object), None)
+        return similaridades, forms[posicoes], categorias[posicoes]
+
+# ========================================
+# CONSTRUÇÃO
+# ========================================
+
+def construir_indice_vizinhos(df_classificacoes, embedder, aproximado=None):
+    """Índice a partir das classificações humanas consolidadas (mais recentes por último)"""
+    if df_classificacoes is None or df_classificacoes.empty:
+        return IndiceVizinhos(embedder, bool(aproximado))
+    if aproximado is None:
+        aproximado = len(df_classificacoes) >= LIMITE_APROXIMADO
+    indice = IndiceVizinhos(embedder, aproximado)
+    df = df_classificacoes.dropna(subset=['forms_number', 'human_category'])
+    if 'classification_timestamp' in df.columns:
+        df = df.sort_values('classification_timestamp', kind='stable')
+    indice.adicionar_lote(
+        df['forms_number'].to_numpy(),
+        df['forms_text'].fillna("").astype(str).tolist(),
+        df['human_category'].tolist(),
+        df['classifier_name'].tolist() if 'classifier_name' in df.columns else None,
+    )
+    return indice
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Log de Auditoria - Sessões em segmentos JSONL com rotação por tamanho
+As estatísticas por usuário ficam em um agregado pequeno atualizado incrementalmente
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+
+from diario_rotulos import HUMAN_LABELS_DIR, serializar_valor
+from trava_arquivo import travar
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+AUDITORIA_DIR = HUMAN_LABELS_DIR / "audit"
+LOG_LEGADO = HUMAN_LABELS_DIR / "classification_sessions.json"
+
+TAMANHO_MAX_SEGMENTO = 5 * 1024 * 1024  # 5 MB
+
+# ========================================
+# LOG
+# ========================================
+
+class LogAuditoria:
+    """Log append-only segmentado com estatísticas por usuário
+
+    Vários processos (sessões do Streamlit, CLIs) escrevem no mesmo diretório: o acréscimo ao
+    segmento e a atualização do agregado acontecem sob uma trava de arquivo, relendo o agregado
+    do disco, então nenhum processo sobrescreve os incrementos de outro.
+    """
+
+    def __init__(self, diretorio=AUDITORIA_DIR, tamanho_max=TAMANHO_MAX_SEGMENTO, log_legado=LOG_LEGADO):
+        self.diretorio = Path(diretorio)
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self.tamanho_max = tamanho_max
+        self.arquivo_estatisticas = self.diretorio / "statistics.json"
+        self.arquivo_trava = self.diretorio / ".trava"
+        self._lock = threading.Lock()
+
+        log_legado = Path(log_legado) if log_legado else None
+        if log_legado and log_legado.exists() and not self.segmentos():
+            with travar(self.arquivo_trava):
+                if not self.segmentos():
+                    self._importar_legado(log_legado)
+
+        self._estatisticas = self._carregar_estatisticas()
+
+    def _importar_legado(self, log_legado):
+        """Converte o JSON único antigo em segmento + agregado (uma única vez)"""
+        with open(log_legado, 'r', encoding='utf-8') as f:
+            logs = json.load(f)
+        with open(self._segmento_nome(1), 'w', encoding='utf-8') as f:
+            for entrada in logs.get("sessions", []):
+                f.write(json.dumps(entrada, ensure_ascii=False, default=serializar_valor) + "\n")
+        self._gravar_estatisticas(logs.get("statistics", {}))
+
+    def _segmento_nome(self, numero):
+        return self.diretorio / f"sessions-{numero:05d}.jsonl"
+
+    def segmentos(self):
+        """Segmentos em ordem cronológica"""
+        return sorted(self.diretorio.glob("sessions-*.jsonl"))
+
+    def _segmento_atual(self):
+        """Segmento corrente, rotacionando quando atinge o tamanho máximo"""
+        segmentos = self.segmentos()
+        if not segmentos:
+            return self._segmento_nome(1)
+        ultimo = segmentos[-1]
+        if ultimo.stat().st_size >= self.tamanho_max:
+            numero = int(ultimo.stem.split("-")[1]) + 1
+            return self._segmento_nome(numero)
+        return ultimo
+
+    def _carregar_estatisticas(self):
+        if self.arquivo_estatisticas.exists():
+            with open(self.arquivo_estatisticas, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+
+    def _gravar_estatisticas(self, estatisticas):
+        """Escrita atômica do agregado (tamanho proporcional ao número de usuários)"""
+        temporario = self.diretorio / f".statistics.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(estatisticas, f, indent=2, ensure_ascii=False)
+        os.replace(temporario, self.arquivo_estatisticas)
+
+    @staticmethod
+    def _acumular(estatisticas, entrada):
+        """Atualiza as estatísticas do usuário com uma nova entrada"""
+        user = entrada["user"]
+        if user not in estatisticas:
+            estatisticas[user] = {
+                "total_classifications": 0,
+                "ai_approvals": 0,
+                "manual_classifications": 0,
+                "avg_confidence": 0.0,
+                "last_activity": None
+            }
+
+        stats = estatisticas[user]
+        stats["total_classifications"] += 1
+        stats["last_activity"] = entrada["timestamp"]
+
+        if entrada.get("approved_ai", False):
+            stats["ai_approvals"] += 1
+        else:
+            stats["manual_classifications"] += 1
+
+        # Média incremental
+        total = stats["total_classifications"]
+        stats["avg_confidence"] += (entrada["confidence"] - stats["avg_confidence"]) / total
+
+    def registrar(self, entrada):
+        """Acrescenta uma entrada ao segmento atual e atualiza o agregado - custo O(1)"""
+        self.registrar_lote([entrada])
+
+    def registrar_lote(self, entradas):
+        """Várias entradas com uma escrita no segmento e uma gravação do agregado"""
+        linhas = "".join(json.dumps(e, ensure_ascii=False, default=serializar_valor) + "\n" for e in entradas)
+        with self._lock, travar(self.arquivo_trava):
+            with open(self._segmento_atual(), 'a', encoding='utf-8') as f:
+                f.write(linhas)
+            # Agregado relido sob a trava: inclui os incrementos dos outros processos
+            estatisticas = self._carregar_estatisticas()
+            for entrada in entradas:
+                self._acumular(estatisticas, entrada)
+            self._gravar_estatisticas(estatisticas)
+            self._estatisticas = estatisticas
+
+    def estatisticas(self):
+        """Estatísticas por usuário (relidas do disco: podem ter sido atualizadas por outro processo)"""
+        self._estatisticas = self._carregar_estatisticas()
+        return self._estatisticas
+
+    def eventos(self):
+        """Itera sobre todas as entradas em ordem cronológica"""
+        for segmento in self.segmentos():
+            with open(segmento, 'r', encoding='utf-8') as f:
+                for linha in f:
+                    if linha.strip():
+                        yield json.loads(linha)
+
+    def reconstruir_estatisticas(self):
+        """Recalcula o agregado a partir dos segmentos (recuperação)"""
+        with self._lock, travar(self.arquivo_trava):
+            estatisticas = {}
+            for entrada in self.eventos():
+                self._acumular(estatisticas, entrada)
+            self._estatisticas = estatisticas
+            self._gravar_estatisticas(estatisticas)
+        return estatisticas
+
+
+if __name__ == "__main__":
+    estatisticas = LogAuditoria().reconstruir_estatisticas()
+    print(json.dumps(estatisticas, indent=2, ensure_ascii=False))
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Matriz de Scores - Decodificação única de level1_all_scores
+Converte os JSONs por linha em uma matriz float32 (formulários x categorias) com vocabulário
+"""
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from cache_colunar import CACHE_DIR, cache_valido, carregar_tabela, gravar_meta, nome_cache
+
+# ========================================
+# MATRIZ
+# ========================================
+
+class MatrizScores:
+    """Scores de similaridade por categoria, linhas ordenadas por forms_number"""
+
+    def __init__(self, forms_number, categorias, scores):
+        self.forms_number = np.asarray(forms_number, dtype=np.int64)
+        self.categorias = list(categorias)
+        self.scores = scores
+
+    def __len__(self):
+        return len(self.forms_number)
+
+    @classmethod
+    def decodificar(cls, forms_number, all_scores):
+        """Decodifica os JSONs uma única vez"""
+        dicionarios = [json.loads(texto) if texto else {} for texto in all_scores]
+        categorias = sorted({categoria for d in dicionarios for categoria in d})
+        posicao = {categoria: i for i, categoria in enumerate(categorias)}
+
+        scores = np.full((len(dicionarios), len(categorias)), np.nan, dtype=np.float32)
+        for linha, d in enumerate(dicionarios):
+            for categoria, valor in d.items():
+                scores[linha, posicao[categoria]] = valor
+
+        forms_number = np.asarray(forms_number, dtype=np.int64)
+        ordem = np.argsort(forms_number, kind='stable')
+        return cls(forms_number[ordem], categorias, scores[ordem])
+
+    def posicoes(self, forms_numbers):
+        """Linha de cada forms_number (-1 quando ausente)"""
+        forms_numbers = np.asarray(forms_numbers, dtype=np.int64)
+        if len(self.forms_number) == 0:
+            return np.full(len(forms_numbers), -1, dtype=np.int64)
+        posicoes = np.minimum(np.searchsorted(self.forms_number, forms_numbers), len(self.forms_number) - 1)
+        return np.where(self.forms_number[posicoes] == forms_numbers, posicoes, -1)
+
+    def top_k(self, k=2):
+        """Índices e valores das k maiores categorias por linha (ordem decrescente)"""
+        scores = np.nan_to_num(np.asarray(self.scores), nan=-np.inf)
+        k = min(k, scores.shape[1])
+        indices = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        valores = np.take_along_axis(scores, indices, axis=1)
+        ordem = np.argsort(-valores, axis=1)
+        return np.take_along_axis(indices, ordem, axis=1), np.take_along_axis(valores, ordem, axis=1)
+
+    def margens(self):
+        """Diferença entre o primeiro e o segundo maior score"""
+        _, valores = self.top_k(2)
+        if valores.shape[1] < 2:
+            return np.full(len(self), np.inf, dtype=np.float32)
+        return valores[:, 0] - valores[:, 1]
+
+    # ========================================
+    # PERSISTÊNCIA
+    # ========================================
+
+    def salvar(self, prefixo):
+        """Grava arrays .npy (mapeáveis em memória) + vocabulário
+
+        Cada arquivo é escrito em um temporário e trocado com os.replace: outro processo que
+        tenha os .npy anteriores mapeados continua lendo a versão antiga, intacta.
+        """
+        prefixo = Path(prefixo)
+        prefixo.parent.mkdir(parents=True, exist_ok=True)
+        temporarios = {
+            f"{prefixo}.forms.npy": f"{prefixo}.forms.{os.getpid()}.tmp.npy",
+            f"{prefixo}.scores.npy": f"{prefixo}.scores.{os.getpid()}.tmp.npy",
+            f"{prefixo}.categorias.json": f"{prefixo}.categorias.{os.getpid()}.tmp",
+        }
+        np.save(temporarios[f"{prefixo}.forms.npy"], self.forms_number)
+        np.save(temporarios[f"{prefixo}.scores.npy"], np.asarray(self.scores, dtype=np.float32))
+        with open(temporarios[f"{prefixo}.categorias.json"], 'w', encoding='utf-8') as f:
+            json.dump(self.categorias, f, ensure_ascii=False)
+        for destino, temporario in temporarios.items():
+            os.replace(temporario, destino)
+
+    @classmethod
+    def carregar(cls, prefixo):
+        with open(f"{prefixo}.categorias.json", 'r', encoding='utf-8') as f:
+            categorias = json.load(f)
+        forms_number = np.load(f"{prefixo}.forms.npy")
+        scores = np.load(f"{prefixo}.scores.npy", mmap_mode='r')
+        return cls(forms_number, categorias, scores)
+
+# ========================================
+# CARGA COM CACHE
+# ========================================
+
+def carregar_matriz_scores(caminho_classificacoes, cache_dir=CACHE_DIR):
+    """Matriz de scores a partir do cache binário, reconstruído quando o CSV muda"""
+    prefixo = Path(cache_dir) / f"{nome_cache(caminho_classificacoes)}.all_scores"
+    arquivo_meta = Path(f"{prefixo}.meta.json")
+
+    if Path(f"{prefixo}.scores.npy").exists() and cache_valido(caminho_classificacoes, arquivo_meta):
+        return MatrizScores.carregar(prefixo)
+
+    tabela = carregar_tabela(caminho_classificacoes, cache_dir)
+    matriz = MatrizScores.decodificar(
+        tabela.column('forms_number').to_numpy(),
+        tabela.column('level1_all_scores').to_pylist()
+    )
+    matriz.salvar(prefixo)
+    gravar_meta(caminho_classificacoes, arquivo_meta)
+    return MatrizScores.carregar(prefixo)
+
+
+if __name__ == "__main__":
+    import sys
+
+    caminho = sys.argv[1] if len(sys.argv) > 1 else "level1_classifications.csv"
+    matriz = carregar_matriz_scores(caminho)
+    margens = matriz.margens()
+    print(f"{len(matriz)} formulários x {len(matriz.categorias)} categorias")
+    print(f"Margem top1-top2: mediana={np.median(margens):.4f}  p10={np.percentile(margens, 10):.4f}")
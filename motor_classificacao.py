@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Motor de Classificação por Similaridade - Gera level1_classifications no repositório
+Embeddings dos forms_text pontuados contra protótipos de categoria em uma multiplicação de matrizes
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import normalize
+
+from cache_embeddings import CacheEmbeddings
+from embeddings import EmbedderHash
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+# Limiar do pipeline original (level1_all_scores); não vale para os scores de outro embedder,
+# cujo limiar é calibrado com --semente e gravado junto dos protótipos
+LIMIAR_PADRAO = 0.47
+
+MODELOS_DIR = Path("data/modelos")
+PROTOTIPOS_FILE = MODELOS_DIR / "prototipos.npz"
+# Protótipos base + rótulos humanos acumulados online (prototipos_online.py)
+PROTOTIPOS_ONLINE_FILE = MODELOS_DIR / "prototipos_online.npz"
+
+COLUNAS_SAIDA = [
+    'forms_number',
+    'level1_category',
+    'level1_confidence',
+    'level1_threshold_met',
+    'level1_classification_type',
+    'level1_best_match',
+    'level1_best_match_score',
+    'level1_all_scores',
+]
+
+# Descrições usadas quando não há formulários rotulados para a categoria
+CATEGORIAS_NIVEL1 = {
+    "Administração e RH": (
+        "Gestão de folha de pagamento; gestão de benefícios; entrega de equipamentos; "
+        "atualização cadastral de colaboradores; elaboração de contratos; clima organizacional; "
+        "recrutamento e seleção; desligamento de colaboradores; exames ocupacionais"
+    ),
+    "Atendimento": (
+        "Atendimento de solicitações de titulares de dados; atendimento a colaboradores, clientes "
+        "e fornecedores; ouvidoria; atendimento presencial e remoto; inscrição em eventos"
+    ),
+    "Auditoria, Compliance e Jurídico": (
+        "Auditoria externa e interna; compliance normativo; contencioso; contratos e parcerias; "
+        "controle interno; processos judiciais"
+    ),
+    "Dados, TI e BI": (
+        "Desenvolvimento de ETLs com dados pessoais; painéis Data Sebrae; projetos de data science; "
+        "sistemas transacionais com dados pessoais; infraestrutura de TI; backup e recuperação"
+    ),
+    "Financeiro e Contábil": (
+        "Contas a pagar e a receber; pagamento de fornecedores; faturamento; notas fiscais; "
+        "contabilidade; tesouraria; orçamento; prestação de contas; reembolso de despesas"
+    ),
+    "Gestão, Estratégia e Processos": (
+        "Planejamento estratégico; gestão de processos; gestão de projetos; governança corporativa"
+    ),
+    "Outras Atividades": "Atividades diversas; outros",
+}
+
+# ========================================
+# PROTÓTIPOS
+# ========================================
+
+class Prototipos:
+    """Centroides L2-normalizados das categorias (uma linha por categoria)
+
+    `limiar` é o limiar de confiança calibrado para estes protótipos (None = não calibrado).
+    """
+
+    def __init__(self, categorias, matriz, embedder_nome=None, limiar=None):
+        self.categorias = list(categorias)
+        self.matriz = normalize(np.asarray(matriz, dtype=np.float32)).astype(np.float32)
+        self.embedder_nome = embedder_nome
+        self.limiar = limiar
+
+    @property
+    def versao(self):
+        """Identificador do conteúdo (muda quando qualquer protótipo muda)"""
+        sha = hashlib.sha1(self.matriz.tobytes())
+        sha.update(json.dumps(self.categorias, ensure_ascii=False).encode('utf-8'))
+        return sha.hexdigest()[:12]
+
+    @classmethod
+    def de_descricoes(cls, embedder, descricoes=CATEGORIAS_NIVEL1):
+        categorias = sorted(descricoes)
+        matriz = embedder.embed([f"{c}; {descricoes[c]}" for c in categorias])
+        return cls(categorias, matriz, embedder.nome)
+
+    @classmethod
+    def de_rotulos(cls, embeddings, rotulos, base, embedder_nome=None):
+        """Centroides dos formulários rotulados; categorias sem exemplos mantêm o protótipo base"""
+        rotulos = np.asarray(rotulos, dtype=object)
+        matriz = base.matriz.copy()
+        for i, categoria in enumerate(base.categorias):
+            mascara = rotulos == categoria
+            if mascara.any():
+                matriz[i] = embeddings[mascara].mean(axis=0)
+        return cls(base.categorias, matriz, embedder_nome or base.embedder_nome, base.limiar)
+
+    def salvar(self, caminho=PROTOTIPOS_FILE, **extras):
+        """Escrita atômica (lida por outros processos); extras são gravados como metadados"""
+        caminho = Path(caminho)
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        temporario = caminho.with_name(f"{caminho.stem}.{os.getpid()}.tmp.npz")
+        if self.limiar is not None:
+            extras = {'limiar': self.limiar, **extras}
+        np.savez(temporario, categorias=np.array(self.categorias), matriz=self.matriz,
+                 embedder_nome=np.array(self.embedder_nome or ""),
+                 **{chave: np.array(valor) for chave, valor in extras.items()})
+        os.replace(temporario, caminho)
+
+    @classmethod
+    def carregar(cls, caminho=PROTOTIPOS_FILE):
+        with np.load(caminho) as dados:
+            limiar = float(dados['limiar']) if 'limiar' in dados.files else None
+            return cls(dados['categorias'].tolist(), dados['matriz'], str(dados['embedder_nome']) or None, limiar)
+
+def calibrar_limiar(scores, taxa_automatica):
+    """Limiar que classifica automaticamente a fração `taxa_automatica` dos formulários
+
+    Cosseno de 0.47 não significa o mesmo em embedders diferentes: o limiar é o quantil da
+    melhor pontuação que reproduz a taxa de classificações automáticas da semente.
+    """
+    return float(np.quantile(np.asarray(scores, dtype=np.float32).max(axis=1), 1.0 - taxa_automatica))
+
+# ========================================
+# RESULTADO
+# ========================================
+
+def montar_resultado(forms_number, scores, categorias, limiar):
+    """DataFrame no esquema de level1_classifications a partir da matriz de scores"""
+    scores = np.asarray(scores, dtype=np.float32)
+    nomes = np.array(categorias, dtype=object)
+    nova_classe = f"Nova_Classe_{len(categorias) + 1}"
+
+    melhor = scores.argmax(axis=1)
+    confianca = scores.max(axis=1).astype(np.float64)
+    atingiu = confianca >= limiar
+    categoria_melhor = nomes[melhor]
+
+    return pd.DataFrame({
+        'forms_number': np.asarray(forms_number, dtype=np.int64),
+        'level1_category': np.where(atingiu, categoria_melhor, nova_classe),
+        'level1_confidence': confianca,
+        'level1_threshold_met': atingiu,
+        'level1_classification_type': np.where(atingiu, 'automatic', 'new_class'),
+        'level1_best_match': np.where(atingiu, "", categoria_melhor),
+        'level1_best_match_score': np.where(atingiu, 0.0, confianca),
+        'level1_all_scores': [json.dumps(dict(zip(categorias, linha))) for linha in scores.tolist()],
+    }, columns=COLUNAS_SAIDA)
+
+def gravar_classificacoes(df, caminho):
+    """Grava CSV (booleanos em minúsculas, como o arquivo original) ou Parquet
+
+    Escrita atômica: o app e a reclassificação incremental leem este arquivo, e uma
+    interrupção no meio da escrita não pode deixá-lo truncado.
+    """
+    caminho = Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    temporario = caminho.with_name(f"{caminho.stem}.{os.getpid()}.tmp{caminho.suffix}")
+    try:
+        if caminho.suffix == ".parquet":
+            df.to_parquet(temporario, index=False)
+        else:
+            saida = df.copy()
+            saida['level1_threshold_met'] = np.where(saida['level1_threshold_met'], 'true', 'false')
+            saida.to_csv(temporario, index=False, encoding='utf-8')
+        os.replace(temporario, caminho)
+    finally:
+        temporario.unlink(missing_ok=True)
+
+# ========================================
+# MOTOR
+# ========================================
+
+class MotorClassificacao:
+    """Classificação em lote: embed -> scores (uma matmul) -> limiar
+
+    Sem `limiar` explícito usa o calibrado dos protótipos; recusa protótipos não calibrados.
+    """
+
+    def __init__(self, embedder, prototipos, limiar=None):
+        if prototipos.embedder_nome and prototipos.embedder_nome != embedder.nome:
+            raise ValueError(
+                f"Protótipos gerados com '{prototipos.embedder_nome}', mas o embedder é '{embedder.nome}'"
+            )
+        if limiar is None:
+            limiar = prototipos.limiar
+        if limiar is None:
+            raise ValueError(
+                f"Protótipos sem limiar calibrado para '{embedder.nome}': gere-os com "
+                f"'motor_classificacao.py --semente level1_classifications.csv' ou informe --limiar"
+            )
+        self.embedder = embedder
+        self.prototipos = prototipos
+        self.limiar = limiar
+
+    def pontuar(self, embeddings):
+        """Similaridade de cosseno contra todos os protótipos"""
+        return np.asarray(embeddings, dtype=np.float32) @ self.prototipos.matriz.T
+
+    def classificar_embeddings(self, forms_number, embeddings):
+        return montar_resultado(forms_number, self.pontuar(embeddings), self.prototipos.categorias, self.limiar)
+
+    def classificar_lote(self, forms_number, textos):
+        return self.classificar_embeddings(forms_number, self.embedder.embed(textos))
+
+def carregar_prototipos_base(caminho_prototipos=PROTOTIPOS_FILE, embedder=None):
+    """Protótipos persistidos (ou derivados das descrições das categorias)"""
+    if Path(caminho_prototipos).exists():
+        return Prototipos.carregar(caminho_prototipos)
+    return Prototipos.de_descricoes(embedder if embedder is not None else EmbedderHash())
+
+def carregar_prototipos(caminho_prototipos=PROTOTIPOS_FILE, embedder=None, caminho_online=PROTOTIPOS_ONLINE_FILE):
+    """Protótipos vigentes: a versão online, se derivada desta mesma base, senão a base"""
+    base = carregar_prototipos_base(caminho_prototipos, embedder)
+    if caminho_online and Path(caminho_online).exists():
+        with np.load(caminho_online) as dados:
+            derivado_da_base = 'base_versao' in dados and str(dados['base_versao']) == base.versao
+        if derivado_da_base:
+            online = Prototipos.carregar(caminho_online)
+            # O limiar calibrado é o da base (o arquivo online pode ser anterior à calibração)
+            online.limiar = base.limiar
+            return online
+    return base
+
+def carregar_motor(caminho_prototipos=PROTOTIPOS_FILE, limiar=None, embedder=None,
+                   caminho_online=PROTOTIPOS_ONLINE_FILE):
+    """Motor com os protótipos vigentes (incluindo as correções humanas já incorporadas)"""
+    # CacheEmbeddings vazio tem len() == 0: testar None, não a veracidade
+    embedder = embedder if embedder is not None else EmbedderHash()
+    prototipos = carregar_prototipos(caminho_prototipos, embedder, caminho_online)
+    return MotorClassificacao(embedder, prototipos, limiar)
+
+# ========================================
+# LINHA DE COMANDO
+# ========================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera level1_classifications a partir dos forms_text")
+    parser.add_argument("--entrada", default="dados_embbeding.csv")
+    parser.add_argument("--saida", default="data/classified/level1_classifications.csv")
+    parser.add_argument("--prototipos", default=str(PROTOTIPOS_FILE))
+    parser.add_argument("--semente", default=None,
+                        help="level1_classifications existente: protótipos = centroides das classificações automáticas")
+    parser.add_argument("--limiar", type=float, default=None,
+                        help="Padrão: limiar calibrado gravado com os protótipos (--semente)")
+    parser.add_argument("--sem-cache", action="store_true", help="Não usar o cache de embeddings em disco")
+    parser.add_argument("--ollama", metavar="MODELO", default=None,
+                        help="Embeddings do servidor Ollama ($OLLAMA_HOST) em vez do EmbedderHash")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.entrada, encoding='utf-8-sig')
+    if args.ollama:
+        from embeddings_ollama import EmbedderOllama
+        base = EmbedderOllama(args.ollama)
+    else:
+        base = EmbedderHash()
+    embedder = base if args.sem_cache else CacheEmbeddings(base)
+
+    inicio = time.perf_counter()
+    embeddings = embedder.embed(df['forms_text'].tolist())
+    tempo_embed = time.perf_counter() - inicio
+
+    if args.semente:
+        semente = pd.read_csv(args.semente)
+        taxa_automatica = (semente['level1_classification_type'] == 'automatic').mean()
+        semente = semente[semente['level1_classification_type'] == 'automatic']
+        rotulos = df['forms_number'].map(semente.set_index('forms_number')['level1_category'])
+        prototipos = Prototipos.de_rotulos(embeddings, rotulos.to_numpy(dtype=object),
+                                           Prototipos.de_descricoes(embedder))
+        prototipos.limiar = (args.limiar if args.limiar is not None
+                             else calibrar_limiar(embeddings @ prototipos.matriz.T, taxa_automatica))
+        prototipos.salvar(args.prototipos)
+        print(f"Protótipos {prototipos.versao} gravados em {args.prototipos} "
+              f"(limiar {prototipos.limiar:.4f}; {taxa_automatica:.1%} automáticas na semente)")
+
+    try:
+        motor = carregar_motor(args.prototipos, args.limiar, embedder)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    inicio = time.perf_counter()
+    resultado = motor.classificar_embeddings(df['forms_number'].to_numpy(), embeddings)
+    tempo_score = time.perf_counter() - inicio
+    gravar_classificacoes(resultado, args.saida)
+
+    n = len(df)
+    print(f"{n} formulários classificados -> {args.saida}")
+    print(f"Embeddings: {tempo_embed:.2f}s ({n / max(tempo_embed, 1e-9):,.0f} formulários/s)")
+    if isinstance(embedder, CacheEmbeddings):
+        estatisticas = embedder.estatisticas()
+        print(f"Cache de embeddings: {estatisticas['acertos']} acertos, {estatisticas['faltas']} faltas, "
+              f"{estatisticas['vetores']} vetores armazenados")
+    print(f"Pontuação + esquema: {tempo_score:.3f}s ({n / max(tempo_score, 1e-9):,.0f} formulários/s)")
+    print(resultado['level1_classification_type'].value_counts().to_string())
+
+
+if __name__ == "__main__":
+    main()
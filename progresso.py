@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Progresso por Usuário - Conjunto compacto de formulários já analisados
+Array int64 ordenado em memória; persistido como arquivo binário append-only
+"""
+
+import hashlib
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+
+# ========================================
+# ÍNDICE EM MEMÓRIA
+# ========================================
+
+class IndiceProgresso:
+    """Array ordenado de forms_number analisados, com filtro vetorizado da fila"""
+
+    def __init__(self, formularios=()):
+        self._feitos = np.unique(np.asarray(list(formularios), dtype=np.int64))
+
+    def adicionar(self, forms_number):
+        """Inserção ordenada; ignora formulários já presentes"""
+        forms_number = int(forms_number)
+        posicao = np.searchsorted(self._feitos, forms_number)
+        if posicao < len(self._feitos) and self._feitos[posicao] == forms_number:
+            return False
+        self._feitos = np.insert(self._feitos, posicao, forms_number)
+        return True
+
+    def adicionar_lote(self, forms_numbers):
+        """Une vários formulários de uma vez; retorna apenas os que eram novos"""
+        forms_numbers = np.unique(np.asarray(forms_numbers, dtype=np.int64))
+        novos = forms_numbers[self.mascara_pendentes(forms_numbers)]
+        if len(novos):
+            self._feitos = np.union1d(self._feitos, novos)
+        return novos
+
+    def __contains__(self, forms_number):
+        posicao = np.searchsorted(self._feitos, int(forms_number))
+        return bool(posicao < len(self._feitos) and self._feitos[posicao] == int(forms_number))
+
+    def __len__(self):
+        return len(self._feitos)
+
+    def mascara_analisados(self, forms_numbers):
+        """Máscara booleana dos formulários já analisados (busca binária vetorizada)"""
+        forms_numbers = np.asarray(forms_numbers, dtype=np.int64)
+        if len(self._feitos) == 0:
+            return np.zeros(len(forms_numbers), dtype=bool)
+        posicoes = np.searchsorted(self._feitos, forms_numbers)
+        posicoes = np.minimum(posicoes, len(self._feitos) - 1)
+        return self._feitos[posicoes] == forms_numbers
+
+    def mascara_pendentes(self, forms_numbers):
+        """Máscara booleana dos formulários ainda não analisados"""
+        return ~self.mascara_analisados(forms_numbers)
+
+# ========================================
+# PERSISTÊNCIA EM ARQUIVO
+# ========================================
+
+def arquivo_progresso(diretorio, usuario):
+    """Arquivo binário do usuário: nome seguro + hash curto do nome original
+
+    Sem o hash, nomes como "ana.s" e "ana s" cairiam no mesmo arquivo. O arquivo antigo
+    (sem hash) é adotado quando o nome não perdeu caracteres na sanitização.
+    """
+    usuario = str(usuario)
+    nome = re.sub(r'[^\w-]', '_', usuario)
+    sufixo = hashlib.blake2b(usuario.encode('utf-8'), digest_size=4).hexdigest()
+    caminho = Path(diretorio) / f"{nome}-{sufixo}.bin"
+    legado = Path(diretorio) / f"{nome}.bin"
+    if nome == usuario and not caminho.exists() and legado.exists():
+        try:
+            os.replace(legado, caminho)
+        except FileNotFoundError:
+            pass  # outro processo já migrou
+    return caminho
+
+def carregar_progresso(caminho):
+    """Lê todos os forms_number gravados (int64 little-endian)"""
+    caminho = Path(caminho)
+    if not caminho.exists():
+        return np.empty(0, dtype=np.int64)
+    dados = caminho.read_bytes()
+    # Descarta um registro parcial no final (escrita interrompida)
+    dados = dados[:len(dados) - len(dados) % 8]
+    return np.frombuffer(dados, dtype='<i8').astype(np.int64)
+
+def acrescentar_progresso(caminho, forms_number):
+    """Acrescenta um ou vários forms_number ao arquivo em uma única escrita"""
+    caminho = Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    with open(caminho, 'ab') as f:
+        f.write(np.atleast_1d(np.asarray(forms_number, dtype='<i8')).tobytes())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Protótipos Online - Centroides atualizados a cada classificação humana, sem retreino
+Somas acumuladas ponderadas por confidence_human: custo O(dimensão) por rótulo
+"""
+
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from motor_classificacao import PROTOTIPOS_FILE, PROTOTIPOS_ONLINE_FILE, Prototipos, carregar_prototipos_base
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+# O protótipo base vale tanto quanto PESO_BASE rótulos com certeza 100%
+PESO_BASE = 2.0
+PESO_PADRAO = 0.8
+
+
+def peso_rotulo(confidence_human):
+    """Peso do rótulo = certeza do anotador (padrão quando ausente ou inválida)"""
+    try:
+        peso = float(confidence_human)
+    except (TypeError, ValueError):
+        return PESO_PADRAO
+    return peso if np.isfinite(peso) and peso > 0 else PESO_PADRAO
+
+# ========================================
+# ATUALIZADOR
+# ========================================
+
+class AtualizadorPrototipos:
+    """Protótipo = (peso_base x base + soma ponderada dos rótulos) normalizado
+
+    Uma reclassificação do mesmo formulário pelo mesmo usuário substitui a
+    contribuição anterior; categorias humanas fora da base ganham protótipo próprio.
+    """
+
+    def __init__(self, base, embedder, peso_base=PESO_BASE):
+        self.base = base
+        self.embedder = embedder
+        self.categorias = list(base.categorias)
+        self._posicao = {categoria: i for i, categoria in enumerate(self.categorias)}
+        self.somas = base.matriz.astype(np.float64) * peso_base
+        self.pesos = np.full(len(self.categorias), float(peso_base))
+        self._contribuicoes = {}
+        self._cursor = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Rótulos humanos incorporados"""
+        return len(self._contribuicoes)
+
+    def _linha(self, categoria):
+        posicao = self._posicao.get(categoria)
+        if posicao is None:
+            posicao = len(self.categorias)
+            self.categorias.append(categoria)
+            self._posicao[categoria] = posicao
+            self.somas = np.vstack([self.somas, np.zeros((1, self.somas.shape[1]))])
+            self.pesos = np.append(self.pesos, 0.0)
+        return posicao
+
+    def _aplicar(self, posicao, vetor, peso):
+        self.somas[posicao] += peso * vetor
+        self.pesos[posicao] += peso
+
+    def registrar_lote(self, registros):
+        """Incorpora classificações humanas (dicionários no esquema de human_classifications)"""
+        validos = [r for r in registros if r.get('human_category') and r.get('forms_number') is not None]
+        if not validos:
+            return 0
+        vetores = self.embedder.embed([r.get('forms_text') or "" for r in validos])
+        with self._lock:
+            for registro, vetor in zip(validos, vetores):
+                chave = (int(registro['forms_number']), str(registro.get('classifier_name')))
+                anterior = self._contribuicoes.pop(chave, None)
+                if anterior is not None:
+                    self._aplicar(anterior[0], anterior[2], -anterior[1])
+                posicao = self._linha(registro['human_category'])
+                peso = peso_rotulo(registro.get('confidence_human'))
+                self._aplicar(posicao, vetor, peso)
+                self._contribuicoes[chave] = (posicao, peso, vetor)
+        return len(validos)
+
+    def registrar(self, registro):
+        return self.registrar_lote([registro])
+
+    def sincronizar(self, armazenamento):
+        """Incorpora o que foi gravado no backend desde a última chamada (inclusive por outros processos)"""
+        registros, self._cursor = armazenamento.novas_classificacoes(self._cursor)
+        return self.registrar_lote(registros)
+
+    def prototipos(self):
+        with self._lock:
+            ativos = self.pesos > 1e-9
+            categorias = [c for c, ativo in zip(self.categorias, ativos) if ativo]
+            matriz = self.somas[ativos]
+        return Prototipos(categorias, matriz, self.base.embedder_nome or self.embedder.nome, self.base.limiar)
+
+    def salvar(self, caminho=PROTOTIPOS_ONLINE_FILE):
+        """Grava os protótipos vigentes; o motor só os usa enquanto a base for a mesma"""
+        prototipos = self.prototipos()
+        prototipos.salvar(caminho, base_versao=self.base.versao, rotulos=len(self))
+        return prototipos
+
+# ========================================
+# LINHA DE COMANDO
+# ========================================
+
+def main():
+    from armazenamento import criar_armazenamento
+    from cache_embeddings import CacheEmbeddings
+    from embeddings import EmbedderHash
+
+    parser = argparse.ArgumentParser(description="Incorpora as classificações humanas aos protótipos")
+    parser.add_argument("--backend", default=None, help="arquivos ou sqlite (padrão: $ROTULOS_BACKEND)")
+    parser.add_argument("--prototipos", default=str(PROTOTIPOS_FILE))
+    parser.add_argument("--saida", default=str(PROTOTIPOS_ONLINE_FILE))
+    parser.add_argument("--seguir", type=float, default=None, metavar="SEGUNDOS",
+                        help="Continua acompanhando novas classificações neste intervalo")
+    args = parser.parse_args()
+
+    embedder = CacheEmbeddings(EmbedderHash())
+    armazenamento = criar_armazenamento(args.backend)
+    atualizador = AtualizadorPrototipos(carregar_prototipos_base(args.prototipos, embedder), embedder)
+
+    while True:
+        inicio = time.perf_counter()
+        novos = atualizador.sincronizar(armazenamento)
+        if novos:
+            prototipos = atualizador.salvar(args.saida)
+            print(f"{novos} rótulos incorporados em {(time.perf_counter() - inicio) * 1000:.1f} ms "
+                  f"({len(atualizador)} no total) -> protótipos {prototipos.versao}")
+        if args.seguir is None:
+            break
+        time.sleep(args.seguir)
+
+
+if __name__ == "__main__":
+    main()
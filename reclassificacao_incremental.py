@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Reclassificação Incremental - Classifica apenas formulários novos ou alterados
+Diff por forms_number + hash do texto normalizado contra o estado da execução anterior
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cache_embeddings import CacheEmbeddings, chave_texto
+from embeddings import EmbedderHash
+from motor_classificacao import PROTOTIPOS_FILE, carregar_motor, gravar_classificacoes
+
+# ========================================
+# ESTADO DA EXECUÇÃO ANTERIOR
+# ========================================
+
+TIPO_CHAVE = np.dtype('V16')
+
+
+def arquivo_estado(saida):
+    """Estado gravado ao lado da tabela de classificações"""
+    saida = Path(saida)
+    return saida.with_name(f"{saida.stem}.estado.npz")
+
+def hashes_textos(textos):
+    """Hash do texto normalizado de cada formulário (16 bytes)"""
+    return np.frombuffer(b"".join(chave_texto(texto) for texto in textos), dtype=TIPO_CHAVE)
+
+def carregar_estado(caminho):
+    if not Path(caminho).exists():
+        return None
+    with np.load(caminho) as dados:
+        return {
+            'forms_number': dados['forms_number'],
+            'hashes': dados['hashes'],
+            'versao': str(dados['versao']),
+            'limiar': float(dados['limiar']),
+        }
+
+def gravar_estado(caminho, forms_number, hashes, versao, limiar):
+    caminho = Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    ordem = np.argsort(forms_number, kind='stable')
+    temporario = caminho.with_name(f"{caminho.stem}.tmp.npz")
+    np.savez(temporario, forms_number=forms_number[ordem], hashes=hashes[ordem],
+             versao=np.array(versao), limiar=np.array(limiar))
+    temporario.replace(caminho)
+
+# ========================================
+# DIFF
+# ========================================
+
+def detectar_mudancas(forms_number, hashes, estado):
+    """Máscaras (novos, alterados) sobre a entrada atual e forms_number removidos"""
+    forms_number = np.asarray(forms_number, dtype=np.int64)
+    anteriores = estado['forms_number']
+    if len(anteriores) == 0:
+        return np.ones(len(forms_number), dtype=bool), np.zeros(len(forms_number), dtype=bool), anteriores
+
+    posicoes = np.minimum(np.searchsorted(anteriores, forms_number), len(anteriores) - 1)
+    existentes = anteriores[posicoes] == forms_number
+    novos = ~existentes
+    alterados = existentes & (estado['hashes'][posicoes] != hashes)
+    removidos = np.setdiff1d(anteriores, forms_number)
+    return novos, alterados, removidos
+
+# ========================================
+# RECLASSIFICAÇÃO
+# ========================================
+
+def ler_classificacoes(caminho):
+    caminho = Path(caminho)
+    if caminho.suffix == ".parquet":
+        return pd.read_parquet(caminho)
+    return pd.read_csv(caminho, keep_default_na=False, na_values=[""])
+
+def reclassificar(df, saida, motor, completo=False):
+    """Atualiza a tabela de classificações em `saida` e retorna o resumo da execução
+
+    forms_number repetidos na entrada são descartados antes de tudo (vale a primeira ocorrência,
+    como no classificacao_streaming): o estado, a reordenação e a junção pressupõem chaves únicas.
+    """
+    repetidos = df['forms_number'].duplicated(keep='first').to_numpy()
+    df = df[~repetidos]
+    forms_number = df['forms_number'].to_numpy(dtype=np.int64)
+    textos = df['forms_text'].tolist()
+    hashes = hashes_textos(textos)
+    caminho_estado = arquivo_estado(saida)
+
+    estado = None if completo or not Path(saida).exists() else carregar_estado(caminho_estado)
+    # Protótipos ou limiar diferentes invalidam todas as classificações anteriores
+    if estado and (estado['versao'] != motor.prototipos.versao or estado['limiar'] != motor.limiar):
+        estado = None
+
+    if estado is None:
+        pendentes = np.ones(len(df), dtype=bool)
+        resumo = {'modo': 'completo', 'novos': len(df), 'alterados': 0, 'removidos': 0}
+    else:
+        novos, alterados, removidos = detectar_mudancas(forms_number, hashes, estado)
+        pendentes = novos | alterados
+        resumo = {'modo': 'incremental', 'novos': int(novos.sum()), 'alterados': int(alterados.sum()),
+                  'removidos': len(removidos)}
+
+    resumo['inalterados'] = int((~pendentes).sum())
+    resumo['repetidos'] = int(repetidos.sum())
+    if estado is not None and not pendentes.any() and resumo['removidos'] == 0:
+        return resumo
+
+    indices = np.flatnonzero(pendentes)
+    resultado = motor.classificar_lote(forms_number[indices], [textos[i] for i in indices])
+
+    if estado is not None:
+        anteriores = ler_classificacoes(saida)
+        mantidos = anteriores[np.isin(anteriores['forms_number'].to_numpy(dtype=np.int64),
+                                      forms_number[~pendentes])]
+        resultado = pd.concat([mantidos, resultado], ignore_index=True)
+        # Mesma ordem do arquivo de entrada
+        ordem = pd.Series(np.arange(len(forms_number)), index=forms_number)
+        resultado = resultado.iloc[np.argsort(ordem.loc[resultado['forms_number']].to_numpy(), kind='stable')]
+
+    gravar_classificacoes(resultado.reset_index(drop=True), saida)
+    # Estado só depois da troca atômica da saída: uma interrupção antes dela mantém o par anterior
+    gravar_estado(caminho_estado, forms_number, hashes, motor.prototipos.versao, motor.limiar)
+    return resumo
+
+# ========================================
+# LINHA DE COMANDO
+# ========================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Reclassifica apenas formulários novos ou alterados")
+    parser.add_argument("--entrada", default="dados_embbeding.csv")
+    parser.add_argument("--saida", default="data/classified/level1_classifications.csv")
+    parser.add_argument("--prototipos", default=str(PROTOTIPOS_FILE))
+    parser.add_argument("--limiar", type=float, default=None,
+                        help="Padrão: limiar calibrado gravado com os protótipos")
+    parser.add_argument("--completo", action="store_true", help="Ignora o estado anterior e reclassifica tudo")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    df = pd.read_csv(args.entrada, encoding='utf-8-sig')
+    try:
+        motor = carregar_motor(args.prototipos, args.limiar, CacheEmbeddings(EmbedderHash()))
+    except ValueError as e:
+        sys.exit(str(e))
+    resumo = reclassificar(df, args.saida, motor, completo=args.completo)
+
+    print(f"Modo {resumo['modo']}: {resumo['novos']} novos, {resumo['alterados']} alterados, "
+          f"{resumo['removidos']} removidos, {resumo['inalterados']} inalterados")
+    if resumo['repetidos']:
+        print(f"{resumo['repetidos']} linhas com forms_number repetido ignoradas (vale a primeira)")
+    print(f"Concluído em {time.perf_counter() - inicio:.2f}s -> {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Retreino Rápido - Classificador linear sobre os rótulos humanos do backend configurado
+Features de n-gramas de caracteres por hashing (sem vocabulário) e warm-start a partir do modelo anterior
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.metrics import accuracy_score, classification_report, f1_score
+
+from armazenamento import criar_armazenamento
+from dataset_treino import DatasetTreino
+from embeddings import normalizar_texto
+from motor_classificacao import MODELOS_DIR
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+MODELO_LINEAR_FILE = MODELOS_DIR / "classificador_linear.joblib"
+RELATORIO_FILE = MODELOS_DIR / "relatorio_retreino.json"
+
+COLUNAS = ['forms_text', 'human_category', 'confidence_human', 'classification_timestamp', 'ai_category',
+           'classification_type']
+
+# Fator sobre o peso de rótulos gravados sem que o anotador visse o formulário
+# (decisão de um cluster inteiro tomada a partir dos representantes)
+PESO_SEM_REVISAO = {'propagacao_grupo': 0.25}
+
+# Espaço de features fixo: o modelo anterior continua válido sem reajustar vocabulário
+N_FEATURES = 2 ** 20
+NGRAMAS = (3, 5)
+EPOCAS = 5
+EPOCAS_WARM_START = 2
+FRACAO_TESTE = 0.2
+
+# Textos por tarefa na vetorização paralela
+TAMANHO_BLOCO = 4000
+
+# ========================================
+# FEATURES
+# ========================================
+
+def criar_vetorizador(n_features=N_FEATURES, ngramas=NGRAMAS):
+    return HashingVectorizer(
+        analyzer='char_wb', ngram_range=ngramas, n_features=n_features,
+        preprocessor=normalizar_texto, alternate_sign=False, norm='l2', dtype=np.float32,
+    )
+
+def extrair_features(textos, vetorizador=None, processos=-1):
+    """Vetoriza cada texto distinto uma única vez (vários anotadores rotulam o mesmo formulário), em paralelo"""
+    vetorizador = vetorizador or criar_vetorizador()
+    codigos, unicos = pd.factorize(pd.Series(textos, dtype=object).fillna(""))
+    unicos = list(unicos)
+    if len(unicos) <= TAMANHO_BLOCO:
+        X = vetorizador.transform(unicos)
+    else:
+        blocos = [unicos[i:i + TAMANHO_BLOCO] for i in range(0, len(unicos), TAMANHO_BLOCO)]
+        X = sp.vstack(joblib.Parallel(n_jobs=processos)(
+            joblib.delayed(vetorizador.transform)(bloco) for bloco in blocos
+        ), format='csr')
+    return X[codigos]
+
+def carregar_rotulos(origem=None, propagados=True):
+    """Lê apenas as colunas necessárias; o peso de cada exemplo é a certeza do anotador
+
+    origem: backend de armazenamento (padrão: o configurado em ROTULOS_BACKEND) ou um DatasetTreino.
+    Rótulos propagados sem revisão (PESO_SEM_REVISAO) têm o peso reduzido, ou são descartados
+    com propagados=False.
+    """
+    origem = origem if origem is not None else criar_armazenamento()
+    df = origem.ler(COLUNAS) if isinstance(origem, DatasetTreino) else origem.dados_treino(COLUNAS)
+    df = df[df['human_category'].fillna("").astype(str).str.len() > 0]
+    if not propagados:
+        df = df[~df['classification_type'].isin(list(PESO_SEM_REVISAO))]
+    df = df.sort_values('classification_timestamp', kind='stable', na_position='first').reset_index(drop=True)
+    df['forms_text'] = df['forms_text'].fillna("")
+    df['confidence_human'] = pd.to_numeric(df['confidence_human'], errors='coerce').fillna(0.8).clip(0.05, 1.0)
+    df['confidence_human'] *= df['classification_type'].map(PESO_SEM_REVISAO).fillna(1.0).astype(np.float64)
+    return df
+
+# ========================================
+# MODELO
+# ========================================
+
+def _coeficientes_iniciais(anterior, classes, n_features):
+    """Reaproveita os pesos do modelo anterior; categorias novas começam zeradas"""
+    if anterior is None or anterior.coef_.shape[1] != n_features:
+        return None, None
+    coef = np.zeros((len(classes), n_features))
+    intercepto = np.zeros(len(classes))
+    coef_anterior, intercepto_anterior = anterior.coef_, anterior.intercept_
+    if len(anterior.classes_) == 2:
+        coef_anterior = np.vstack([np.zeros_like(coef_anterior), coef_anterior])
+        intercepto_anterior = np.concatenate([[0.0], intercepto_anterior])
+    posicao = {c: i for i, c in enumerate(anterior.classes_)}
+    for i, classe in enumerate(classes):
+        if classe in posicao:
+            coef[i] = coef_anterior[posicao[classe]]
+            intercepto[i] = intercepto_anterior[posicao[classe]]
+    # Problema binário no sklearn usa uma única linha de coeficientes
+    if len(classes) == 2:
+        return coef[1:] - coef[:1], intercepto[1:] - intercepto[:1]
+    return coef, intercepto
+
+def treinar(X, y, pesos, anterior=None, epocas=None, semente=42):
+    """SGD com perda logística; com modelo anterior parte dos seus pesos e usa menos épocas"""
+    classes = np.unique(y)
+    coef, intercepto = _coeficientes_iniciais(anterior, classes, X.shape[1])
+    if epocas is None:
+        epocas = EPOCAS if coef is None else EPOCAS_WARM_START
+    modelo = SGDClassifier(loss='log_loss', alpha=1e-6, max_iter=epocas, tol=None,
+                           learning_rate='optimal', random_state=semente)
+    modelo.fit(X, y, coef_init=coef, intercept_init=intercepto, sample_weight=pesos)
+    return modelo
+
+def carregar_modelo(caminho=MODELO_LINEAR_FILE):
+    caminho = Path(caminho)
+    return joblib.load(caminho) if caminho.exists() else None
+
+def salvar_modelo(pacote, caminho=MODELO_LINEAR_FILE):
+    caminho = Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    temporario = caminho.with_name(f"{caminho.stem}.{os.getpid()}.tmp")
+    joblib.dump(pacote, temporario)
+    os.replace(temporario, caminho)
+
+# ========================================
+# AVALIAÇÃO
+# ========================================
+
+def avaliar(modelo, X, y, pesos=None):
+    if modelo is None or len(y) == 0:
+        return None
+    previstos = modelo.predict(X)
+    return {
+        'acuracia': float(accuracy_score(y, previstos)),
+        'acuracia_ponderada': float(accuracy_score(y, previstos, sample_weight=pesos)),
+        'f1_macro': float(f1_score(y, previstos, average='macro', zero_division=0)),
+        'por_categoria': classification_report(y, previstos, output_dict=True, zero_division=0),
+    }
+
+def retreinar(df, anterior=None, fracao_teste=FRACAO_TESTE, epocas=None, vetorizador=None, processos=-1):
+    """Treina nos rótulos mais antigos, avalia nos mais recentes e refina com todos
+
+    Retorna (modelo, relatório). O modelo final parte dos pesos do modelo avaliado,
+    então o segundo ajuste custa só as épocas de warm-start.
+    """
+    if df['human_category'].nunique() < 2:
+        raise ValueError("São necessárias ao menos duas categorias rotuladas para treinar")
+    tempos = {}
+
+    inicio = time.perf_counter()
+    X = extrair_features(df['forms_text'], vetorizador, processos)
+    y = df['human_category'].astype(str).to_numpy()
+    pesos = df['confidence_human'].to_numpy(dtype=np.float64)
+    tempos['features'] = time.perf_counter() - inicio
+
+    # Holdout temporal: simula a próxima sessão de rotulagem
+    corte = int(len(df) * (1 - fracao_teste)) if len(df) >= 10 else len(df)
+    treino, teste = slice(0, corte), slice(corte, len(df))
+    if len(np.unique(y[treino])) < 2:
+        treino, teste = slice(0, len(df)), slice(len(df), len(df))
+
+    inicio = time.perf_counter()
+    modelo = treinar(X[treino], y[treino], pesos[treino], anterior, epocas)
+    tempos['treino'] = time.perf_counter() - inicio
+
+    avaliacao = avaliar(modelo, X[teste], y[teste], pesos[teste])
+    # Referência: o modelo anterior pode já ter visto parte do holdout (otimista)
+    avaliacao_anterior = avaliar(anterior, X[teste], y[teste], pesos[teste]) if anterior is not None else None
+    ia = df['ai_category'].fillna("").astype(str).to_numpy()[teste]
+    concordancia_ia = float((ia == y[teste]).mean()) if len(ia) else None
+
+    inicio = time.perf_counter()
+    if teste.start < teste.stop:
+        modelo = treinar(X, y, pesos, modelo, EPOCAS_WARM_START)
+    tempos['ajuste_final'] = time.perf_counter() - inicio
+
+    relatorio = {
+        'rotulos': int(len(df)),
+        'treino': int(treino.stop - treino.start),
+        'teste': int(teste.stop - teste.start),
+        'categorias': modelo.classes_.tolist(),
+        'warm_start': anterior is not None,
+        'modelo': avaliacao,
+        'modelo_anterior': avaliacao_anterior,
+        'concordancia_motor_prototipos': concordancia_ia,
+        'tempos_segundos': {etapa: round(t, 3) for etapa, t in tempos.items()},
+    }
+    return modelo, relatorio
+
+# ========================================
+# LINHA DE COMANDO
+# ========================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Retreina o classificador linear com os rótulos humanos")
+    parser.add_argument("--backend", default=None, help="arquivos ou sqlite (padrão: $ROTULOS_BACKEND)")
+    parser.add_argument("--modelo", default=str(MODELO_LINEAR_FILE))
+    parser.add_argument("--relatorio", default=str(RELATORIO_FILE))
+    parser.add_argument("--do-zero", action="store_true", help="Ignora o modelo anterior")
+    parser.add_argument("--sem-propagados", action="store_true",
+                        help="Descarta os rótulos aplicados a clusters sem revisão individual")
+    parser.add_argument("--epocas", type=int, default=None)
+    parser.add_argument("--teste", type=float, default=FRACAO_TESTE, help="Fração mais recente usada na avaliação")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    armazenamento = criar_armazenamento(args.backend)
+    df = carregar_rotulos(armazenamento, propagados=not args.sem_propagados)
+    leitura = time.perf_counter() - inicio
+    if df.empty:
+        sys.exit(f"Nenhum rótulo humano no backend {type(armazenamento).__name__}: confira --backend/$ROTULOS_BACKEND")
+
+    pacote = None if args.do_zero else carregar_modelo(args.modelo)
+    if pacote is not None and pacote.get('n_features') != N_FEATURES:
+        pacote = None
+    anterior = pacote['modelo'] if pacote else None
+
+    try:
+        modelo, relatorio = retreinar(df, anterior, args.teste, args.epocas)
+    except ValueError as e:
+        print(e)
+        return
+    relatorio['tempos_segundos']['leitura'] = round(leitura, 3)
+    relatorio['tempos_segundos']['total'] = round(time.perf_counter() - inicio, 3)
+    relatorio['treinado_em'] = pd.Timestamp.now().isoformat(timespec='seconds')
+
+    salvar_modelo({'modelo': modelo, 'n_features': N_FEATURES, 'ngramas': NGRAMAS,
+                   'treinado_em': relatorio['treinado_em'], 'rotulos': relatorio['rotulos']}, args.modelo)
+    Path(args.relatorio).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.relatorio, 'w', encoding='utf-8') as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+
+    avaliacao = relatorio['modelo']
+    print(f"{relatorio['rotulos']} rótulos, {len(relatorio['categorias'])} categorias "
+          f"({'warm-start' if relatorio['warm_start'] else 'do zero'}) em {relatorio['tempos_segundos']['total']:.2f}s")
+    if avaliacao:
+        print(f"Holdout ({relatorio['teste']} mais recentes): acurácia {avaliacao['acuracia']:.1%}, "
+              f"F1 macro {avaliacao['f1_macro']:.3f}")
+    if relatorio['modelo_anterior']:
+        print(f"Modelo anterior no mesmo holdout: acurácia {relatorio['modelo_anterior']['acuracia']:.1%}")
+    if relatorio['concordancia_motor_prototipos'] is not None:
+        print(f"Concordância do motor de protótipos: {relatorio['concordancia_motor_prototipos']:.1%}")
+    print(f"Modelo: {args.modelo} | Relatório: {args.relatorio}")
+
+
+if __name__ == "__main__":
+    main()
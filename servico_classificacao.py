@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Serviço de Classificação - API HTTP sobre o MotorClassificacao
+Micro-batching: requisições concorrentes que chegam em poucos milissegundos viram uma única pontuação vetorizada
+Textos repetidos (a menos de maiúsculas, acentos e espaços) são respondidos pelo cache de resultados
+"""
+
+import argparse
+import asyncio
+import sys
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+from fastapi import FastAPI
+from pydantic import BaseModel, Field
+
+from cache_resultados import CAPACIDADE_PADRAO, TTL_PADRAO_SEGUNDOS, CacheResultados
+from motor_classificacao import PROTOTIPOS_FILE, carregar_motor, montar_resultado
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+# Tempo máximo que o primeiro pedido de um lote espera por companhia
+ESPERA_MS = 5.0
+# Textos por chamada ao motor (um pedido de lote maior é processado inteiro)
+TAMANHO_MAXIMO = 256
+
+# ========================================
+# MODELOS DA API
+# ========================================
+
+class Formulario(BaseModel):
+    forms_number: Optional[int] = None
+    forms_text: str = Field(..., description="Texto do formulário a classificar")
+
+class Lote(BaseModel):
+    formularios: List[Formulario]
+
+class Classificacao(BaseModel):
+    """Mesmos campos de level1_classifications (level1_all_scores como objeto)"""
+    forms_number: Optional[int] = None
+    level1_category: str
+    level1_confidence: float
+    level1_threshold_met: bool
+    level1_classification_type: str
+    level1_best_match: str
+    level1_best_match_score: float
+    level1_all_scores: Dict[str, float]
+
+# ========================================
+# MICRO-BATCHING
+# ========================================
+
+class AgendadorLotes:
+    """Fila assíncrona que agrupa pedidos e pontua cada grupo em uma thread (sem bloquear o event loop)
+
+    Os grupos são processados um de cada vez, então o embedder nunca é chamado concorrentemente.
+    """
+
+    def __init__(self, motor, espera_ms=ESPERA_MS, tamanho_maximo=TAMANHO_MAXIMO, cache=None):
+        self.motor = motor
+        self.cache = cache
+        self.espera = espera_ms / 1000
+        self.tamanho_maximo = tamanho_maximo
+        self.lotes = 0
+        self.pedidos = 0
+        self.textos = 0
+        self._fila = None
+        self._tarefa = None
+
+    async def iniciar(self):
+        self._fila = asyncio.Queue()
+        self._tarefa = asyncio.create_task(self._executar())
+
+    async def parar(self):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+
+    async def pontuar(self, textos):
+        """(motor, scores textos x categorias) calculados junto com os pedidos concorrentes
+
+        O motor que pontuou o lote acompanha os scores: um /recarregar no meio do caminho
+        não mistura as categorias de protótipos diferentes.
+        """
+        textos = list(textos)
+        if self.cache is None:
+            return await self._enfileirar(textos)
+        
+        motor = self.motor
+        versao = motor.prototipos.versao
+        chaves, resultados = self.cache.obter_lote(textos, versao)
+        # Só textos ausentes do cache vão para a fila, uma vez cada
+        faltas = {}
+        for i, (chave, resultado) in enumerate(zip(chaves, resultados)):
+            if resultado is None:
+                faltas.setdefault(chave, []).append(i)
+        if faltas:
+            motor_lote, scores = await self._enfileirar([textos[posicoes[0]] for posicoes in faltas.values()])
+            if motor_lote.prototipos.versao != versao:
+                # Protótipos recarregados durante a espera: tudo é recalculado com a versão nova
+                return await self._enfileirar(textos)
+            self.cache.gravar_lote(list(faltas), scores, versao)
+            for linha, posicoes in zip(scores, faltas.values()):
+                for i in posicoes:
+                    resultados[i] = linha
+        return motor, np.stack(resultados)
+
+    async def _enfileirar(self, textos):
+        futuro = asyncio.get_running_loop().create_future()
+        await self._fila.put((textos, futuro))
+        return await futuro
+
+    async def _coletar(self):
+        """Primeiro pedido + os que chegarem até o prazo ou até encher o lote"""
+        pedidos = [await self._fila.get()]
+        total = len(pedidos[0][0])
+        loop = asyncio.get_running_loop()
+        prazo = loop.time() + self.espera
+        while total < self.tamanho_maximo:
+            try:
+                pedido = self._fila.get_nowait()
+            except asyncio.QueueEmpty:
+                restante = prazo - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    pedido = await asyncio.wait_for(self._fila.get(), restante)
+                except asyncio.TimeoutError:
+                    break
+            pedidos.append(pedido)
+            total += len(pedido[0])
+        return pedidos
+
+    async def _executar(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pedidos = await self._coletar()
+            textos = [texto for textos_pedido, _ in pedidos for texto in textos_pedido]
+            motor = self.motor
+            try:
+                scores = await loop.run_in_executor(None, self._pontuar, motor, textos)
+            except Exception as e:
+                for _, futuro in pedidos:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+                continue
+
+            self.lotes += 1
+            self.pedidos += len(pedidos)
+            self.textos += len(textos)
+            inicio = 0
+            for textos_pedido, futuro in pedidos:
+                if not futuro.done():
+                    futuro.set_result((motor, scores[inicio:inicio + len(textos_pedido)]))
+                inicio += len(textos_pedido)
+
+    @staticmethod
+    def _pontuar(motor, textos):
+        return motor.pontuar(motor.embedder.embed(textos))
+
+    def estatisticas(self):
+        return {
+            'lotes': self.lotes,
+            'pedidos': self.pedidos,
+            'textos': self.textos,
+            'pedidos_por_lote': round(self.pedidos / self.lotes, 2) if self.lotes else 0.0,
+            'cache': self.cache.estatisticas() if self.cache is not None else None,
+        }
+
+def montar_respostas(motor, formularios, scores):
+    """Linhas no esquema de level1_classifications para os formulários da requisição"""
+    forms_number = [f.forms_number if f.forms_number is not None else -1 for f in formularios]
+    resultado = montar_resultado(forms_number, scores, motor.prototipos.categorias, motor.limiar)
+    categorias = motor.prototipos.categorias
+    respostas = []
+    for formulario, linha, valores in zip(formularios, resultado.to_dict('records'), np.asarray(scores).tolist()):
+        linha['forms_number'] = formulario.forms_number
+        linha['level1_all_scores'] = dict(zip(categorias, valores))
+        respostas.append(linha)
+    return respostas
+
+# ========================================
+# APLICAÇÃO
+# ========================================
+
+def criar_app(motor=None, espera_ms=ESPERA_MS, tamanho_maximo=TAMANHO_MAXIMO, carregar=None, cache=None):
+    """App FastAPI; carregar() recria o motor (usado no início e em /recarregar); cache: CacheResultados"""
+    carregar = carregar or carregar_motor
+    estado = {}
+
+    @asynccontextmanager
+    async def ciclo_de_vida(app):
+        agendador = AgendadorLotes(motor or carregar(), espera_ms, tamanho_maximo, cache)
+        await agendador.iniciar()
+        estado['agendador'] = agendador
+        yield
+        await agendador.parar()
+
+    app = FastAPI(title="Classificação de Formulários", lifespan=ciclo_de_vida)
+
+    @app.get("/saude")
+    async def saude():
+        agendador = estado['agendador']
+        return {
+            'status': 'ok',
+            'prototipos': agendador.motor.prototipos.versao,
+            'categorias': agendador.motor.prototipos.categorias,
+            'limiar': agendador.motor.limiar,
+            **agendador.estatisticas(),
+        }
+
+    @app.post("/classificar", response_model=Classificacao)
+    async def classificar(formulario: Formulario):
+        agendador = estado['agendador']
+        motor, scores = await agendador.pontuar([formulario.forms_text])
+        return montar_respostas(motor, [formulario], scores)[0]
+
+    @app.post("/classificar/lote", response_model=List[Classificacao])
+    async def classificar_lote(lote: Lote):
+        agendador = estado['agendador']
+        if not lote.formularios:
+            return []
+        motor, scores = await agendador.pontuar([f.forms_text for f in lote.formularios])
+        return montar_respostas(motor, lote.formularios, scores)
+
+    @app.post("/recarregar")
+    async def recarregar():
+        """Recarrega os protótipos vigentes (ex.: após incorporar novas classificações humanas)"""
+        agendador = estado['agendador']
+        agendador.motor = await asyncio.get_running_loop().run_in_executor(None, carregar)
+        return {'prototipos': agendador.motor.prototipos.versao}
+
+    return app
+
+# ========================================
+# LINHA DE COMANDO
+# ========================================
+
+def main():
+    import uvicorn
+
+    from cache_embeddings import CacheEmbeddings
+    from embeddings import EmbedderHash
+
+    parser = argparse.ArgumentParser(description="Serviço HTTP de classificação com micro-batching")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8000)
+    parser.add_argument("--prototipos", default=str(PROTOTIPOS_FILE))
+    parser.add_argument("--limiar", type=float, default=None,
+                        help="Padrão: limiar calibrado gravado com os protótipos")
+    parser.add_argument("--espera-ms", type=float, default=ESPERA_MS)
+    parser.add_argument("--tamanho-maximo", type=int, default=TAMANHO_MAXIMO)
+    parser.add_argument("--sem-cache", action="store_true", help="Não usar o cache de embeddings em disco")
+    parser.add_argument("--cache-itens", type=int, default=CAPACIDADE_PADRAO,
+                        help="Capacidade do cache de resultados (0 desativa)")
+    parser.add_argument("--cache-ttl", type=float, default=TTL_PADRAO_SEGUNDOS, help="Validade de cada resultado (s)")
+    args = parser.parse_args()
+
+    def carregar():
+        embedder = EmbedderHash() if args.sem_cache else CacheEmbeddings(EmbedderHash())
+        return carregar_motor(args.prototipos, args.limiar, embedder)
+
+    # Protótipos sem limiar calibrado: falha aqui, antes de abrir a porta
+    try:
+        motor = carregar()
+    except ValueError as e:
+        sys.exit(str(e))
+
+    cache = CacheResultados(args.cache_itens, args.cache_ttl) if args.cache_itens > 0 else None
+    app = criar_app(motor, espera_ms=args.espera_ms, tamanho_maximo=args.tamanho_maximo, carregar=carregar,
+                    cache=cache)
+    print(f"Serviço em http://{args.host}:{args.porta} (documentação em /docs)")
+    uvicorn.run(app, host=args.host, port=args.porta, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
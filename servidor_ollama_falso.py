@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Servidor Ollama Falso - /api/embed e /api/embeddings locais para testes e benchmarks sem GPU
+Vetores determinísticos por texto, latência por requisição e por texto, paralelismo limitado e falhas 503 sob demanda
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+DIMENSAO = 768
+# Custo simulado do modelo: fixo por requisição + proporcional ao lote
+LATENCIA_MS = 5.0
+LATENCIA_TEXTO_MS = 0.5
+# Requisições processadas ao mesmo tempo (como OLLAMA_NUM_PARALLEL); as demais esperam
+PARALELO = 4
+
+# ========================================
+# VETORES
+# ========================================
+
+def vetor_falso(texto, dimensao=DIMENSAO):
+    """Vetor unitário determinístico (mesmo texto -> mesmo vetor, em qualquer processo)"""
+    semente = int.from_bytes(hashlib.blake2b(texto.encode('utf-8'), digest_size=8).digest(), 'little')
+    vetor = np.random.default_rng(semente).standard_normal(dimensao).astype(np.float32)
+    return vetor / np.linalg.norm(vetor)
+
+# ========================================
+# SERVIDOR
+# ========================================
+
+class _Tratador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive: o cliente pode reaproveitar a conexão
+
+    def setup(self):
+        super().setup()
+        self.server.falso._contar('conexoes')
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, status, corpo):
+        dados = json.dumps(corpo).encode('utf-8') if not isinstance(corpo, bytes) else corpo
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json" if not isinstance(corpo, bytes) else "text/plain")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_GET(self):
+        falso = self.server.falso
+        if self.path == "/":
+            self._responder(200, b"Ollama is running")
+        elif self.path == "/api/tags":
+            self._responder(200, {'models': [{'name': falso.modelo, 'model': falso.modelo}]})
+        else:
+            self._responder(404, {'error': "not found"})
+
+    def do_POST(self):
+        falso = self.server.falso
+        tamanho = int(self.headers.get("Content-Length", 0))
+        try:
+            pedido = json.loads(self.rfile.read(tamanho) or b"{}")
+        except json.JSONDecodeError:
+            self._responder(400, {'error': "invalid JSON"})
+            return
+
+        if self.path == "/api/embed" and not falso.somente_legado:
+            entrada = pedido.get('input')
+            textos = [entrada] if isinstance(entrada, str) else entrada
+        elif self.path == "/api/embeddings":
+            textos = [pedido.get('prompt', "")]
+        else:
+            self._responder(404, {'error': "not found"})
+            return
+        if not isinstance(textos, list):
+            self._responder(400, {'error': "input is required"})
+            return
+
+        status, corpo = falso.processar(textos)
+        if status == 200 and self.path == "/api/embeddings":
+            corpo = {'embedding': corpo['embeddings'][0]}
+        self._responder(status, corpo)
+
+class ServidorOllamaFalso:
+    """Servidor HTTP em uma thread; porta=0 escolhe uma porta livre (ver .url)"""
+
+    def __init__(self, host="127.0.0.1", porta=0, modelo="nomic-embed-text", dimensao=DIMENSAO,
+                 latencia_ms=LATENCIA_MS, latencia_texto_ms=LATENCIA_TEXTO_MS, paralelo=PARALELO,
+                 taxa_falhas=0.0, somente_legado=False, semente=0):
+        self.modelo = modelo
+        self.dimensao = dimensao
+        self.latencia = latencia_ms / 1000
+        self.latencia_texto = latencia_texto_ms / 1000
+        self.taxa_falhas = taxa_falhas
+        # Ollama anterior à 0.3: só /api/embeddings (um texto por requisição)
+        self.somente_legado = somente_legado
+        self._vagas = threading.Semaphore(paralelo)
+        self._lock = threading.Lock()
+        self._aleatorio = random.Random(semente)
+        self.contagens = {'conexoes': 0, 'requisicoes': 0, 'textos': 0, 'falhas': 0}
+        self._servidor = ThreadingHTTPServer((host, porta), _Tratador)
+        self._servidor.daemon_threads = True
+        self._servidor.falso = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, porta = self._servidor.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def _contar(self, chave, quantidade=1):
+        with self._lock:
+            self.contagens[chave] += quantidade
+
+    def processar(self, textos):
+        """(status, corpo) de uma chamada de embedding, respeitando o paralelismo e as falhas simuladas"""
+        self._contar('requisicoes')
+        with self._lock:
+            falhar = self._aleatorio.random() < self.taxa_falhas
+        if falhar:
+            self._contar('falhas')
+            return 503, {'error': "server busy, please try again"}
+        with self._vagas:
+            time.sleep(self.latencia + self.latencia_texto * len(textos))
+        self._contar('textos', len(textos))
+        vetores = [vetor_falso(str(texto), self.dimensao).tolist() for texto in textos]
+        return 200, {'model': self.modelo, 'embeddings': vetores}
+
+    def servir(self):
+        """Atende na thread atual até Ctrl+C"""
+        try:
+            self._servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._servidor.server_close()
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._servidor.serve_forever, daemon=True, name="ollama-falso")
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *excecao):
+        self.parar()
+
+# ========================================
+# LINHA DE COMANDO
+# ========================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita a API de embeddings do Ollama")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=11434)
+    parser.add_argument("--modelo", default="nomic-embed-text")
+    parser.add_argument("--dimensao", type=int, default=DIMENSAO)
+    parser.add_argument("--latencia-ms", type=float, default=LATENCIA_MS)
+    parser.add_argument("--latencia-texto-ms", type=float, default=LATENCIA_TEXTO_MS)
+    parser.add_argument("--paralelo", type=int, default=PARALELO)
+    parser.add_argument("--taxa-falhas", type=float, default=0.0, help="Fração de requisições respondidas com 503")
+    parser.add_argument("--somente-legado", action="store_true", help="Simula Ollama < 0.3 (sem /api/embed)")
+    args = parser.parse_args()
+
+    servidor = ServidorOllamaFalso(args.host, args.porta, args.modelo, args.dimensao, args.latencia_ms,
+                                   args.latencia_texto_ms, args.paralelo, args.taxa_falhas, args.somente_legado)
+    print(f"Ollama falso em {servidor.url} (modelo {args.modelo}, {args.dimensao} dimensões)")
+    servidor.servir()
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,21 @@ import pandas as pd
 import os
 from datetime import datetime
 from pathlib import Path
-import json
+import time
+
+from agrupamento_novas import AGRUPAMENTO_FILE, AgrupadorIncremental, sincronizar_agrupador
+from armazenamento import criar_armazenamento
+from cache_embeddings import CacheEmbeddings
+from conjunto_dados import obter_conjunto, recarregar_conjunto
+from duplicatas import agrupar_duplicatas
+from embeddings import EmbedderHash
+from fila_aprendizado import construir_fila
+from indice_classificacoes import IndiceClassificacoes
+from indice_vizinhos import construir_indice_vizinhos
+from motor_classificacao import MotorClassificacao, calibrar_limiar, carregar_prototipos_base
+from progresso import IndiceProgresso
+from prototipos_online import AtualizadorPrototipos
+from votacao_knn import K_VIZINHOS, VotadorKNN
 
 # ========================================
 # CONFIGURAÇÃO E ESTILO
@@ -356,6 +370,9 @@ setInterval(aplicarEstilosBotoes, 500);
 DADOS_FILE = "dados_embbeding.csv"
 CLASSIFICACOES_IA_FILE = "data/classified/level1_classifications.csv"
 
+# Formulários semelhantes já rotulados exibidos ao anotador
+VIZINHOS_K = 5
+
 # Categorias sem emojis
 CATEGORIAS = {
     "Administração e RH": [
@@ -423,145 +440,265 @@ CATEGORIAS = {
 # FUNÇÕES AUXILIARES
 # ========================================
 
-@st.cache_data
+@st.cache_resource
+def obter_armazenamento():
+    """Backend de armazenamento compartilhado pelas sessões do processo (ROTULOS_BACKEND)"""
+    armazenamento = criar_armazenamento()
+    armazenamento.iniciar_manutencao()
+    return armazenamento
+
+@st.cache_resource
+def obter_indice_vizinhos():
+    """Índice de vizinhos sobre os formulários já rotulados (atualizado a cada salvamento)"""
+    embedder = CacheEmbeddings(EmbedderHash())
+    return construir_indice_vizinhos(obter_armazenamento().classificacoes(), embedder)
+
+@st.cache_resource
+def obter_atualizador_prototipos():
+    """Protótipos atualizados online com as classificações humanas (O(dim) por rótulo)"""
+    embedder = CacheEmbeddings(EmbedderHash())
+    atualizador = AtualizadorPrototipos(carregar_prototipos_base(embedder=embedder), embedder)
+    if atualizador.sincronizar(obter_armazenamento()):
+        atualizador.salvar()
+    return atualizador
+
+@st.cache_resource(max_entries=2)
+def obter_limiar_knn(versao):
+    """Limiar do motor para a sugestão combinada (None se não houver como calibrar)
+
+    Usa o limiar salvo em prototipos.npz; sem ele (protótipos derivados das descrições), calibra
+    uma vez sobre o conjunto carregado para a taxa de automáticas do pipeline original.
+    """
+    base = obter_atualizador_prototipos().base
+    if base.limiar is not None:
+        return base.limiar
+    
+    conjunto = obter_conjunto(DADOS_FILE, CLASSIFICACOES_IA_FILE)
+    classificacoes = conjunto.classificacoes
+    if classificacoes.empty or 'level1_classification_type' not in classificacoes.columns:
+        return None
+    taxa_automatica = (classificacoes['level1_classification_type'] == 'automatic').mean()
+    vetores = CacheEmbeddings(EmbedderHash()).embed(conjunto.formularios['forms_text'].fillna("").tolist())
+    return calibrar_limiar(vetores @ base.matriz.T, taxa_automatica)
+
+@st.cache_resource(max_entries=2)
+def obter_fila_aprendizado(versao):
+    """Fila de aprendizado ativo da versão dos dados (incerteza reavaliada a cada novo rótulo)"""
+    conjunto = obter_conjunto(DADOS_FILE, CLASSIFICACOES_IA_FILE)
+    formularios = conjunto.formularios
+    vetores = CacheEmbeddings(EmbedderHash()).embed(formularios['forms_text'].fillna("").tolist())
+    fila = construir_fila(formularios['forms_number'].to_numpy(), conjunto.classificacoes, vetores)
+    # Incerteza do modelo atual (protótipos online), não dos scores fixos de level1_all_scores
+    fila.reavaliar(obter_atualizador_prototipos().prototipos())
+    
+    # Formulários parecidos com os já rotulados (por qualquer usuário) perdem prioridade
+    rotulos = obter_armazenamento().classificacoes()
+    if not rotulos.empty:
+        fila.registrar_rotulos(rotulos['forms_number'].to_numpy())
+    return fila
+
+@st.cache_resource(max_entries=2)
+def obter_grupos_duplicatas(versao):
+    """Grupos de quase-duplicatas da versão dos dados (MinHash/LSH, calculados uma vez)"""
+    formularios = obter_conjunto(DADOS_FILE, CLASSIFICACOES_IA_FILE).formularios
+    return agrupar_duplicatas(formularios['forms_number'].to_numpy(), formularios['forms_text'].fillna("").tolist())
+
+@st.cache_resource(max_entries=1)
+def obter_agrupamento_novas(versao):
+    """Clusters dos formulários Nova_Classe_*: estado persistido + absorção dos novos desta versão dos dados"""
+    conjunto = obter_conjunto(DADOS_FILE, CLASSIFICACOES_IA_FILE)
+    embedder = CacheEmbeddings(EmbedderHash())
+    if Path(AGRUPAMENTO_FILE).exists():
+        agrupador = AgrupadorIncremental.carregar(AGRUPAMENTO_FILE)
+    else:
+        agrupador = AgrupadorIncremental(embedder.dimensao, embedder_nome=embedder.nome)
+    if sincronizar_agrupador(agrupador, conjunto.formularios, conjunto.classificacoes, embedder):
+        agrupador.salvar(AGRUPAMENTO_FILE)
+    return agrupador
+
 def carregar_dados():
-    """Carrega dados dos formulários"""
+    """Carrega dados dos formulários (handle compartilhado pelo processo, sem cópia por sessão)"""
     try:
-        df = pd.read_csv(DADOS_FILE)
-        return df
+        return obter_conjunto(DADOS_FILE, CLASSIFICACOES_IA_FILE).formularios
     except Exception as e:
         st.error(f"Erro ao carregar dados: {e}")
         return pd.DataFrame()
 
-@st.cache_data
+def carregar_indice_classificacoes():
+    """Índice por forms_number das classificações da IA (construído uma vez por carga)"""
+    try:
+        conjunto = obter_conjunto(DADOS_FILE, CLASSIFICACOES_IA_FILE)
+    except Exception as e:
+        st.warning(f"Arquivo de classificações da IA não encontrado: {e}")
+        return IndiceClassificacoes(pd.DataFrame())
+    
+    if conjunto.erro_classificacoes:
+        st.warning(f"Arquivo de classificações da IA não encontrado: {conjunto.erro_classificacoes}")
+    return conjunto.indice_classificacoes
+
 def carregar_classificacoes_ia():
-    """Carrega classificações da IA"""
+    """Carrega classificações da IA (handle compartilhado pelo processo)"""
     try:
-        df_classificacoes = pd.read_csv(CLASSIFICACOES_IA_FILE)
-        return df_classificacoes
+        conjunto = obter_conjunto(DADOS_FILE, CLASSIFICACOES_IA_FILE)
     except Exception as e:
         st.warning(f"Arquivo de classificações da IA não encontrado: {e}")
         return pd.DataFrame()
+    
+    if conjunto.erro_classificacoes:
+        st.warning(f"Arquivo de classificações da IA não encontrado: {conjunto.erro_classificacoes}")
+    return conjunto.classificacoes
+
+def obter_progresso(usuario):
+    """Índice de progresso do usuário, carregado do backend uma vez por sessão"""
+    if st.session_state.get('progresso_usuario') != usuario:
+        st.session_state.progresso = IndiceProgresso(obter_armazenamento().formularios_analisados(usuario))
+        st.session_state.progresso_usuario = usuario
+    return st.session_state.progresso
 
 def filtrar_formularios_nao_analisados(df, usuario):
     """Filtra formulários não analisados pelo usuário"""
-    if 'formularios_analisados' not in st.session_state:
-        return df.copy()
-    
-    analisados = st.session_state.formularios_analisados
-    forms_analisados_usuario = []
+    progresso = obter_progresso(usuario)
+    if len(progresso) > 0:
+        # Máscara vetorizada sobre o array ordenado de formulários analisados
+        df = df[progresso.mascara_pendentes(df['forms_number'].to_numpy())]
     
-    for forms_number, usuarios in analisados.items():
-        if usuario in usuarios:
-            forms_analisados_usuario.append(int(forms_number))
-    
-    if forms_analisados_usuario:
-        return df[~df['forms_number'].isin(forms_analisados_usuario)]
-    return df.copy()
+    # Mais incertos primeiro (margem, entropia e distância ao protótipo) em vez da ordem do CSV
+    try:
+        fila = obter_fila_aprendizado(obter_conjunto(DADOS_FILE, CLASSIFICACOES_IA_FILE).versao)
+        return fila.ordenar(df)
+    except Exception as e:
+        st.warning(f"Fila de prioridade indisponível, usando a ordem do arquivo: {e}")
+        return df
+
+def fila_da_sessao(df_disponivel, usuario):
+    """Ordem de prioridade fixada na primeira carga da sessão; depois, só perde os formulários salvos
+
+    A fila compartilhada é reordenada a cada salvamento de qualquer sessão; seguir a ordem dela
+    faria a posição atual apontar para outro formulário entre a exibição e o clique em Salvar.
+    """
+    chave = (usuario, obter_conjunto(DADOS_FILE, CLASSIFICACOES_IA_FILE).versao)
+    if st.session_state.get('fila_chave') != chave:
+        st.session_state.fila_ordem = df_disponivel['forms_number'].tolist()
+        st.session_state.fila_chave = chave
+    
+    pendentes = set(df_disponivel['forms_number'].tolist())
+    st.session_state.fila_ordem = [f for f in st.session_state.fila_ordem if f in pendentes]
+    posicao = {f: i for i, f in enumerate(st.session_state.fila_ordem)}
+    ordem = df_disponivel['forms_number'].map(posicao).fillna(len(posicao)).argsort(kind='stable')
+    return df_disponivel.iloc[ordem.to_numpy()]
+
+def fixar_formulario(numeros, posicao):
+    """Fixa o formulário exibido pelo forms_number; a posição só o localiza na fila da sessão"""
+    posicao = max(0, min(posicao, len(numeros) - 1))
+    st.session_state.indice_atual = posicao
+    st.session_state.forms_atual = numeros[posicao]
 
 def salvar_contribuicao(dados_contribuicao):
-    """Salva contribuição no session state e em arquivo CSV"""
+    """Salva contribuição no session state e em arquivo CSV; True se o rótulo foi gravado"""
+    return salvar_contribuicoes([dados_contribuicao])
+
+def salvar_contribuicoes(contribuicoes):
+    """Salva um lote de contribuições (ex.: grupo de quase-duplicatas) com uma escrita por destino
+    
+    Retorna True se os rótulos foram gravados; só então o progresso do usuário deve ser persistido.
+    """
+    # Salvar em arquivo CSV estruturado para retreinamento
+    if not salvar_contribuicoes_csv(contribuicoes):
+        return False
+    
     # Salvar no session state (para exibição imediata)
     if 'contribuicoes' not in st.session_state:
         st.session_state.contribuicoes = []
-    st.session_state.contribuicoes.append(dados_contribuicao)
-    
-    # Salvar em arquivo CSV estruturado para retreinamento
-    salvar_contribuicao_csv(dados_contribuicao)
+    st.session_state.contribuicoes.extend(contribuicoes)
+    return True
 
-def salvar_contribuicao_csv(dados_contribuicao):
-    """Salva contribuição em arquivo CSV estruturado para retreinamento"""
-    try:
-        # Diretório de destino
-        output_dir = Path("data/human_labels")
-        output_dir.mkdir(parents=True, exist_ok=True)
+def montar_dados_ml(dados_contribuicao):
+    """Estrutura a contribuição no esquema de retreinamento"""
+    return {
+        # Identificação do formulário
+        'forms_number': dados_contribuicao['forms_number'],
+        'forms_text': dados_contribuicao['descricao_atividade'],
+        'forms_title': dados_contribuicao['forms_name'],
+        
+        # Classificação humana (ground truth)
+        'human_category': dados_contribuicao['categoria_usuario'],
+        'human_subcategory': dados_contribuicao['subcategoria_usuario'],
+        'confidence_human': dados_contribuicao['nivel_certeza'],
+        
+        # Metadados do classificador
+        'classifier_name': dados_contribuicao['usuario'],
+        'classification_timestamp': dados_contribuicao['timestamp'],
+        'comments': dados_contribuicao.get('comentarios', ''),
+        
+        # Dados da IA (para comparação)
+        'ai_category': dados_contribuicao.get('categoria_ia', ''),
+        'ai_confidence': dados_contribuicao.get('confianca_ia', 0.0),
+        'ai_threshold_met': dados_contribuicao.get('confianca_ia', 0) > 0.47 if dados_contribuicao.get('confianca_ia') else False,
         
-        # Arquivo principal de classificações humanas
-        csv_file = output_dir / "human_classifications.csv"
+        # Análise de concordância
+        'approved_ai': dados_contribuicao.get('aprovou_ia', False),
+        'classification_type': dados_contribuicao.get('tipo_classificacao', 'manual'),
+        'disagreement_flag': dados_contribuicao.get('categoria_ia') != dados_contribuicao['categoria_usuario'] if dados_contribuicao.get('categoria_ia') else False,
         
+        # Qualidade e confiabilidade
+        'high_confidence': dados_contribuicao['nivel_certeza'] >= 0.8,
+        'needs_review': dados_contribuicao['nivel_certeza'] < 0.6,
+        'data_quality': 'high' if dados_contribuicao['nivel_certeza'] >= 0.8 else ('medium' if dados_contribuicao['nivel_certeza'] >= 0.6 else 'low')
+    }
+
+def salvar_contribuicoes_csv(contribuicoes):
+    """Salva contribuições em arquivo CSV estruturado para retreinamento; False se o rótulo não foi gravado"""
+    try:
         # Estruturar dados para ML/retreinamento
-        dados_ml = {
-            # Identificação do formulário
-            'forms_number': dados_contribuicao['forms_number'],
-            'forms_text': dados_contribuicao['descricao_atividade'],
-            'forms_title': dados_contribuicao['forms_name'],
-            
-            # Classificação humana (ground truth)
-            'human_category': dados_contribuicao['categoria_usuario'],
-            'human_subcategory': dados_contribuicao['subcategoria_usuario'],
-            'confidence_human': dados_contribuicao['nivel_certeza'],
-            
-            # Metadados do classificador
-            'classifier_name': dados_contribuicao['usuario'],
-            'classification_timestamp': dados_contribuicao['timestamp'],
-            'comments': dados_contribuicao.get('comentarios', ''),
-            
-            # Dados da IA (para comparação)
-            'ai_category': dados_contribuicao.get('categoria_ia', ''),
-            'ai_confidence': dados_contribuicao.get('confianca_ia', 0.0),
-            'ai_threshold_met': dados_contribuicao.get('confianca_ia', 0) > 0.47 if dados_contribuicao.get('confianca_ia') else False,
-            
-            # Análise de concordância
-            'approved_ai': dados_contribuicao.get('aprovou_ia', False),
-            'classification_type': dados_contribuicao.get('tipo_classificacao', 'manual'),
-            'disagreement_flag': dados_contribuicao.get('categoria_ia') != dados_contribuicao['categoria_usuario'] if dados_contribuicao.get('categoria_ia') else False,
-            
-            # Qualidade e confiabilidade
-            'high_confidence': dados_contribuicao['nivel_certeza'] >= 0.8,
-            'needs_review': dados_contribuicao['nivel_certeza'] < 0.6,
-            'data_quality': 'high' if dados_contribuicao['nivel_certeza'] >= 0.8 else ('medium' if dados_contribuicao['nivel_certeza'] >= 0.6 else 'low')
-        }
+        lote_ml = [montar_dados_ml(c) for c in contribuicoes]
         
-        # Converter para DataFrame
-        df_novo = pd.DataFrame([dados_ml])
+        # Upsert por (forms_number, classifier_name) no backend configurado
+        obter_armazenamento().salvar_classificacoes(lote_ml)
+    except Exception as e:
+        st.error(f"Erro ao salvar classificação: {e}")
+        return False
+    
+    # Daqui em diante o rótulo já está gravado: falhas dos índices derivados só geram avisos
+    try:
         
-        # Salvar (append se arquivo já existe)
-        if csv_file.exists():
-            # Ler dados existentes
-            df_existente = pd.read_csv(csv_file)
-            
-            # Verificar se já existe classificação para este formulário pelo mesmo usuário
-            filtro = (df_existente['forms_number'] == dados_ml['forms_number']) & \
-                    (df_existente['classifier_name'] == dados_ml['classifier_name'])
-            
-            if filtro.any():
-                # Atualizar registro existente
-                df_existente.loc[filtro, df_novo.columns] = df_novo.iloc[0]
-                df_final = df_existente
-            else:
-                # Adicionar novo registro
-                df_final = pd.concat([df_existente, df_novo], ignore_index=True)
-        else:
-            df_final = df_novo
+        # Rótulo disponível imediatamente no painel de vizinhos de todas as sessões
+        try:
+            obter_indice_vizinhos().adicionar_lote(
+                [d['forms_number'] for d in lote_ml], [d['forms_text'] for d in lote_ml],
+                [d['human_category'] for d in lote_ml], [d['classifier_name'] for d in lote_ml]
+            )
+        except Exception as e:
+            st.warning(f"Falha ao atualizar índice de vizinhos: {e}")
         
-        # Salvar CSV com cabeçalho
-        df_final.to_csv(csv_file, index=False, encoding='utf-8')
+        # Correções humanas entram nos protótipos do motor em segundos, sem retreino
+        try:
+            atualizador = obter_atualizador_prototipos()
+            if atualizador.sincronizar(obter_armazenamento()):
+                atualizador.salvar()
+        except Exception as e:
+            st.warning(f"Falha ao atualizar protótipos: {e}")
         
-        # Salvar também em formato Parquet para ML (mais eficiente)
-        parquet_file = output_dir / "training_ready.parquet"
-        df_final.to_parquet(parquet_file, index=False)
+        # Repriorizar a fila: incerteza dos protótipos atualizados; formulários parecidos
+        # com os rotulados ficam menos urgentes
+        try:
+            fila = obter_fila_aprendizado(obter_conjunto(DADOS_FILE, CLASSIFICACOES_IA_FILE).versao)
+            fila.registrar_rotulos([d['forms_number'] for d in lote_ml])
+            fila.reavaliar(obter_atualizador_prototipos().prototipos())
+        except Exception as e:
+            st.warning(f"Falha ao atualizar fila de prioridade: {e}")
         
         # Log de auditoria
-        salvar_log_auditoria(dados_contribuicao, output_dir)
+        salvar_log_auditoria(contribuicoes)
         
     except Exception as e:
-        st.error(f"Erro ao salvar classificação: {e}")
-        # Não interromper o fluxo por erro de salvamento
+        st.warning(f"Classificação salva, mas houve falha ao atualizar os índices: {e}")
+    return True
 
-def salvar_log_auditoria(dados_contribuicao, output_dir):
+def salvar_log_auditoria(contribuicoes):
     """Salva log de auditoria das classificações"""
     try:
-        log_file = output_dir / "classification_sessions.json"
-        
-        # Carregar logs existentes
-        if log_file.exists():
-            with open(log_file, 'r', encoding='utf-8') as f:
-                logs = json.load(f)
-        else:
-            logs = {"sessions": [], "statistics": {}}
-        
-        # Adicionar entrada de log
-        log_entry = {
+        # Adicionar entradas de log
+        entradas = [{
             "timestamp": dados_contribuicao['timestamp'],
             "user": dados_contribuicao['usuario'],
             "forms_number": dados_contribuicao['forms_number'],
@@ -571,65 +708,32 @@ def salvar_log_auditoria(dados_contribuicao, output_dir):
             "human_category": dados_contribuicao['categoria_usuario'],
             "confidence": dados_contribuicao['nivel_certeza'],
             "approved_ai": dados_contribuicao.get('aprovou_ia', False)
-        }
-        
-        logs["sessions"].append(log_entry)
+        } for dados_contribuicao in contribuicoes]
         
-        # Atualizar estatísticas
-        user = dados_contribuicao['usuario']
-        if user not in logs["statistics"]:
-            logs["statistics"][user] = {
-                "total_classifications": 0,
-                "ai_approvals": 0,
-                "manual_classifications": 0,
-                "avg_confidence": 0.0,
-                "last_activity": None
-            }
-        
-        stats = logs["statistics"][user]
-        stats["total_classifications"] += 1
-        stats["last_activity"] = dados_contribuicao['timestamp']
-        
-        if dados_contribuicao.get('aprovou_ia', False):
-            stats["ai_approvals"] += 1
-        else:
-            stats["manual_classifications"] += 1
-        
-        # Calcular confiança média (simplificado)
-        total = stats["total_classifications"]
-        current_avg = stats["avg_confidence"]
-        new_confidence = dados_contribuicao['nivel_certeza']
-        stats["avg_confidence"] = ((current_avg * (total - 1)) + new_confidence) / total
-        
-        # Salvar logs
-        with open(log_file, 'w', encoding='utf-8') as f:
-            json.dump(logs, f, indent=2, ensure_ascii=False)
+        # Append no segmento atual + atualização incremental das estatísticas
+        obter_armazenamento().registrar_auditorias(entradas)
             
     except Exception as e:
-        # Log de auditoria é opcional, não deve quebrar o fluxo
-        pass
+        # Log de auditoria é opcional, não deve quebrar o fluxo - mas a falha deve ser visível
+        st.warning(f"Falha ao registrar log de auditoria: {e}")
 
 def contar_contribuicoes_csv(usuario):
-    """Conta contribuições salvas no CSV para um usuário específico"""
+    """Conta contribuições salvas para um usuário específico"""
     try:
-        csv_file = Path("data/human_labels/human_classifications.csv")
-        if csv_file.exists():
-            df = pd.read_csv(csv_file)
-            return len(df[df['classifier_name'] == usuario])
-        return 0
+        return obter_armazenamento().contar_classificacoes(usuario)
     except Exception:
         return 0
 
 def salvar_formulario_analisado(forms_number, usuario):
     """Salva formulário como analisado"""
-    if 'formularios_analisados' not in st.session_state:
-        st.session_state.formularios_analisados = {}
-    
-    if str(forms_number) not in st.session_state.formularios_analisados:
-        st.session_state.formularios_analisados[str(forms_number)] = []
-    
-    if usuario not in st.session_state.formularios_analisados[str(forms_number)]:
-        st.session_state.formularios_analisados[str(forms_number)].append(usuario)
+    salvar_formularios_analisados([forms_number], usuario)
+
+def salvar_formularios_analisados(forms_numbers, usuario):
+    """Salva vários formulários como analisados com uma única escrita"""
+    # Atualização incremental do índice da sessão + persistência no backend
+    novos = obter_progresso(usuario).adicionar_lote(forms_numbers)
+    if len(novos):
+        obter_armazenamento().marcar_analisados(novos, usuario)
 
 def extrair_nome_atividade(forms_text):
     """Extrai nome da atividade"""
@@ -644,21 +748,15 @@ def extrair_nome_atividade(forms_text):
     
     return nome if nome else "Sem nome definido"
 
-def obter_classificacao_ia(forms_number, df_classificacoes):
+def obter_classificacao_ia(forms_number, indice_classificacoes):
     """Obtém a classificação da IA para um formulário específico"""
-    if df_classificacoes.empty:
-        return None, None, None
+    # Busca binária no índice pré-computado (sem varrer as classificações)
+    classificacao = indice_classificacoes.obter(forms_number)
     
-    # Buscar classificação da IA
-    classificacao = df_classificacoes[df_classificacoes['forms_number'] == forms_number]
-    
-    if classificacao.empty:
+    if classificacao is None:
         return None, None, None
     
-    row = classificacao.iloc[0]
-    categoria_ia = row.get('level1_category', None)
-    confianca = row.get('level1_confidence', 0)
-    threshold_met = row.get('level1_threshold_met', False)
+    categoria_ia, confianca, threshold_met, _ = classificacao
     
     # Se a categoria começa com "Nova_Classe", significa que a IA não conseguiu classificar
     if categoria_ia and str(categoria_ia).startswith('Nova_Classe'):
@@ -666,6 +764,176 @@ def obter_classificacao_ia(forms_number, df_classificacoes):
     
     return categoria_ia, confianca, threshold_met
 
+def obter_sugestao_ia(forms_number, forms_text, indice_classificacoes):
+    """Sugestão da IA combinando os protótipos com a votação kNN dos formulários já rotulados
+
+    Retorna (categoria, confiança, threshold_met, com_vizinhos). Os vizinhos votam no espaço do
+    EmbedderHash, então são combinados com os protótipos do motor (mesmo embedder, limiar
+    calibrado), nunca com os scores de level1_all_scores; sem vizinhos rotulados próximos
+    ou sem limiar calibrado, vale a classificação original.
+    """
+    categoria_ia, confianca, threshold_met = obter_classificacao_ia(forms_number, indice_classificacoes)
+    try:
+        indice = obter_indice_vizinhos()
+        limiar = obter_limiar_knn(obter_conjunto(DADOS_FILE, CLASSIFICACOES_IA_FILE).versao)
+        if len(indice) == 0 or limiar is None:
+            return categoria_ia, confianca, threshold_met, False
+        
+        motor = MotorClassificacao(indice.embedder, obter_atualizador_prototipos().prototipos(), limiar)
+        vetor = indice.embedder.embed([forms_text])
+        scores, categorias, com_votos = VotadorKNN(indice).combinar(
+            vetor, motor.pontuar(vetor), motor.prototipos.categorias, excluir=[forms_number]
+        )
+    except Exception as e:
+        st.caption(f"Votação kNN indisponível: {e}")
+        return categoria_ia, confianca, threshold_met, False
+    
+    if not com_votos[0]:
+        return categoria_ia, confianca, threshold_met, False
+    melhor = int(scores[0].argmax())
+    confianca = float(scores[0, melhor])
+    threshold_met = confianca >= motor.limiar
+    return (categorias[melhor] if threshold_met else None), confianca, threshold_met, True
+
+def mostrar_vizinhos(forms_number, forms_text):
+    """Formulários semelhantes já rotulados por humanos, com a categoria atribuída"""
+    try:
+        indice = obter_indice_vizinhos()
+    except Exception as e:
+        st.caption(f"Vizinhos indisponíveis: {e}")
+        return
+    
+    inicio = time.perf_counter()
+    vizinhos = indice.buscar(forms_text, k=VIZINHOS_K, excluir=forms_number)
+    tempo_ms = (time.perf_counter() - inicio) * 1000
+    
+    with st.expander(f"🔎 Formulários semelhantes já classificados ({len(vizinhos)})", expanded=True):
+        if vizinhos.empty:
+            st.caption("Nenhum formulário rotulado ainda")
+            return
+        
+        tabela = pd.DataFrame({
+            'Formulário': vizinhos['forms_number'],
+            'Atividade': [extrair_nome_atividade(texto) for texto in vizinhos['texto']],
+            'Categoria humana': vizinhos['categoria'],
+            'Similaridade': (vizinhos['similaridade'] * 100).round(1).astype(str) + '%',
+        })
+        st.dataframe(tabela, hide_index=True, use_container_width=True)
+        st.caption(f"{len(indice)} formulários rotulados indexados ({indice.motor}) - busca em {tempo_ms:.1f} ms")
+
+def contribuicao_derivada(contribuicao, forms_number, forms_text, indice_classificacoes, tipo):
+    """Mesma decisão humana aplicada a outro formulário (dados da IA do próprio formulário)"""
+    categoria_ia, confianca_ia, _ = obter_classificacao_ia(forms_number, indice_classificacoes)
+    return {
+        **contribuicao,
+        'forms_number': forms_number,
+        'forms_name': extrair_nome_atividade(forms_text),
+        'descricao_atividade': forms_text,
+        'categoria_ia': categoria_ia,
+        'confianca_ia': confianca_ia,
+        'aprovou_ia': False,
+        'tipo_classificacao': tipo
+    }
+
+def mostrar_revisao_grupos(usuario, df, indice_classificacoes, por_pagina=10):
+    """Revisão de clusters inteiros de formulários sem categoria: nomear e classificar de uma vez"""
+    st.markdown("### 🧩 Grupos de formulários sem categoria (Nova Classe)")
+    try:
+        agrupador = obter_agrupamento_novas(obter_conjunto(DADOS_FILE, CLASSIFICACOES_IA_FILE).versao)
+    except Exception as e:
+        st.error(f"Agrupamento indisponível: {e}")
+        return
+    
+    resumo = agrupador.resumo()
+    isolados = int((agrupador.tamanhos == 1).sum())
+    st.caption(
+        f"{len(agrupador.forms_number):,} formulários em {len(agrupador):,} clusters - "
+        f"{len(resumo):,} com 2+ formulários, {isolados:,} isolados (possível ruído)"
+    )
+    if resumo.empty:
+        st.info("Nenhum grupo de formulários sem categoria")
+        return
+    
+    textos = df.set_index('forms_number')['forms_text']
+    paginas = (len(resumo) - 1) // por_pagina + 1
+    pagina = st.number_input("Página", min_value=1, max_value=paginas, value=1, key="pagina_clusters")
+    
+    for _, grupo in resumo.iloc[(pagina - 1) * por_pagina:pagina * por_pagina].iterrows():
+        cluster = grupo['cluster']
+        titulo = grupo['nome'] or "sem nome"
+        with st.expander(f"#{cluster} - {titulo} ({grupo['tamanho']} formulários)"):
+            st.markdown("**Formulários representativos:**")
+            for forms_number in grupo['representantes']:
+                st.markdown(f"- **{forms_number}** - {extrair_nome_atividade(textos.get(forms_number))}")
+            
+            col_nome, col_salvar = st.columns([3, 1])
+            with col_nome:
+                nome = st.text_input("Nome do grupo", value=grupo['nome'], key=f"nome_cluster_{cluster}")
+            with col_salvar:
+                if st.button("Salvar nome", key=f"salvar_nome_{cluster}"):
+                    agrupador.nomear(cluster, nome.strip())
+                    agrupador.salvar(AGRUPAMENTO_FILE)
+                    st.rerun()
+            
+            # Uma decisão humana para todos os formulários pendentes do cluster
+            categoria = st.selectbox("Categoria do grupo:", list(CATEGORIAS.keys()), index=None,
+                                     key=f"categoria_cluster_{cluster}")
+            if not categoria:
+                continue
+            subcategoria = st.selectbox("Subcategoria:", CATEGORIAS[categoria], key=f"subcategoria_cluster_{cluster}")
+            certeza = st.slider("Seu nível de certeza:", 0.0, 1.0, 0.7, 0.1, key=f"certeza_cluster_{cluster}")
+            
+            membros = agrupador.membros(cluster)
+            membros = membros[obter_progresso(usuario).mascara_pendentes(membros)]
+            # Só os representantes foram vistos: os demais ficam marcados como propagados sem revisão
+            representantes = {int(f) for f in grupo['representantes']}
+            st.caption("Os formulários não exibidos acima são gravados como 'propagacao_grupo' "
+                       "(sem revisão individual) e têm peso reduzido no retreino")
+            if st.button(f"Aplicar aos {len(membros)} formulários pendentes", key=f"aplicar_cluster_{cluster}",
+                         disabled=len(membros) == 0):
+                base = {
+                    'categoria_usuario': categoria,
+                    'subcategoria_usuario': subcategoria,
+                    'nivel_certeza': certeza,
+                    'usuario': usuario,
+                    'timestamp': datetime.now().isoformat(),
+                    'comentarios': f"Revisão do grupo #{cluster}" + (f" ({grupo['nome']})" if grupo['nome'] else ""),
+                }
+                contribuicoes = [
+                    contribuicao_derivada(base, int(f), textos.get(int(f), ""), indice_classificacoes,
+                                          'revisao_grupo' if int(f) in representantes else 'propagacao_grupo')
+                    for f in membros
+                ]
+                if salvar_contribuicoes(contribuicoes):
+                    salvar_formularios_analisados(membros, usuario)
+                    st.success(f"Classificação aplicada a {len(contribuicoes)} formulários")
+
+def mostrar_duplicatas(forms_number, usuario, df):
+    """Quase-duplicatas pendentes do formulário; retorna as que devem receber a mesma classificação"""
+    try:
+        grupos = obter_grupos_duplicatas(obter_conjunto(DADOS_FILE, CLASSIFICACOES_IA_FILE).versao)
+    except Exception as e:
+        st.caption(f"Detecção de duplicatas indisponível: {e}")
+        return df.iloc[0:0]
+    
+    membros = grupos.membros(forms_number)
+    membros = membros[(membros != int(forms_number)) & obter_progresso(usuario).mascara_pendentes(membros)]
+    if len(membros) == 0:
+        return df.iloc[0:0]
+    
+    df_membros = df[df['forms_number'].isin(membros)]
+    st.info(f"📑 {len(df_membros)} formulário(s) quase idêntico(s) ainda pendente(s) para você")
+    with st.expander("Ver formulários do grupo"):
+        for _, membro in df_membros.iterrows():
+            st.markdown(f"- **{membro['forms_number']}** - {extrair_nome_atividade(membro['forms_text'])}")
+    
+    aplicar = st.checkbox(
+        f"Aplicar esta classificação aos {len(df_membros)} formulários do grupo",
+        key=f"aplicar_grupo_{forms_number}",
+        help="Uma única decisão salva para todo o grupo de quase-duplicatas"
+    )
+    return df_membros if aplicar else df.iloc[0:0]
+
 # ========================================
 # FUNÇÃO PRINCIPAL
 # ========================================
@@ -730,6 +998,15 @@ def main():
                 del st.session_state[key]
             st.rerun()
     
+    # Recarga explícita dos dados compartilhados por todas as sessões
+    with st.sidebar:
+        if st.button("Recarregar Dados", help="Relê formulários e classificações da IA para todas as sessões"):
+            recarregar_conjunto(DADOS_FILE, CLASSIFICACOES_IA_FILE)
+            obter_indice_vizinhos.clear()
+            st.rerun()
+        
+        modo = st.radio("Modo", ["Classificar formulários", "Revisar grupos de Nova Classe"])
+    
     # Carregar dados
     df = carregar_dados()
     if df.empty:
@@ -737,14 +1014,17 @@ def main():
         return
     
     # Carregar classificações da IA
-    df_classificacoes = carregar_classificacoes_ia()
+    indice_classificacoes = carregar_indice_classificacoes()
+    
+    if modo == "Revisar grupos de Nova Classe":
+        mostrar_revisao_grupos(usuario, df, indice_classificacoes)
+        return
     
     # Filtrar formulários disponíveis
-    df_disponivel = filtrar_formularios_nao_analisados(df, usuario)
+    df_disponivel = fila_da_sessao(filtrar_formularios_nao_analisados(df, usuario), usuario)
     
     # Estatísticas
-    analisados = st.session_state.get('formularios_analisados', {})
-    total_analisados = len([f for f, users in analisados.items() if usuario in users])
+    total_analisados = len(obter_progresso(usuario))
     contribuicoes_usuario = len([c for c in st.session_state.get('contribuicoes', []) if c.get('usuario') == usuario])
     
     # Métricas simples
@@ -796,9 +1076,12 @@ def main():
         
         return
     
-    # Controle de navegação
-    if 'indice_atual' not in st.session_state:
-        st.session_state.indice_atual = 0
+    # Controle de navegação: segue o formulário fixado; se ele saiu da fila (salvo), o próximo ocupa a posição
+    numeros = df_disponivel['forms_number'].tolist()
+    if st.session_state.get('forms_atual') in numeros:
+        fixar_formulario(numeros, numeros.index(st.session_state.forms_atual))
+    else:
+        fixar_formulario(numeros, st.session_state.get('indice_atual', 0))
     
     # Navegação entre formulários
     st.markdown("---")
@@ -806,30 +1089,35 @@ def main():
     
     with col1:
         if st.button("Anterior", disabled=st.session_state.indice_atual == 0):
-            st.session_state.indice_atual = max(0, st.session_state.indice_atual - 1)
+            fixar_formulario(numeros, st.session_state.indice_atual - 1)
             st.rerun()
     
     with col2:
         if st.button("Pular", help="Pular este formulário"):
-            st.session_state.indice_atual = min(len(df_disponivel) - 1, st.session_state.indice_atual + 1)
+            fixar_formulario(numeros, st.session_state.indice_atual + 1)
             st.rerun()
     
     with col3:
         progresso = st.session_state.indice_atual + 1
         total = len(df_disponivel)
         st.info(f"Formulário {progresso} de {total}")
+        
+        # Consulta em lote (vetorizada) para toda a fila visível
+        sugestoes = indice_classificacoes.obter_lote(df_disponivel['forms_number'].to_numpy())
+        st.caption(f"{int(sugestoes['tem_sugestao'].sum()):,} com sugestão da IA")
     
     with col4:
+        # Chave por formulário fixado: com uma chave fixa, o valor antigo do widget desfazia Anterior/Próximo
         ir_para = st.number_input("Ir para:", min_value=1, max_value=len(df_disponivel), 
                                   value=st.session_state.indice_atual + 1, 
-                                  key="nav_input")
+                                  key=f"nav_input_{st.session_state.forms_atual}")
         if ir_para != st.session_state.indice_atual + 1:
-            st.session_state.indice_atual = ir_para - 1
+            fixar_formulario(numeros, ir_para - 1)
             st.rerun()
     
     with col5:
         if st.button("Próximo", disabled=st.session_state.indice_atual >= len(df_disponivel) - 1):
-            st.session_state.indice_atual = min(len(df_disponivel) - 1, st.session_state.indice_atual + 1)
+            fixar_formulario(numeros, st.session_state.indice_atual + 1)
             st.rerun()
     
     # Formulário atual
@@ -853,10 +1141,18 @@ def main():
             # Descrição
             st.markdown("**Descrição da Atividade:**")
             st.text_area("Conteúdo do formulário", value=forms_text, height=200, disabled=True, label_visibility="collapsed")
+            
+            # Como formulários parecidos foram rotulados
+            mostrar_vizinhos(forms_number, forms_text)
+            
+            # Cópias do mesmo formulário (ex.: uma por UF) podem receber a mesma decisão
+            df_grupo = mostrar_duplicatas(forms_number, usuario, df)
         
         with col_direita:
             # Obter classificação da IA
-            categoria_ia, confianca_ia, threshold_met = obter_classificacao_ia(forms_number, df_classificacoes)
+            categoria_ia, confianca_ia, threshold_met, com_vizinhos = obter_sugestao_ia(
+                forms_number, forms_text, indice_classificacoes
+            )
             
             if categoria_ia:
                 # Mostrar sugestão da IA
@@ -870,6 +1166,8 @@ def main():
                     <p><strong>Confiança:</strong> <span style="color: {cor_confianca}; font-weight: bold;">{confianca_pct:.1f}%</span></p>
                 </div>
                 """, unsafe_allow_html=True)
+                if com_vizinhos:
+                    st.caption(f"Protótipos combinados com o voto dos {K_VIZINHOS} formulários rotulados mais semelhantes")
                 
                 # Opção de aprovar ou modificar
                 col_aprovar, col_modificar = st.columns(2)
@@ -974,7 +1272,13 @@ def main():
         
         with col2:
             if categoria_selecionada and subcategoria_selecionada:
-                if st.button("Salvar Classificação e Continuar", type="primary", use_container_width=True):
+                # Chave por formulário: um clique nunca é atribuído a outro formulário renderizado depois
+                if st.button("Salvar Classificação e Continuar", type="primary", use_container_width=True,
+                             key=f"salvar_{forms_number}"):
+                    if forms_number != st.session_state.get('forms_atual'):
+                        st.error("O formulário exibido não é mais o atual da fila. Nada foi salvo; confira e salve de novo.")
+                        st.stop()
+                    
                     # Verificar se foi aprovação da IA ou classificação manual
                     aprovou_ia = st.session_state.get(f"aprovado_ia_{forms_number}") is True
                     
@@ -995,44 +1299,50 @@ def main():
                         'tipo_classificacao': 'aprovacao_ia' if aprovou_ia else 'manual'
                     }
                     
-                    # Salvar
-                    salvar_contribuicao(contribuicao)
-                    salvar_formulario_analisado(forms_number, usuario)
+                    # Propagar a decisão para as quase-duplicatas selecionadas
+                    contribuicoes = [contribuicao]
+                    for _, membro in df_grupo.iterrows():
+                        contribuicoes.append(contribuicao_derivada(
+                            contribuicao, membro['forms_number'], membro['forms_text'],
+                            indice_classificacoes, 'propagacao_duplicata'
+                        ))
                     
-                    # Limpar estados específicos do formulário
-                    keys_to_remove = [
-                        f"aprovado_ia_{forms_number}",
-                        f"categoria_escolhida_{forms_number}",
-                        f"categoria_{forms_number}",
-                        f"subcategoria_{forms_number}",
-                        f"certeza_{forms_number}",
-                        f"comentarios_{forms_number}"
-                    ]
-                    for key in keys_to_remove:
-                        if key in st.session_state:
-                            del st.session_state[key]
+                    # Salvar (uma escrita em lote por destino); o formulário só sai da fila se o rótulo foi gravado
+                    if salvar_contribuicoes(contribuicoes):
+                        salvar_formularios_analisados([c['forms_number'] for c in contribuicoes], usuario)
                     
-                    # Feedback visual
-                    st.success("Classificação salva com sucesso!")
+                        # Limpar estados específicos do formulário
+                        keys_to_remove = [
+                            f"aprovado_ia_{forms_number}",
+                            f"categoria_escolhida_{forms_number}",
+                            f"categoria_{forms_number}",
+                            f"subcategoria_{forms_number}",
+                            f"certeza_{forms_number}",
+                            f"comentarios_{forms_number}",
+                            f"aplicar_grupo_{forms_number}"
+                        ]
+                        for key in keys_to_remove:
+                            if key in st.session_state:
+                                del st.session_state[key]
                     
-                    # Avançar automaticamente
-                    if st.session_state.indice_atual < len(df_disponivel) - 1:
-                        st.session_state.indice_atual += 1
-                        st.rerun()
-                    else:
-                        st.balloons()
-                        st.success("Você concluiu todos os formulários disponíveis!")
-                        st.rerun()
+                        # Feedback visual
+                        st.success(f"Classificação salva com sucesso em {len(contribuicoes)} formulário(s)!")
+                    
+                        # Avançar automaticamente: o formulário salvo sai da fila e o próximo ocupa a mesma posição
+                        if len(df_disponivel) > 1:
+                            st.rerun()
+                        else:
+                            st.balloons()
+                            st.success("Você concluiu todos os formulários disponíveis!")
+                            st.rerun()
             else:
                 st.warning("Por favor, selecione categoria e subcategoria antes de salvar")
 
 def mostrar_estatisticas_retreinamento():
     """Mostra estatísticas dos dados coletados para retreinamento"""
     try:
-        csv_file = Path("data/human_labels/human_classifications.csv")
-        if csv_file.exists():
-            df = pd.read_csv(csv_file)
-            
+        df = obter_armazenamento().classificacoes()
+        if not df.empty:
             st.subheader("📊 Estatísticas para Retreinamento")
             
             col1, col2, col3, col4 = st.columns(4)
@@ -1071,6 +1381,14 @@ def mostrar_estatisticas_retreinamento():
                 st.bar_chart(dist_categoria)
             else:
                 st.info("Dados de categoria não disponíveis")
+            
+            # CSV consolidado gerado apenas sob demanda a partir do diário
+            st.download_button(
+                label="Baixar Classificações Consolidadas (CSV)",
+                data=df.to_csv(index=False),
+                file_name="human_classifications.csv",
+                mime="text/csv"
+            )
     
     except Exception as e:
         st.info("Ainda não há dados de retreinamento salvos")
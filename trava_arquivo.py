@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Trava de Arquivo - Exclusão mútua entre processos que acrescentam aos mesmos arquivos
+fcntl.flock no Linux/macOS; msvcrt.locking no Windows
+"""
+
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# ========================================
+# TRAVA
+# ========================================
+
+@contextmanager
+def travar(caminho):
+    """Trava exclusiva e bloqueante sobre `caminho` (criado se preciso) enquanto durar o bloco"""
+    caminho = Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    with open(caminho, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Votação kNN - Segunda opinião a partir dos formulários rotulados por humanos
+Votos ponderados pela similaridade dos vizinhos, combinados com os scores dos protótipos do motor
+(mesmo embedder dos vizinhos: as duas fontes ficam na mesma escala de cosseno)
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from motor_classificacao import PROTOTIPOS_FILE, carregar_motor, gravar_classificacoes, montar_resultado
+
+# ========================================
+# CONFIGURAÇÕES
+# ========================================
+
+K_VIZINHOS = 10
+# Peso do voto = similaridade ^ EXPOENTE: vizinhos próximos dominam a votação
+EXPOENTE = 4
+# Vizinhos abaixo desta similaridade não votam (sem vizinhos, vale só o protótipo)
+SIMILARIDADE_MINIMA = 0.4
+# Fração do score final que vem do kNN quando há vizinhos
+PESO_KNN = 0.5
+
+# ========================================
+# VOTAÇÃO
+# ========================================
+
+def votar(similaridades, categorias_vizinhos, categorias, expoente=EXPOENTE, minima=SIMILARIDADE_MINIMA):
+    """Similaridade média ponderada e fatia dos votos de cada categoria (ambas n x categorias)
+
+    Peso do voto = similaridade ^ expoente; vizinhos abaixo da similaridade mínima não votam.
+    A média fica na escala do cosseno, então pode ser combinada com os scores dos protótipos.
+    """
+    similaridades = np.asarray(similaridades, dtype=np.float64)
+    posicao = {categoria: i for i, categoria in enumerate(categorias)}
+    codigos = np.array([posicao.get(c, -1) for c in np.ravel(categorias_vizinhos)],
+                       dtype=np.int64).reshape(similaridades.shape)
+
+    validos = (codigos >= 0) & (similaridades >= minima)
+    similaridades = np.where(validos, similaridades, 0.0)
+    pesos = similaridades ** expoente
+
+    n = len(similaridades)
+    linhas = np.broadcast_to(np.arange(n)[:, None], similaridades.shape)
+    votos = np.zeros((n, len(categorias)))
+    ponderadas = np.zeros((n, len(categorias)))
+    np.add.at(votos, (linhas[validos], codigos[validos]), pesos[validos])
+    np.add.at(ponderadas, (linhas[validos], codigos[validos]), (pesos * similaridades)[validos])
+
+    medias = np.divide(ponderadas, votos, out=np.zeros_like(votos), where=votos > 0)
+    totais = votos.sum(axis=1, keepdims=True)
+    fatias = np.divide(votos, totais, out=np.zeros_like(votos), where=totais > 0)
+    return medias, fatias
+
+def combinar(scores_prototipos, categorias_prototipos, medias, fatias, categorias_knn, peso=PESO_KNN):
+    """Cada categoria votada é puxada para a similaridade dos seus vizinhos: s + peso x fatia x (média - s)
+
+    Categorias sem votos mantêm o score do protótipo; categorias sem protótipo (rotuladas só por
+    humanos) recebem peso x fatia x média. Retorna (scores, categorias) com a união das duas fontes.
+    """
+    categorias = list(categorias_prototipos) + [c for c in categorias_knn if c not in set(categorias_prototipos)]
+    n = len(scores_prototipos)
+    combinados = np.zeros((n, len(categorias)))
+    combinados[:, :len(categorias_prototipos)] = np.nan_to_num(np.asarray(scores_prototipos, dtype=np.float64), nan=0.0)
+    if categorias_knn:
+        posicao = {categoria: i for i, categoria in enumerate(categorias)}
+        colunas = [posicao[c] for c in categorias_knn]
+        alfa = peso * np.asarray(fatias)
+        combinados[:, colunas] += alfa * (np.asarray(medias) - combinados[:, colunas])
+    return combinados, categorias
+
+class VotadorKNN:
+    """kNN sobre o IndiceVizinhos (FAISS); predição em lote com uma única busca"""
+
+    def __init__(self, indice, k=K_VIZINHOS, expoente=EXPOENTE, minima=SIMILARIDADE_MINIMA, peso=PESO_KNN):
+        self.indice = indice
+        self.k = k
+        self.expoente = expoente
+        self.minima = minima
+        self.peso = peso
+
+    def scores_knn(self, vetores, excluir=None):
+        """(médias, fatias, categorias) da votação de todas as linhas; excluir: forms_number de cada linha (ignora o próprio rótulo)"""
+        extra = 1 if excluir is not None else 0
+        similaridades, forms, categorias_vizinhos = self.indice.buscar_lote(vetores, self.k + extra)
+        if excluir is not None:
+            proprios = forms == np.asarray(excluir, dtype=np.int64)[:, None]
+            similaridades = np.where(proprios, -np.inf, similaridades)
+            # Mantém os k melhores restantes (o próprio, se presente, vai para o fim)
+            ordem = np.argsort(-similaridades, axis=1, kind='stable')[:, :self.k]
+            similaridades = np.take_along_axis(similaridades, ordem, axis=1)
+            categorias_vizinhos = np.take_along_axis(categorias_vizinhos, ordem, axis=1)
+        categorias = sorted({c for c in np.ravel(categorias_vizinhos) if c is not None})
+        medias, fatias = votar(similaridades, categorias_vizinhos, categorias, self.expoente, self.minima)
+        return medias, fatias, categorias
+
+    def combinar(self, vetores, scores_prototipos, categorias_prototipos, excluir=None):
+        """Scores combinados (n x categorias), categorias e máscara das linhas com voto kNN"""
+        medias, fatias, categorias_knn = self.scores_knn(vetores, excluir)
+        scores, categorias = combinar(scores_prototipos, categorias_prototipos,
+                                      medias, fatias, categorias_knn, self.peso)
+        return scores, categorias, fatias.sum(axis=1) > 0
+
+    def classificar(self, forms_number, vetores, scores_prototipos, categorias_prototipos,
+                    limiar, excluir_proprios=False):
+        """Resultado no esquema de level1_classifications com a sugestão combinada"""
+        excluir = forms_number if excluir_proprios else None
+        scores, categorias, com_votos = self.combinar(vetores, scores_prototipos, categorias_prototipos, excluir)
+        resultado = montar_resultado(forms_number, scores, categorias, limiar)
+        resultado['knn_votos'] = com_votos
+        return resultado
+
+# ========================================
+# LINHA DE COMANDO
+# ========================================
+
+def main():
+    from armazenamento import criar_armazenamento
+    from cache_embeddings import CacheEmbeddings
+    from embeddings import EmbedderHash
+    from indice_vizinhos import construir_indice_vizinhos
+
+    parser = argparse.ArgumentParser(description="Reclassifica o corpus combinando protótipos e votação kNN")
+    parser.add_argument("--dados", default="dados_embbeding.csv")
+    parser.add_argument("--prototipos", default=str(PROTOTIPOS_FILE))
+    parser.add_argument("--saida", default="data/classified/level1_classifications_knn.csv")
+    parser.add_argument("--backend", default=None, help="arquivos ou sqlite (padrão: $ROTULOS_BACKEND)")
+    parser.add_argument("--k", type=int, default=K_VIZINHOS)
+    parser.add_argument("--limiar", type=float, default=None,
+                        help="Padrão: limiar calibrado gravado com os protótipos")
+    args = parser.parse_args()
+
+    embedder = CacheEmbeddings(EmbedderHash())
+    try:
+        motor = carregar_motor(args.prototipos, args.limiar, embedder)
+    except ValueError as e:
+        sys.exit(str(e))
+    indice = construir_indice_vizinhos(criar_armazenamento(args.backend).classificacoes(), embedder)
+    dados = pd.read_csv(args.dados, encoding='utf-8-sig')
+
+    inicio = time.perf_counter()
+    vetores = embedder.embed(dados['forms_text'].fillna("").tolist())
+    scores_prototipos = motor.pontuar(vetores)
+    resultado = VotadorKNN(indice, args.k).classificar(
+        dados['forms_number'].to_numpy(), vetores, scores_prototipos, motor.prototipos.categorias, motor.limiar
+    )
+    tempo = time.perf_counter() - inicio
+    gravar_classificacoes(resultado.drop(columns='knn_votos'), args.saida)
+
+    antes = scores_prototipos.max(axis=1) < motor.limiar
+    depois = ~resultado['level1_threshold_met'].to_numpy()
+    print(f"{len(resultado)} formulários em {tempo:.2f}s ({len(indice)} rotulados, índice {indice.motor})")
+    print(f"Com voto kNN: {int(resultado['knn_votos'].sum())} | "
+          f"Nova_Classe: {int(antes.sum())} -> {int(depois.sum())}")
+    print(f"Resultado: {args.saida}")
+
+
+if __name__ == "__main__":
+    main()